@@ -9,8 +9,10 @@
 # Usage:
 # ./cfg.py get plugin-section/option_name
 # ./cfg.py set plugin-section/option_name value
+# ./cfg.py watch [path/to/wayfire.ini]
 
 from wayfire import WayfireSocket
+from wayfire.extra.config_watcher import ConfigWatcher
 import sys
 
 sock = WayfireSocket()
@@ -24,5 +26,12 @@ if sys.argv[1] == "get":
 
 elif sys.argv[1] == "set":
     print(sock.set_option_values({sys.argv[2] : sys.argv[3]}))
+elif sys.argv[1] == "watch":
+    # Push the options changed in the config file whenever it is saved
+    def report(r):
+        print(f"{len(r.changed)} changed, {r.sent} sent, parse {r.parse_time * 1000:.2f}ms, apply {r.apply_time * 1000:.2f}ms")
+        for option in r.unknown:
+            print("Not an option known to Wayfire: " + option)
+    ConfigWatcher(sock, sys.argv[2:] or None).run(report)
 else:
-    print("Invalid usage, either get <option> or set <option> <value>")
+    print("Invalid usage, either get <option>, set <option> <value> or watch [file]")
@@ -3,14 +3,16 @@
 # This script demonstrates how Wayfire's IPC can be used to set the opacity of inactive views.
 
 from wayfire import WayfireSocket
+from wayfire.extra.idempotent import IdempotentSocket
 
-sock = WayfireSocket()
-sock.watch(['view-focused'])
+# Skips alpha writes for views which already have the requested alpha
+sock = IdempotentSocket(WayfireSocket())
+sock.watch(['view-focused', 'view-unmapped'])
 
 last_focused_toplevel = -1
 while True:
     msg = sock.read_next_event()
-    if "event" in msg:
+    if msg.get("event") == "view-focused":
         print(msg["event"])
         view = msg["view"]
         new_focus = view["id"] if view and view["type"] == "toplevel" else -1
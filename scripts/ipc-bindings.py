@@ -5,26 +5,26 @@
 
 import time
 from wayfire import WayfireSocket
+from wayfire.extra.bindings import BindingManager
 
 sock = WayfireSocket()
+bindings = BindingManager(sock)
 
-response = sock.register_binding('KEY_LEFTCTRL', mode='press', exec_always=True)
-print(response)
-binding_id = response['binding-id']
 last_release_time = 0
 MAX_DELAY = 0.5
 
-while True:
-    msg = sock.read_next_event()
-    print(msg)
-    if "event" in msg and msg["event"] == "command-binding":
-        assert msg['binding-id'] == binding_id
+@bindings.bind('KEY_LEFTCTRL', mode='press', exec_always=True)
+def on_left_ctrl(event):
+    global last_release_time
+    print(event)
 
-        now = time.time()
-        if now - last_release_time <= MAX_DELAY:
-            print("toggle")
-            sock.toggle_expo()
-            last_release_time = now - 2 * MAX_DELAY # Prevent triple press
-        else:
-            print("reset")
-            last_release_time = now
+    now = time.time()
+    if now - last_release_time <= MAX_DELAY:
+        print("toggle")
+        sock.toggle_expo()
+        last_release_time = now - 2 * MAX_DELAY # Prevent triple press
+    else:
+        print("reset")
+        last_release_time = now
+
+bindings.run()
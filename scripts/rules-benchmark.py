@@ -0,0 +1,52 @@
+#!/usr/bin/python3
+
+# Measures how long matching one view against a large rule set takes with wayfire.extra.rules,
+# compared to testing every rule in turn. Does not need a running Wayfire instance.
+
+import random
+import re
+import timeit
+from wayfire.extra.rules import Rule, RuleEngine
+
+RULES = 1000
+MATCHES = 10000
+
+random.seed(0)
+rules = []
+for i in range(RULES):
+    kind = i % 4
+    if kind == 0:
+        rules.append(Rule(app_id=f"app{i}", alpha=0.9))
+    elif kind == 1:
+        rules.append(Rule(app_id=f"app{i - 1}", title=f"Document {i}", sticky=True))
+    elif kind == 2:
+        rules.append(Rule(role=f"role{i}", slot="slot_c"))
+    else:
+        rules.append(Rule(title=rf"Window {i}\b.*", geometry=(0, 0, 800, 600)))
+
+views = [{"id": n, "app-id": f"app{random.randrange(RULES)}", "role": "toplevel",
+          "title": f"Window {random.randrange(RULES)} - Document {random.randrange(RULES)}"} for n in range(MATCHES)]
+
+
+def linear(view):
+    matched = []
+    for rule in rules:
+        if rule.app_id is not None and rule.app_id != view["app-id"]:
+            continue
+        if rule.role is not None and rule.role != view["role"]:
+            continue
+        if rule.title is not None and not re.search(rule.title, view["title"]):
+            continue
+        matched.append(rule)
+    return matched
+
+
+engine = RuleEngine(rules)
+for view in views[:100]:
+    assert engine.match(view) == linear(view)
+
+compiled_time = timeit.timeit(lambda: [engine.match(view) for view in views], number=1) / MATCHES
+linear_time = timeit.timeit(lambda: [linear(view) for view in views], number=1) / MATCHES
+print(f"{RULES} rules, {sum(r.title is not None for r in rules)} title patterns, {MATCHES} views")
+print(f"{'compiled':>10}: {compiled_time * 1e6:8.1f} us per view")
+print(f"{'linear':>10}: {linear_time * 1e6:8.1f} us per view")
@@ -0,0 +1,58 @@
+#!/usr/bin/python3
+
+# Compares the bytes written to disk while a window is dragged, between pickling the whole window
+# list on every event (the approach used by earlier versions of session-save.py) and the session journal.
+# Does not need a running Wayfire instance.
+
+import os
+import pickle
+import tempfile
+import time
+from wayfire.extra.session import SessionJournal, SessionStore
+
+WINDOWS = 20
+DRAG_EVENTS = 240
+EVENT_INTERVAL = 1 / 120
+
+
+def view(view_id, x, y):
+    return {"id": view_id, "app-id": f"app{view_id}", "title": f"Window {view_id}", "type": "toplevel",
+            "mapped": True, "wset-index": 1, "output-name": "DP-1",
+            "geometry": {"x": x, "y": y, "width": 800, "height": 600}}
+
+
+def pickle_per_event(path):
+    windows = [(f"app{i}", (i * 10, i * 10, 800, 600)) for i in range(WINDOWS)]
+    written = 0
+    for step in range(DRAG_EVENTS):
+        windows[0] = ("app0", (step, step, 800, 600))
+        with open(path, "wb") as file:
+            pickle.dump(windows, file)
+            written += file.tell()
+    return written, DRAG_EVENTS
+
+
+def journal(path, flush_interval):
+    store = SessionStore(SessionJournal(path, flush_interval=flush_interval))
+    store.load()
+    for i in range(WINDOWS):
+        store.handle_event({"event": "view-mapped", "view": view(i, i * 10, i * 10)})
+    store.flush()
+
+    written = store.journal.bytes_written
+    flushes = store.journal.flushes
+    for step in range(DRAG_EVENTS):
+        store.handle_event({"event": "view-geometry-changed", "view": view(0, step, step)})
+        time.sleep(EVENT_INTERVAL)
+    store.flush()
+    return store.journal.bytes_written - written, store.journal.flushes - flushes
+
+
+with tempfile.TemporaryDirectory() as directory:
+    print(f"Dragging one of {WINDOWS} windows, {DRAG_EVENTS} geometry events at 120Hz")
+    pickled, writes = pickle_per_event(os.path.join(directory, "session.pickle"))
+    print(f"{'pickle per event':>24}: {pickled:>8} bytes in {writes:>4} writes")
+    for interval in (0.0, 0.1, 1.0):
+        written, writes = journal(os.path.join(directory, f"session-{interval}.journal"), interval)
+        name = f"journal, flush {interval}s"
+        print(f"{name:>24}: {written:>8} bytes in {writes:>4} writes")
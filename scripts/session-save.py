@@ -19,91 +19,45 @@
 #
 
 import os
-import pickle
-import subprocess
+import select
 from wayfire import WayfireSocket
+from wayfire.extra.session import SessionJournal, SessionRestorer, SessionStore
 
-save_file = os.getenv("HOME") + "/.config/wayfire.pickle"
+save_file = os.getenv("HOME") + "/.config/wayfire-session.journal"
 
 sock = WayfireSocket()
-sock.watch()
+sock.watch(SessionStore.EVENTS)
 
-class geometry:
-    def __init__(self, x, y, w, h):
-        self.x = x
-        self.y = y
-        self.w = w
-        self.h = h
-
-    def set_geometry(self, x, y, w, h):
-        self.x = x
-        self.y = y
-        self.w = w
-        self.h = h
-
-class window(object):
-    def __init__(self, app_id, geometry):
-        self.app_id = app_id
-        self.geometry = geometry
-
-    def set_geometry(self, geometry):
-        self.geometry = geometry
-
-window_list = []
+store = SessionStore(SessionJournal(save_file))
 
 try:
-    try:
-        with open(save_file, 'x') as file:
-            pass
-    except:
-        pass
-    with open(save_file, "rb") as file:
-        window_list = pickle.load(file)
-
-    for w in window_list:
-        subprocess.run(["gtk-launch", w.app_id])
-except:
-    print("Failed to pickle")
-    pass
-
-def serialize_to_file():
-    with open(save_file, "wb") as file:
-        pickle.dump(window_list, file)
+    saved = store.load()
+except ValueError as e:
+    print(f"Failed to load session: {e}")
+    saved = []
+
+if saved:
+    # Launch all apps at once and place their windows before they are shown. A separate connection is
+    # used, since Wayfire holds new windows as long as a client is subscribed to view-pre-map.
+    restore_sock = WayfireSocket()
+    result = SessionRestorer(restore_sock, saved).run()
+    restore_sock.close()
+    for slot, error in result.failed:
+        print(f"Failed to launch {slot.app_id}: {error}")
+    store.discard([slot for slot, _ in result.failed])
 
 while True:
     try:
+        # Wake up when the journal has changes waiting for the end of the flush interval
+        if not sock.pending_events:
+            readable, _, _ = select.select([sock.client], [], [], store.journal.time_until_flush())
+            if not readable:
+                store.journal.flush(store.views)
+                continue
+
         msg = sock.read_next_event()
         if "event" in msg:
-            if "view" in msg:
-                if msg["view"] is None:
-                    continue
-                elif msg["view"]["app-id"] == "":
-                    continue
-                elif msg["event"] == "view-unmapped":
-                    for w in window_list:
-                        if msg["view"]["app-id"] == w.app_id:
-                            window_list.remove(w)
-                            break
-                    serialize_to_file()
-                elif msg["event"] == "view-mapped":
-                    found = False
-                    for w in window_list:
-                        if w.app_id == msg["view"]["app-id"]:
-                            sock.configure_view(msg["view"]["id"], w.geometry.x, w.geometry.y, w.geometry.w, w.geometry.h)
-                            sock.set_focus(msg["view"]["id"])
-                            found = True
-                            break
-                    if not found:
-                        g = geometry(msg["view"]["geometry"]["x"], msg["view"]["geometry"]["y"], msg["view"]["geometry"]["width"], msg["view"]["geometry"]["height"])
-                        window_list.append(window(msg["view"]["app-id"], geometry(g.x, g.y, g.w, g.h)))
-                        serialize_to_file()
-                elif msg["event"] == "view-geometry-changed":
-                    if msg["view"]["type"] == "toplevel" and msg["view"]["mapped"]:
-                        for w in window_list:
-                            if w.app_id == msg["view"]["app-id"]:
-                                g = geometry(msg["view"]["geometry"]["x"], msg["view"]["geometry"]["y"], msg["view"]["geometry"]["width"], msg["view"]["geometry"]["height"])
-                                w.set_geometry(geometry(g.x, g.y, g.w, g.h))
-                                serialize_to_file()
-                                break
+            store.handle_event(msg)
     except KeyboardInterrupt:
+        store.close()
         exit(0)
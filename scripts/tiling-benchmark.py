@@ -0,0 +1,35 @@
+#!/usr/bin/python3
+
+# Measures how long the tiling policies in wayfire.extra.tiling take to build a layout,
+# compute the geometry of every view and convert the layout to and from the simple-tile
+# IPC format. No running Wayfire instance is needed.
+#
+# Usage: tiling-benchmark.py [repetitions]
+
+import sys
+import timeit
+from wayfire.extra.tiling import POLICIES, TileTree, get_policy
+
+repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+view_counts = [10, 50, 100, 250, 500]
+
+print(f"{'policy':<14}{'views':>6}{'build':>12}{'geometry':>12}{'to_layout':>12}{'from_layout':>12}{'insert':>12}")
+for name in POLICIES:
+    policy = get_policy(name)
+    for count in view_counts:
+        views = list(range(1, count + 1))
+        tree = policy.build(views)
+        layout = tree.to_layout()
+
+        def insert_remove():
+            policy.insert(tree, count + 1)
+            policy.remove(tree, count + 1)
+
+        timings = [
+            timeit.timeit(lambda: policy.build(views), number=repetitions),
+            timeit.timeit(lambda: tree.compute_geometry(0, 0, 3840, 2160), number=repetitions),
+            timeit.timeit(tree.to_layout, number=repetitions),
+            timeit.timeit(lambda: TileTree.from_layout(layout), number=repetitions),
+            timeit.timeit(insert_remove, number=repetitions),
+        ]
+        print(f"{name:<14}{count:>6}" + "".join(f"{t / repetitions * 1e6:>10.1f}us" for t in timings))
@@ -1,4 +1,4 @@
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 def get_msg_template(method: str) -> Dict[str, Any]:
     '''
@@ -17,3 +17,12 @@ def geometry_to_json(x: int, y: int, w: int, h: int):
     geometry["width"] = w
     geometry["height"] = h
     return geometry
+
+
+def object_id(value: Any) -> Optional[int]:
+    '''
+    The id of an output or the index of a wset, which events report either as a number or as the full object.
+    '''
+    if isinstance(value, dict):
+        return value.get("id", value.get("index"))
+    return value
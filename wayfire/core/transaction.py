@@ -0,0 +1,303 @@
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from wayfire.core.template import get_msg_template, geometry_to_json
+
+GRID_SLOTS = ("slot_tl", "slot_t", "slot_tr", "slot_l", "slot_c", "slot_r", "slot_bl", "slot_b", "slot_br")
+
+# The order in which the changes of a single view are applied. Moving a view to another wset or output
+# has to happen before its geometry is set, and geometry before state changes like fullscreen which
+# depend on where the view currently is.
+_PHASES = ("wset", "geometry", "workspace", "slot", "sticky", "always-on-top", "alpha", "minimized", "fullscreen")
+
+_STATE_METHODS = {
+    "sticky": "wm-actions/set-sticky",
+    "always-on-top": "wm-actions/set-always-on-top",
+    "minimized": "wm-actions/set-minimized",
+    "fullscreen": "wm-actions/set-fullscreen",
+}
+
+
+class LayoutTransactionResult:
+    """
+    Outcome of `LayoutTransaction.commit()`.
+
+    Attributes:
+        commit_time (float): Seconds from the start of the commit until the last reply was received.
+        view_latency (Dict[int, float]): For every changed view, seconds from the start of the commit
+            until the reply to the last request touching that view was received.
+        sent (int): Number of requests sent to the compositor.
+        dropped (int): Number of changes which were dropped because they would not change anything.
+        errors (List[Tuple[Optional[int], str, str]]): (view id, method, error) for every request which failed.
+    """
+    def __init__(self):
+        self.commit_time = 0.0
+        self.view_latency: Dict[int, float] = {}
+        self.sent = 0
+        self.dropped = 0
+        self.errors: List[Tuple[int, str, str]] = []
+
+
+class LayoutTransaction:
+    """
+    Collects geometry, output, workspace and state changes for many views and applies them in one burst.
+
+    Nothing is sent until `commit()` is called. On commit, the changes are validated against a single
+    snapshot of the views and outputs, changes which would not modify anything are dropped, and the
+    remaining requests are pipelined: all of them are written to the socket before any reply is awaited,
+    so the whole transaction costs roughly one round trip. If the `stipc` plugin is loaded, all geometry
+    changes are folded into a single `stipc/layout_views` request.
+
+    Setting the same property of a view twice keeps only the last value.
+    """
+    def __init__(self, socket):
+        self.socket = socket
+        self._changes: Dict[int, Dict[str, Any]] = {}
+
+    def __len__(self):
+        return sum(len(changes) for changes in self._changes.values())
+
+    def _set(self, view_id: int, key: str, value: Any):
+        self._changes.setdefault(view_id, {})[key] = value
+        return self
+
+    def configure(self, view_id: int, x: int, y: int, w: int, h: int, output_id: Optional[int]=None):
+        """
+        Sets the geometry of a view, optionally moving it to another output.
+
+        Args:
+            view_id (int): The unique ID of the view.
+            x (int): The x-coordinate of the view, relative to its output.
+            y (int): The y-coordinate of the view, relative to its output.
+            w (int): The width of the view.
+            h (int): The height of the view.
+            output_id (Optional[int]): The ID of the output the view should be moved to.
+        """
+        return self._set(view_id, "geometry", (geometry_to_json(x, y, w, h), output_id))
+
+    def send_to_wset(self, view_id: int, wset_index: int):
+        return self._set(view_id, "wset", wset_index)
+
+    def send_to_workspace(self, view_id: int, x: int, y: int):
+        return self._set(view_id, "workspace", (x, y))
+
+    def assign_slot(self, view_id: int, slot: str):
+        return self._set(view_id, "slot", slot)
+
+    def set_sticky(self, view_id: int, state: bool):
+        return self._set(view_id, "sticky", state)
+
+    def set_always_on_top(self, view_id: int, state: bool):
+        return self._set(view_id, "always-on-top", state)
+
+    def set_minimized(self, view_id: int, state: bool):
+        return self._set(view_id, "minimized", state)
+
+    def set_fullscreen(self, view_id: int, state: bool):
+        return self._set(view_id, "fullscreen", state)
+
+    def set_alpha(self, view_id: int, alpha: float):
+        return self._set(view_id, "alpha", alpha)
+
+    def _validate(self, views: Dict[int, dict], outputs: Dict[int, dict]):
+        for view_id, changes in self._changes.items():
+            view = views.get(view_id)
+            if view is None:
+                raise ValueError(f"View {view_id} does not exist.")
+
+            output = outputs.get(view.get("output-id"))
+            if "geometry" in changes:
+                geometry, output_id = changes["geometry"]
+                if geometry["width"] <= 0 or geometry["height"] <= 0:
+                    raise ValueError(f"Invalid size {geometry['width']}x{geometry['height']} for view {view_id}.")
+                if output_id is not None:
+                    if output_id not in outputs:
+                        raise ValueError(f"Output {output_id} does not exist.")
+                    output = outputs[output_id]
+
+            if "workspace" in changes and output is not None:
+                x, y = changes["workspace"]
+                grid = output["workspace"]
+                if not (0 <= x < grid["grid_width"] and 0 <= y < grid["grid_height"]):
+                    raise ValueError(f"Workspace ({x}, {y}) is outside of the workspace grid of output {output['id']}.")
+
+            if "slot" in changes and changes["slot"] not in GRID_SLOTS:
+                raise ValueError(f"Invalid slot '{changes['slot']}' for view {view_id}.")
+
+            if "alpha" in changes and not 0.0 <= changes["alpha"] <= 1.0:
+                raise ValueError(f"Alpha {changes['alpha']} for view {view_id} is outside of [0, 1].")
+
+    @staticmethod
+    def _current_workspace(view: dict, output: dict) -> Tuple[int, int]:
+        # View coordinates are relative to the currently visible workspace of the output.
+        geometry = view["geometry"]
+        size = output["geometry"]
+        center_x = geometry["x"] + geometry["width"] // 2
+        center_y = geometry["y"] + geometry["height"] // 2
+        return (output["workspace"]["x"] + center_x // size["width"],
+                output["workspace"]["y"] + center_y // size["height"])
+
+    def _is_noop(self, key: str, value: Any, view: dict, output: Optional[dict], changes: dict) -> bool:
+        if key == "wset":
+            return view.get("wset-index") == value
+        if key == "geometry":
+            geometry, output_id = value
+            return view.get("geometry") == geometry and output_id in (None, view.get("output-id"))
+        if key == "workspace":
+            moves_wset = "wset" in changes and changes["wset"] != view.get("wset-index")
+            if "geometry" in changes or moves_wset or output is None:
+                return False
+            return self._current_workspace(view, output) == tuple(value)
+        if key in ("sticky", "minimized", "fullscreen"):
+            return view.get(key) == value
+
+        # Slots, alpha and always-on-top are not reported by list_views, so they can't be compared.
+        return False
+
+    def _build_message(self, view_id: int, key: str, value: Any) -> dict:
+        if key == "wset":
+            message = get_msg_template("wsets/send-view-to-wset")
+            message["data"]["view-id"] = view_id
+            message["data"]["wset-index"] = value
+        elif key == "geometry":
+            geometry, output_id = value
+            message = get_msg_template("window-rules/configure-view")
+            message["data"]["id"] = view_id
+            message["data"]["geometry"] = geometry
+            if output_id is not None:
+                message["data"]["output_id"] = output_id
+        elif key == "workspace":
+            message = get_msg_template("vswitch/send-view")
+            message["data"]["x"] = value[0]
+            message["data"]["y"] = value[1]
+            message["data"]["view-id"] = view_id
+        elif key == "slot":
+            message = get_msg_template("grid/" + value)
+            message["data"]["view_id"] = view_id
+        elif key == "alpha":
+            message = get_msg_template("wf/alpha/set-view-alpha")
+            message["data"]["view-id"] = view_id
+            message["data"]["alpha"] = value
+        else:
+            message = get_msg_template(_STATE_METHODS[key])
+            message["data"]["view_id"] = view_id
+            message["data"]["state"] = value
+        return message
+
+    def _build_stipc_message(self, geometries: List[Tuple[int, Any]], outputs: Dict[int, dict]) -> dict:
+        message = get_msg_template("stipc/layout_views")
+        message["data"]["views"] = []
+        for view_id, (geometry, output_id) in geometries:
+            layout_for_view = {"id": view_id}
+            layout_for_view.update(geometry)
+            if output_id is not None:
+                layout_for_view["output"] = outputs[output_id]["name"]
+            message["data"]["views"].append(layout_for_view)
+        return message
+
+    def plan(self, views: Dict[int, dict], outputs: Dict[int, dict]) -> List[Tuple[str, int, Any]]:
+        """
+        The changes `commit()` would send, in order, without those already in effect.
+
+        Args:
+            views (Dict[int, dict]): The current views by id, as returned by `list_views`. Changes of
+                views which are not in the map are always kept.
+            outputs (Dict[int, dict]): The current outputs by id, needed to compare workspaces.
+
+        Returns:
+            List[Tuple[str, int, Any]]: (change, view id, value) for every change to send.
+        """
+        pending: List[Tuple[str, int, Any]] = []
+        for key in _PHASES:
+            for view_id, changes in self._changes.items():
+                if key not in changes:
+                    continue
+                view = views.get(view_id)
+                if view is not None and self._is_noop(key, changes[key], view, outputs.get(view.get("output-id")), changes):
+                    continue
+                pending.append((key, view_id, changes[key]))
+        return pending
+
+    def commit(self, validate: bool=True, use_stipc: bool=True, raise_on_error: bool=True,
+               follow_up: Optional[List[dict]]=None, views: Optional[Dict[int, dict]]=None,
+               outputs: Optional[Dict[int, dict]]=None) -> LayoutTransactionResult:
+        """
+        Validates the collected changes and sends them to the compositor.
+
+        Args:
+            validate (bool): Whether to check the changes against the current views and outputs, and drop
+                changes which are already in effect. This costs one `list_views` request, plus one
+                `list_outputs` request if any change depends on output information. Nothing is sent if
+                validation fails.
+            use_stipc (bool): Whether to use `stipc/layout_views` for geometry changes when it is available.
+            raise_on_error (bool): Whether to raise an exception if the compositor rejected any request.
+                All replies are collected before raising, so the socket remains usable.
+            follow_up (Optional[List[dict]]): Requests to send after the changes, in the same burst,
+                e.g. `window-rules/unblock-map` for a view held in `view-pre-map`. They are sent even
+                if no change is left after validation. Their errors are reported with view id None.
+            views (Optional[Dict[int, dict]]): A snapshot of the views by id to validate against, e.g.
+                from a mirror kept up to date with events, instead of requesting `list_views`.
+            outputs (Optional[Dict[int, dict]]): Likewise, a snapshot of the outputs by id.
+
+        Returns:
+            LayoutTransactionResult: Timing and error information about the commit.
+
+        Raises:
+            ValueError: If validation fails.
+        """
+        result = LayoutTransactionResult()
+        moves_output = any("geometry" in c and c["geometry"][1] is not None for c in self._changes.values())
+        needs_outputs = (validate and any("workspace" in c for c in self._changes.values())) or moves_output
+        if validate and views is None:
+            views = {view["id"]: view for view in self.socket.list_views()}
+        if needs_outputs and outputs is None:
+            outputs = {output["id"]: output for output in self.socket.list_outputs()}
+        views = views if validate else {}
+        outputs = outputs or {}
+        if validate:
+            self._validate(views, outputs)
+
+        pending = self.plan(views, outputs)
+        result.dropped = len(self) - len(pending)
+
+        # Each entry is (message, ids of the views it affects)
+        requests: List[Tuple[dict, List[int]]] = []
+        geometries = [(view_id, value) for key, view_id, value in pending if key == "geometry"]
+        if use_stipc and geometries and self.socket.has_method("stipc/layout_views"):
+            # layout_views must come after the wset moves, but before everything else
+            first_geometry = next(i for i, (key, _, _) in enumerate(pending) if key == "geometry")
+            for key, view_id, value in pending[:first_geometry]:
+                requests.append((self._build_message(view_id, key, value), [view_id]))
+            requests.append((self._build_stipc_message(geometries, outputs), [view_id for view_id, _ in geometries]))
+            for key, view_id, value in pending[first_geometry:]:
+                if key != "geometry":
+                    requests.append((self._build_message(view_id, key, value), [view_id]))
+        else:
+            for key, view_id, value in pending:
+                requests.append((self._build_message(view_id, key, value), [view_id]))
+        for message in follow_up or []:
+            requests.append((message, []))
+
+        frames = [self.socket.encode_message(message) for message, _ in requests]
+        self.socket.drain_replies()
+
+        start = time.perf_counter()
+        for frame in frames:
+            self.socket.send_frame(frame)
+
+        for message, view_ids in requests:
+            response = self.socket.read_response()
+            received = time.perf_counter() - start
+            for view_id in view_ids:
+                result.view_latency[view_id] = received
+            if "error" in response:
+                for view_id in view_ids or [None]:
+                    result.errors.append((view_id, message["method"], response["error"]))
+
+        result.commit_time = time.perf_counter() - start
+        result.sent = len(requests)
+        self._changes = {}
+
+        if raise_on_error and result.errors:
+            view_id, method, error = result.errors[0]
+            raise Exception(f"Layout transaction failed: {method} for view {view_id}: {error}")
+        return result
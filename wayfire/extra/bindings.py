@@ -0,0 +1,155 @@
+import time
+from typing import Any, Callable, Dict, List, Optional
+from wayfire.core.template import get_msg_template
+from wayfire.ipc import WayfireSocket
+
+BindingCallback = Callable[[dict], Any]
+
+
+class RegisteredBinding:
+    """A binding registered through a `BindingManager`, and the callback it runs."""
+    __slots__ = ("binding", "callback", "mode", "exec_always", "binding_id")
+
+    def __init__(self, binding: str, callback: BindingCallback, mode: Optional[str]=None, exec_always: bool=False):
+        self.binding = binding
+        self.callback = callback
+        self.mode = mode
+        self.exec_always = exec_always
+        self.binding_id: Optional[int] = None
+
+    def __repr__(self):
+        return f"RegisteredBinding({self.binding!r}, id={self.binding_id})"
+
+    def message(self) -> dict:
+        message = get_msg_template("command/register-binding")
+        message["data"]["binding"] = self.binding
+        message["data"]["exec-always"] = self.exec_always
+        if self.mode and self.mode != "press" and self.mode != "normal":
+            message["data"]["mode"] = self.mode
+        return message
+
+
+class BindingManager:
+    """
+    Registers bindings in bulk and runs Python callbacks when they are triggered.
+
+    Bindings are collected with `add()` (or the `bind()` decorator) and registered together with
+    `register()`, which pipelines all `command/register-binding` requests. The `command-binding`
+    events Wayfire sends for them are dispatched with `dispatch()` through a table from binding id to
+    callback, so a long-running process can serve any number of hotkeys without starting a new
+    interpreter for each keypress.
+
+    After Wayfire restarts (or the connection is re-established), call `reconcile()` to clear any
+    bindings left over by this client and register the full set again.
+
+    Example:
+        >>> bindings = BindingManager(socket)
+        >>> @bindings.bind("<super> <shift> KEY_HOME")
+        ... def center(event):
+        ...     ...
+        >>> bindings.register()
+        >>> bindings.run()
+
+    Attributes:
+        dispatched (int): Number of events dispatched to a callback.
+        dispatch_time (float): Total seconds spent in callbacks.
+    """
+    def __init__(self, socket: WayfireSocket):
+        self.socket = socket
+        self.dispatched = 0
+        self.dispatch_time = 0.0
+        self._bindings: List[RegisteredBinding] = []
+        self._by_id: Dict[int, RegisteredBinding] = {}
+
+    def __len__(self):
+        return len(self._bindings)
+
+    def add(self, binding: str, callback: BindingCallback, mode: Optional[str]=None,
+            exec_always: bool=False) -> RegisteredBinding:
+        """
+        Add a binding. It is registered with the next `register()`.
+
+        Args:
+            binding (str): The key or button binding, e.g. "<super> KEY_E".
+            callback (Callable[[dict], Any]): Called with the `command-binding` event when the binding triggers.
+            mode (Optional[str]): The binding mode, see `WayfireSocket.register_binding`.
+            exec_always (bool): Whether the binding also triggers while another plugin is active.
+        """
+        entry = RegisteredBinding(binding, callback, mode, exec_always)
+        self._bindings.append(entry)
+        return entry
+
+    def bind(self, binding: str, mode: Optional[str]=None, exec_always: bool=False):
+        """Decorator form of `add()`."""
+        def decorator(callback: BindingCallback):
+            self.add(binding, callback, mode, exec_always)
+            return callback
+        return decorator
+
+    def register(self):
+        """
+        Register all bindings which are not registered yet, with one round trip.
+
+        Raises:
+            Exception: If any binding was rejected. The other bindings are still registered.
+        """
+        pending = [entry for entry in self._bindings if entry.binding_id is None]
+        if not pending:
+            return
+        responses = self.socket.send_json_batch([entry.message() for entry in pending], raise_on_error=False)
+
+        errors = []
+        for entry, response in zip(pending, responses):
+            if "error" in response or "binding-id" not in response:
+                errors.append(f"{entry.binding}: {response.get('error', response)}")
+                continue
+            entry.binding_id = response["binding-id"]
+            self._by_id[entry.binding_id] = entry
+        if errors:
+            raise Exception("Failed to register bindings: " + "; ".join(errors))
+
+    def remove(self, entry: RegisteredBinding):
+        """Unregister a binding and forget its callback."""
+        self._bindings.remove(entry)
+        if entry.binding_id is not None:
+            del self._by_id[entry.binding_id]
+            self.socket.unregister_binding(entry.binding_id)
+            entry.binding_id = None
+
+    def reconcile(self):
+        """
+        Make the compositor's bindings for this client match the manager's bindings.
+
+        Clears all bindings of this client and registers every binding again, e.g. after reconnecting
+        to a restarted Wayfire, where the old binding ids are no longer valid.
+        """
+        self.socket.clear_bindings()
+        self._by_id = {}
+        for entry in self._bindings:
+            entry.binding_id = None
+        self.register()
+
+    def dispatch(self, event: dict) -> bool:
+        """
+        Run the callback for a `command-binding` event.
+
+        Returns:
+            bool: Whether the event belonged to one of the managed bindings.
+        """
+        if event.get("event") != "command-binding":
+            return False
+        entry = self._by_id.get(event.get("binding-id"))
+        if entry is None:
+            return False
+
+        start = time.perf_counter()
+        entry.callback(event)
+        self.dispatch_time += time.perf_counter() - start
+        self.dispatched += 1
+        return True
+
+    def run(self):
+        """Register the bindings and dispatch events until interrupted. Other events are ignored."""
+        self.register()
+        while True:
+            self.dispatch(self.socket.read_next_event())
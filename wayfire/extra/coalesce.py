@@ -0,0 +1,158 @@
+import time
+from typing import Dict, List, Optional, Tuple
+from wayfire.core.template import get_msg_template, geometry_to_json
+from wayfire.ipc import WayfireSocket
+
+_QUEUED = {"result": "ok"}
+
+# Methods which set a state of a view, so a later request replaces an earlier one entirely. Queries and
+# toggles are never buffered.
+COALESCED_METHODS = frozenset((
+    "window-rules/configure-view",
+    "wf/alpha/set-view-alpha",
+    "wf/obs/set-view-opacity",
+    "wf/obs/set-view-brightness",
+    "wf/obs/set-view-saturation",
+    "wf/filters/set-view-shader",
+    "wm-actions/set-sticky",
+    "wm-actions/set-always-on-top",
+    "wm-actions/set-minimized",
+    "wm-actions/set-fullscreen",
+    "wsets/send-view-to-wset",
+    "vswitch/send-view",
+))
+
+
+def _view_id(message: dict) -> Optional[int]:
+    data = message.get("data")
+    if not isinstance(data, dict):
+        return None
+    for key in ("view-id", "view_id", "id"):
+        if key in data:
+            return data[key]
+    return None
+
+
+class CoalescingSender:
+    """
+    Buffers view updates for a short tick and sends only the latest one per view and method.
+
+    Requests which set a state of a view, listed in `COALESCED_METHODS`, are buffered by (method,
+    view id): those of `configure_view`, `set_view_alpha`, and the ones sent with `send_json`, e.g.
+    by `WPE(sender).set_view_opacity`. A newer request for the
+    same key replaces the buffered one and moves to the end of the buffer, so requests of different
+    methods for the same view are still sent in the order of their latest updates. Once a tick has
+    passed since the first buffered request, the buffer is sent as one pipelined burst.
+
+    Buffered requests are answered locally with `{"result": "ok"}`; errors reported by the
+    compositor when the buffer is sent are collected in `errors`. All other requests, e.g. queries and
+    toggles, and every other method of the socket, first send the buffer and are then passed through,
+    so they get their real reply and never overtake a buffered update.
+
+    The sender doesn't use a thread: the buffer is sent by the next request after the tick, by
+    `poll()` or by `flush()`. Event loops should use `time_until_flush()` as their select timeout and
+    call `poll()`, so the last update of a burst is not held back.
+
+    Example:
+        >>> sender = CoalescingSender(sock, tick=0.008)
+        >>> wpe = WPE(sender)
+        >>> for x in range(0, 500, 5):
+        ...     sender.configure_view(view_id, x, 100, 800, 600)
+        ...     wpe.set_view_opacity(view_id, x / 500, 0)
+        >>> sender.flush()
+        >>> sender.coalesced
+        198
+
+    Attributes:
+        tick (float): Seconds requests are buffered for.
+        sent (int): Requests sent to the compositor.
+        coalesced (int): Requests dropped because a newer one replaced them.
+        flushes (int): Number of bursts sent.
+        errors (List[Tuple[Optional[int], str, str]]): (view id, method, error) for every rejected buffered request.
+    """
+    def __init__(self, socket: WayfireSocket, tick: float=0.008):
+        self.socket = socket
+        self.tick = tick
+        self.sent = 0
+        self.coalesced = 0
+        self.flushes = 0
+        self.errors: List[Tuple[Optional[int], str, str]] = []
+        self._buffer: Dict[Tuple[str, int], dict] = {}
+        self._deadline: Optional[float] = None
+
+    def __getattr__(self, name):
+        attr = getattr(self.socket, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            self.flush()
+            return attr(*args, **kwargs)
+        return call
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.flush()
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def send_json(self, message: dict):
+        view_id = _view_id(message) if message["method"] in COALESCED_METHODS else None
+        if view_id is None:
+            self.flush()
+            self.sent += 1
+            return self.socket.send_json(message)
+
+        key = (message["method"], view_id)
+        if self._buffer.pop(key, None) is not None:
+            self.coalesced += 1
+        self._buffer[key] = message
+        if self._deadline is None:
+            self._deadline = time.monotonic() + self.tick
+        self.poll()
+        return _QUEUED
+
+    def configure_view(self, view_id: int, x: int, y: int, w: int, h: int, output_id=None):
+        message = get_msg_template("window-rules/configure-view")
+        message["data"]["id"] = view_id
+        message["data"]["geometry"] = geometry_to_json(x, y, w, h)
+        if output_id is not None:
+            message["data"]["output_id"] = output_id
+        return self.send_json(message)
+
+    def set_view_alpha(self, view_id: int, alpha: float):
+        message = get_msg_template("wf/alpha/set-view-alpha")
+        message["data"] = {}
+        message["data"]["view-id"] = view_id
+        message["data"]["alpha"] = alpha
+        return self.send_json(message)
+
+    def time_until_flush(self) -> Optional[float]:
+        """Seconds until the buffer is due, None if it is empty."""
+        if self._deadline is None:
+            return None
+        return max(0.0, self._deadline - time.monotonic())
+
+    def poll(self) -> int:
+        """Send the buffer if its tick has passed. Returns the number of requests sent."""
+        if self._deadline is None or time.monotonic() < self._deadline:
+            return 0
+        return self.flush()
+
+    def flush(self) -> int:
+        """Send the buffer now. Returns the number of requests sent."""
+        if not self._buffer:
+            return 0
+        messages = list(self._buffer.values())
+        self._buffer = {}
+        self._deadline = None
+        responses = self.socket.send_json_batch(messages, raise_on_error=False)
+        for message, response in zip(messages, responses):
+            if "error" in response:
+                self.errors.append((_view_id(message), message["method"], response["error"]))
+        self.sent += len(messages)
+        self.flushes += 1
+        return len(messages)
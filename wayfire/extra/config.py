@@ -0,0 +1,426 @@
+import re
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from wayfire.core.template import get_msg_template
+from wayfire.ipc import WayfireSocket
+
+
+def flatten_options(options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert options given as `{"section/option": value}` or `{"section": {"option": value}}`
+    (or a mix of both) to the flat form.
+    """
+    flat = {}
+    for key, value in options.items():
+        if "/" in key:
+            flat[key] = value
+        else:
+            for option_name, option_value in value.items():
+                flat[key + "/" + option_name] = option_value
+    return flat
+
+
+class Binding:
+    """
+    A keybinding, buttonbinding or activator option, e.g. `<super> <shift> KEY_E`.
+
+    Activators may combine several bindings with `|`; `alternatives` holds every binding but the first.
+    """
+    __slots__ = ("modifiers", "key", "alternatives")
+
+    def __init__(self, modifiers: Tuple[str, ...], key: Optional[str], alternatives: Tuple["Binding", ...]=()):
+        self.modifiers = modifiers
+        self.key = key
+        self.alternatives = alternatives
+
+    def __eq__(self, other):
+        return (isinstance(other, Binding) and set(self.modifiers) == set(other.modifiers) and
+                self.key == other.key and self.alternatives == other.alternatives)
+
+    def __hash__(self):
+        return hash((frozenset(self.modifiers), self.key))
+
+    def __str__(self):
+        parts = [f"<{modifier}>" for modifier in self.modifiers]
+        if self.key is not None:
+            parts.append(self.key)
+        return " | ".join([" ".join(parts)] + [str(alternative) for alternative in self.alternatives])
+
+    def __repr__(self):
+        return f"Binding({str(self)!r})"
+
+    @classmethod
+    def parse(cls, value: str) -> "Binding":
+        bindings = []
+        for part in value.split("|"):
+            modifiers = tuple(_MODIFIER_RE.findall(part))
+            key = _MODIFIER_RE.sub(" ", part).strip() or None
+            bindings.append(cls(modifiers, key))
+        first = bindings[0]
+        first.alternatives = tuple(bindings[1:])
+        return first
+
+
+_MODIFIER_RE = re.compile(r"<\s*(\w+)\s*>")
+_BINDING_RE = re.compile(r"^\s*(<\s*\w+\s*>\s*)*((KEY|BTN|hotspot|edge|swipe|pinch)\S*(\s+\S+)*)?\s*(\|.*)?$")
+_INT_RE = re.compile(r"^-?\d+$")
+_FLOAT_RE = re.compile(r"^-?(\d+\.\d*|\.\d+|\d+)([eE][-+]?\d+)?$")
+_HEX_COLOR_RE = re.compile(r"^#([0-9a-fA-F]{6}|[0-9a-fA-F]{8})$")
+
+
+def parse_value(value: Any) -> Any:
+    """
+    Convert a raw option value, as reported by Wayfire, to a Python value.
+
+    - "true" / "false" become bools, integers and decimals become int and float.
+    - Colors ("#RRGGBB", "#RRGGBBAA" or four numbers between 0 and 1) become (r, g, b, a) float tuples.
+    - Key, button and activator bindings (anything with `<modifier>`, `KEY_*`, `BTN_*`, ...) become `Binding`.
+    - Compound options (lists of tuples) have each of their entries parsed.
+    - Everything else is returned unchanged.
+    """
+    if isinstance(value, list):
+        return [parse_value(v) for v in value]
+    if not isinstance(value, str):
+        return value
+
+    stripped = value.strip()
+    if stripped in ("true", "false"):
+        return stripped == "true"
+    if _INT_RE.match(stripped):
+        return int(stripped)
+    if _FLOAT_RE.match(stripped):
+        return float(stripped)
+    if _HEX_COLOR_RE.match(stripped):
+        digits = stripped[1:] + ("ff" if len(stripped) == 7 else "")
+        return tuple(int(digits[i:i + 2], 16) / 255 for i in range(0, 8, 2))
+
+    parts = stripped.split()
+    if len(parts) == 4 and all(_FLOAT_RE.match(part) for part in parts):
+        color = tuple(float(part) for part in parts)
+        if all(0.0 <= v <= 1.0 for v in color):
+            return color
+    if stripped and ("<" in stripped or stripped.startswith(("KEY_", "BTN_"))) and _BINDING_RE.match(stripped):
+        return Binding.parse(stripped)
+    return value
+
+
+def format_value(value: Any) -> Any:
+    """
+    Convert a Python value to the representation used by Wayfire, the inverse of `parse_value`.
+
+    Raises:
+        ValueError: If a color tuple has a component outside of 0..1.
+    """
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return str(value)
+    if isinstance(value, Binding):
+        return str(value)
+    if isinstance(value, tuple) and len(value) == 4 and all(isinstance(v, float) for v in value):
+        if not all(0.0 <= v <= 1.0 for v in value):
+            raise ValueError(f"Color components must be between 0 and 1, got {value}")
+        return "#" + "".join(f"{round(v * 255):02X}" for v in value)
+    if isinstance(value, (list, tuple)):
+        return [format_value(v) for v in value]
+    return value
+
+
+class ConfigManager:
+    """
+    Writes configuration options only when they change, batching writes made close together.
+
+    The current values of all options are fetched once with `list_config_options` and kept up to date
+    with every write made through the manager. Options set with `set()` are queued and sent as a single
+    `wayfire/set-config-options` request. The manager doesn't use a thread: the queue is sent by the
+    first `set()` or `poll()` once `coalesce_window` seconds have passed since the first queued option,
+    by `flush()`, or when the manager is used as a context manager and the block ends. A lone `set()`
+    outside of a `with` block is therefore only sent by one of these; event loops should use
+    `time_until_flush()` as their select timeout and call `poll()`. With a `coalesce_window` of 0,
+    every `set()` is sent right away. Options which already have the requested value are not sent at all.
+
+    Changes made by other clients or by editing the config file are not noticed; call `refresh()`
+    if they are expected.
+
+    Example:
+        >>> with ConfigManager(socket) as config:
+        ...     config.set_plugin("cube", True)
+        ...     config.set("core/vwidth", 4)
+        ...     config.set("core/vheight", 4)
+        >>> print(config.messages, config.suppressed_writes, config.suppressed_bytes)
+
+    Attributes:
+        writes (int): Number of options sent to the compositor.
+        messages (int): Number of `wayfire/set-config-options` requests sent.
+        suppressed_writes (int): Number of option writes which were not sent, because they did not
+            change the value or were replaced by a later write of the same option.
+        suppressed_bytes (int): Bytes saved compared to sending every write in its own request.
+    """
+    def __init__(self, socket: WayfireSocket, coalesce_window: float=0.01):
+        self.socket = socket
+        self.coalesce_window = coalesce_window
+        self.writes = 0
+        self.messages = 0
+        self.suppressed_writes = 0
+        self.suppressed_bytes = 0
+
+        self._values: Optional[Dict[str, Any]] = None
+        self._pending: Dict[str, Any] = {}
+        self._pending_since = 0.0
+        self._requested = 0
+        self._requested_bytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
+
+    @property
+    def values(self) -> Dict[str, Any]:
+        """The current value of every option, by "section/option"."""
+        if self._values is None:
+            self.refresh()
+        return self._values
+
+    def refresh(self):
+        """Re-read all options from the compositor."""
+        options = self.socket.list_config_options()["options"]
+        self._values = {}
+        for section, section_options in options.items():
+            for name, option in section_options.items():
+                self._values[section + "/" + name] = option.get("value")
+
+    def get(self, option: str) -> Any:
+        """The value of an option, including changes which are queued but not sent yet."""
+        if option in self._pending:
+            return self._pending[option]
+        return self.values.get(option)
+
+    def set(self, option: str, value: Any):
+        self.set_many({option: value})
+
+    def set_many(self, options: Dict[str, Any]):
+        """Queue several options, in any format accepted by `WayfireSocket.set_option_values`."""
+        options = flatten_options(options)
+        if not self._pending:
+            self._pending_since = time.monotonic()
+
+        # What sending these options right away, without diffing or batching, would have cost
+        message = get_msg_template("wayfire/set-config-options")
+        message["data"] = options
+        self._requested_bytes += len(WayfireSocket.encode_message(message))
+        self._requested += len(options)
+
+        for option, value in options.items():
+            self._pending[option] = format_value(value)
+        self.poll()
+
+    def time_until_flush(self) -> Optional[float]:
+        """Seconds until the queued options are due, None if nothing is queued."""
+        if not self._pending:
+            return None
+        return max(0.0, self._pending_since + self.coalesce_window - time.monotonic())
+
+    def poll(self):
+        """Send the queued options if `coalesce_window` has passed since the first of them was queued."""
+        if self._pending and time.monotonic() - self._pending_since >= self.coalesce_window:
+            self.flush()
+
+    def set_plugin(self, plugin_name: str, enabled: bool=True):
+        """Enable or disable a plugin in `core/plugins`."""
+        plugins: List[str] = (self.get("core/plugins") or "").split()
+        if enabled and plugin_name not in plugins:
+            plugins.append(plugin_name)
+        elif not enabled:
+            plugins = [plugin for plugin in plugins if plugin != plugin_name]
+        self.set("core/plugins", " ".join(plugins))
+
+    def diff(self, options: Dict[str, Any]) -> Dict[str, Any]:
+        """The subset of `options` whose values differ from the current values."""
+        current = self.values
+        return {option: value for option, value in flatten_options(options).items()
+                if option not in current or current[option] != format_value(value)}
+
+    def flush(self):
+        """Send all queued options which change a value, in a single request."""
+        if not self._pending:
+            return
+        delta = self.diff(self._pending)
+        self._pending = {}
+
+        sent_bytes = 0
+        if delta:
+            message = get_msg_template("wayfire/set-config-options")
+            message["data"] = delta
+            sent_bytes = len(WayfireSocket.encode_message(message))
+            self.socket.send_json(message)
+            self._values.update(delta)
+            self.writes += len(delta)
+            self.messages += 1
+
+        self.suppressed_writes += self._requested - len(delta)
+        self.suppressed_bytes += self._requested_bytes - sent_bytes
+        self._requested = 0
+        self._requested_bytes = 0
+
+
+class ConfigSection:
+    """
+    The options of one config section, parsed on first access. Created by `ConfigView`.
+    """
+    def __init__(self, view: "ConfigView", name: str):
+        self._view = view
+        self.name = name
+        self.loaded_at: Optional[float] = None
+        self._raw: Dict[str, Any] = {}
+        self._parsed: Dict[str, Any] = {}
+        self._fetched_at: Dict[str, float] = {}
+
+    def _load(self, raw: Dict[str, Any], now: float):
+        self._raw = raw
+        self._parsed = {}
+        self._fetched_at = {}
+        self.loaded_at = now
+
+    def _stale(self, option: Optional[str]=None) -> bool:
+        age = self._view.max_age
+        if age is None:
+            return False
+        fetched = self._fetched_at.get(option, self.loaded_at) if option is not None else self.loaded_at
+        return fetched is None or time.monotonic() - fetched > age
+
+    def __getitem__(self, option: str) -> Any:
+        if option in self._parsed and not self._stale(option):
+            return self._parsed[option]
+
+        if self.loaded_at is None or self._stale(option):
+            # Fetch just this option instead of the whole configuration
+            try:
+                reply = self._view.socket.get_option_value(self.name + "/" + option)
+            except Exception:
+                # Wayfire replies with an error for unknown options
+                raise KeyError(f"{self.name}/{option}")
+            if "value" not in reply:
+                raise KeyError(f"{self.name}/{option}")
+            self._raw[option] = reply["value"]
+            self._fetched_at[option] = time.monotonic()
+        elif option not in self._raw:
+            raise KeyError(f"{self.name}/{option}")
+
+        value = parse_value(self._raw[option])
+        self._parsed[option] = value
+        return value
+
+    def get(self, option: str, default: Any=None) -> Any:
+        try:
+            return self[option]
+        except KeyError:
+            return default
+
+    def __contains__(self, option: str) -> bool:
+        return option in self.keys()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def keys(self) -> List[str]:
+        if self.loaded_at is None or self._stale():
+            self._view.load()
+        return list(self._raw)
+
+    def items(self) -> List[Tuple[str, Any]]:
+        return [(option, self[option]) for option in self.keys()]
+
+    def age(self, option: Optional[str]=None) -> Optional[float]:
+        """Seconds since the section (or one of its options) was read from the compositor, None if never."""
+        fetched = self._fetched_at.get(option, self.loaded_at) if option is not None else self.loaded_at
+        return None if fetched is None else time.monotonic() - fetched
+
+    def _written(self, option: str, raw: Any, value: Any):
+        self._raw[option] = raw
+        self._parsed[option] = value
+        self._fetched_at[option] = time.monotonic()
+
+
+class ConfigView:
+    """
+    A lazily loaded, parsed view of the Wayfire configuration.
+
+    `view["core"]["plugins"]` fetches only that option with `get_option_value` the first time it is
+    read; listing the options of a section loads the whole configuration once with
+    `list_config_options`. Values are parsed into Python types with `parse_value` on first access and
+    memoized. Options written with `set()` update the cache directly, without reading them back.
+
+    If `max_age` is set, values older than `max_age` seconds are fetched again when accessed.
+    Use `age()` to find out how old the cached values are, and `invalidate()` to drop them.
+
+    Example:
+        >>> config = ConfigView(socket)
+        >>> config["core"]["vwidth"]
+        3
+        >>> config["command"]["bindings"]
+        [['terminal', 'kitty', Binding('<super> KEY_ENTER')]]
+        >>> config.set("core/vwidth", 4)
+    """
+    def __init__(self, socket: WayfireSocket, max_age: Optional[float]=None):
+        self.socket = socket
+        self.max_age = max_age
+        self._sections: Dict[str, ConfigSection] = {}
+        self._loaded = False
+
+    def __getitem__(self, section: str) -> ConfigSection:
+        if section not in self._sections:
+            if self._loaded:
+                raise KeyError(section)
+            self._sections[section] = ConfigSection(self, section)
+        return self._sections[section]
+
+    def get(self, option: str, default: Any=None) -> Any:
+        """The parsed value of an option given as "section/option"."""
+        section, name = option.split("/", 1)
+        try:
+            return self[section][name]
+        except KeyError:
+            return default
+
+    def load(self):
+        """Read the whole configuration at once. Values are still parsed only on access."""
+        options = self.socket.list_config_options()["options"]
+        now = time.monotonic()
+        for section, section_options in options.items():
+            raw = {name: option.get("value") for name, option in section_options.items()}
+            self[section]._load(raw, now)
+        self._loaded = True
+
+    def sections(self) -> List[str]:
+        if not self._loaded:
+            self.load()
+        return list(self._sections)
+
+    def age(self, section: str, option: Optional[str]=None) -> Optional[float]:
+        """Seconds since a section or option was read from the compositor, None if it never was."""
+        if section not in self._sections:
+            return None
+        return self._sections[section].age(option)
+
+    def invalidate(self, section: Optional[str]=None):
+        """Drop the cached values of one section, or of the whole configuration."""
+        if section is None:
+            self._sections = {}
+            self._loaded = False
+        else:
+            self._sections.pop(section, None)
+            self._loaded = False
+
+    def set(self, option: str, value: Any):
+        self.set_many({option: value})
+
+    def set_many(self, options: Dict[str, Any]):
+        """Write options given as Python values and update the cache with them."""
+        raw = {option: format_value(value) for option, value in flatten_options(options).items()}
+        self.socket.set_option_values(raw)
+        for option, value in raw.items():
+            section, name = option.split("/", 1)
+            self[section]._written(name, value, parse_value(value))
@@ -0,0 +1,307 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from wayfire.extra.config import ConfigManager
+from wayfire.ipc import WayfireSocket
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def default_config_path() -> str:
+    """The config file Wayfire reads, honouring `WAYFIRE_CONFIG_FILE`."""
+    path = os.getenv("WAYFIRE_CONFIG_FILE")
+    if path:
+        return path
+    config_home = os.getenv("XDG_CONFIG_HOME") or os.path.join(os.path.expanduser("~"), ".config")
+    return os.path.join(config_home, "wayfire.ini")
+
+
+def _parse_section(lines: List[str]) -> Dict[str, str]:
+    options = {}
+    pending = ""
+    for line in lines:
+        line = line.strip()
+        if pending:
+            line = pending + line
+            pending = ""
+        if not line or line.startswith("#"):
+            continue
+        if line.endswith("\\") and not line.endswith("\\\\"):
+            # The value continues on the next line
+            pending = line[:-1]
+            continue
+
+        # Strip comments, `\#` is a literal '#'
+        index = line.find("#")
+        while index > 0 and line[index - 1] == "\\":
+            index = line.find("#", index + 1)
+        if index > 0:
+            line = line[:index]
+        line = line.replace("\\#", "#")
+
+        key, separator, value = line.partition("=")
+        if separator:
+            options[key.strip()] = value.strip()
+    return options
+
+
+class IniFile:
+    """
+    An ini file which is parsed incrementally.
+
+    The file is only read if its size, modification time or inode changed, and only the sections whose
+    text changed since the last parse are parsed again.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.sections: Dict[str, Dict[str, str]] = {}
+        self._signature: Optional[Tuple[int, int, int]] = None
+        self._texts: Dict[str, Tuple[str, ...]] = {}
+
+    def changed(self) -> bool:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return self._signature is not None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino) != self._signature
+
+    def parse(self) -> Tuple[int, int]:
+        """
+        Re-read the file if it changed.
+
+        Returns:
+            Tuple[int, int]: The number of sections which were parsed and the number of sections
+                             whose previous result was reused.
+        """
+        try:
+            stat = os.stat(self.path)
+            with open(self.path) as file:
+                text = file.read()
+        except FileNotFoundError:
+            self._signature = None
+            self.sections = {}
+            self._texts = {}
+            return 0, 0
+        self._signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+        grouped: Dict[str, List[str]] = {}
+        current: Optional[List[str]] = None
+        for line in text.splitlines():
+            stripped = line.strip()
+            if stripped.startswith("[") and stripped.endswith("]"):
+                current = grouped.setdefault(stripped[1:-1].strip(), [])
+            elif current is not None:
+                current.append(line)
+
+        parsed = reused = 0
+        sections = {}
+        texts = {}
+        for name, lines in grouped.items():
+            lines = tuple(lines)
+            texts[name] = lines
+            if self._texts.get(name) == lines:
+                sections[name] = self.sections[name]
+                reused += 1
+            else:
+                sections[name] = _parse_section(list(lines))
+                parsed += 1
+        self.sections = sections
+        self._texts = texts
+        return parsed, reused
+
+    def options(self) -> Dict[str, str]:
+        """All options of the file, by "section/option"."""
+        return {section + "/" + key: value
+                for section, options in self.sections.items() for key, value in options.items()}
+
+
+class ReloadReport:
+    """
+    Result of one `ConfigWatcher.reload()`.
+
+    Attributes:
+        parse_time (float): Seconds spent checking and parsing the files.
+        apply_time (float): Seconds spent sending the changed options.
+        sections_parsed (int): Sections which had to be parsed.
+        sections_reused (int): Sections which were unchanged and not parsed again.
+        changed (Dict[str, str]): Options whose value changed in the files since the last reload.
+        sent (int): Options sent to the compositor; this excludes changed options which already had
+            the new value in the compositor.
+        unknown (List[str]): Options which Wayfire doesn't know, e.g. entries of compound options or
+            options of plugins which are not loaded. These are not sent, and are tried again on the
+            next reload.
+        removed (List[str]): Options which were removed from the files. Wayfire keeps their current
+            values until it reloads its config.
+    """
+    def __init__(self):
+        self.parse_time = 0.0
+        self.apply_time = 0.0
+        self.sections_parsed = 0
+        self.sections_reused = 0
+        self.changed: Dict[str, str] = {}
+        self.sent = 0
+        self.unknown: List[str] = []
+        self.removed: List[str] = []
+
+
+class _Inotify:
+    # Watches directories rather than files: editors often replace the file instead of writing to it
+    def __init__(self, directories: List[str]):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        for directory in directories:
+            mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_MODIFY
+            if libc.inotify_add_watch(self.fd, os.fsencode(directory), mask) < 0:
+                os.close(self.fd)
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {directory}")
+
+    def read(self) -> List[str]:
+        names = []
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return names
+        offset = 0
+        while offset < len(data):
+            _, _, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            names.append(os.fsdecode(data[offset:offset + length].rstrip(b"\0")))
+            offset += length
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+
+class ConfigWatcher:
+    """
+    Watches config files and pushes the options which changed in them to Wayfire.
+
+    Changes are detected with inotify, or by polling the files' modification times if inotify is
+    not available. On every change, only the modified files and, within them, the modified sections
+    are parsed again. The result is compared with the state applied last, and the changed options are
+    sent in a single `set_option_values` call, skipping options which already have the new value.
+
+    Example:
+        >>> watcher = ConfigWatcher(socket)
+        >>> watcher.run(lambda report: print(report.changed))
+    """
+    def __init__(self, socket: WayfireSocket, paths: Optional[List[str]]=None, poll_interval: float=0.5,
+                 use_inotify: bool=True):
+        """
+        Args:
+            socket (WayfireSocket): The connection to push the options over.
+            paths (Optional[List[str]]): The files to watch. Defaults to the file Wayfire reads.
+            poll_interval (float): Seconds between checks when polling instead of using inotify.
+            use_inotify (bool): Whether to try inotify before falling back to polling.
+        """
+        self.manager = ConfigManager(socket)
+        self.files = [IniFile(os.path.abspath(path)) for path in (paths or [default_config_path()])]
+        self.poll_interval = poll_interval
+        self._parsed: Dict[str, str] = {}
+        self._applied: Dict[str, str] = {}
+        self._inotify: Optional[_Inotify] = None
+        if use_inotify:
+            try:
+                self._inotify = _Inotify(sorted({os.path.dirname(f.path) for f in self.files}))
+            except (OSError, AttributeError):
+                self._inotify = None
+
+    @property
+    def uses_inotify(self) -> bool:
+        return self._inotify is not None
+
+    def reload(self, force: bool=False) -> ReloadReport:
+        """
+        Parse the files which changed and apply the options which changed.
+
+        Args:
+            force (bool): Re-read all files even if they appear unchanged.
+        """
+        report = ReloadReport()
+        start = time.perf_counter()
+        options: Dict[str, str] = {}
+        for ini in self.files:
+            if force or ini.changed():
+                parsed, reused = ini.parse()
+                report.sections_parsed += parsed
+                report.sections_reused += reused
+            else:
+                report.sections_reused += len(ini.sections)
+            # Later files override earlier ones
+            options.update(ini.options())
+
+        report.changed = {key: value for key, value in options.items() if self._parsed.get(key) != value}
+        report.removed = [key for key in self._parsed if key not in options]
+        self._parsed = options
+        for key in report.removed:
+            self._applied.pop(key, None)
+        # Options which were unknown before are retried, their plugin may have been loaded since
+        pending = {key: value for key, value in options.items() if self._applied.get(key) != value}
+        report.parse_time = time.perf_counter() - start
+        if not pending:
+            return report
+
+        start = time.perf_counter()
+        writes = self.manager.writes
+        if any(key not in self.manager.values for key in pending):
+            self.manager.refresh()
+        self._apply(pending)
+        if "core/plugins" in pending and any(key not in self._applied for key in pending):
+            # Options of plugins which were just enabled are only known after the plugins are loaded
+            self.manager.refresh()
+            self._apply({key: value for key, value in pending.items() if key not in self._applied})
+        report.unknown = [key for key in pending if key not in self._applied]
+        report.sent = self.manager.writes - writes
+        report.apply_time = time.perf_counter() - start
+        return report
+
+    def _apply(self, options: Dict[str, str]):
+        known = self.manager.values
+        updates = {key: value for key, value in options.items() if key in known}
+        self.manager.set_many(updates)
+        self.manager.flush()
+        self._applied.update(updates)
+
+    def wait(self, timeout: Optional[float]=None) -> bool:
+        """Wait until one of the watched files may have changed. Returns False on timeout."""
+        if self._inotify is None:
+            end = None if timeout is None else time.monotonic() + timeout
+            while not any(ini.changed() for ini in self.files):
+                if end is not None and time.monotonic() >= end:
+                    return False
+                time.sleep(self.poll_interval)
+            return True
+
+        names = {os.path.basename(ini.path) for ini in self.files}
+        end = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if end is None else max(0.0, end - time.monotonic())
+            readable, _, _ = select.select([self._inotify.fd], [], [], remaining)
+            if not readable:
+                return False
+            if names.intersection(self._inotify.read()):
+                return True
+
+    def run(self, callback: Optional[Callable[[ReloadReport], None]]=None):
+        """Apply the files once, then apply every change until interrupted."""
+        while True:
+            report = self.reload()
+            if callback is not None and (report.changed or report.unknown or report.removed):
+                callback(report)
+            self.wait()
+
+    def close(self):
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
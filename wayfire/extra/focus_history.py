@@ -0,0 +1,243 @@
+from typing import Dict, Iterator, List, Optional, Tuple
+from wayfire.extra.workspaces import WorkspaceOccupancy
+from wayfire.ipc import WayfireSocket
+
+
+class FocusEntry:
+    """A view in the focus history, linked to the views focused before and after it."""
+    __slots__ = ("view_id", "app_id", "output_id", "minimized", "newer", "older")
+
+    def __init__(self, view: dict):
+        self.view_id: int = view["id"]
+        self.app_id: Optional[str] = view.get("app-id")
+        self.output_id: Optional[int] = view.get("output-id")
+        self.minimized: bool = bool(view.get("minimized"))
+        self.newer: Optional["FocusEntry"] = None
+        self.older: Optional["FocusEntry"] = None
+
+    def __repr__(self):
+        return f"FocusEntry({self.view_id}, {self.app_id!r})"
+
+    def update(self, view: dict):
+        self.app_id = view.get("app-id", self.app_id)
+        self.output_id = view.get("output-id", self.output_id)
+        self.minimized = bool(view.get("minimized", self.minimized))
+
+
+def _is_switchable(view: dict) -> bool:
+    return view.get("role") == "toplevel" and view.get("mapped", True) and view.get("pid") != -1
+
+
+class FocusHistory:
+    """
+    Toplevel views in most-recently-focused order, kept up to date from IPC events.
+
+    The history is a doubly linked list with a dictionary from view id to list entry, so moving a
+    view to the front on `view-focused` and removing it on `view-unmapped` take constant time, and
+    iterating never sorts. Minimized views are moved to the back. The history is seeded once from
+    `list_views`, ordered by `last-focus-timestamp`.
+
+    `cycle()` picks the target from memory and sends a single `set_focus` request, so an alt-tab style
+    switcher needs one round trip per key press.
+
+    Pass every event read from the socket to `handle_event()`.
+
+    Example:
+        >>> history = FocusHistory(sock)
+        >>> history.watch()
+        >>> [entry.view_id for entry in history.iter(app_id="kitty")]
+        [12, 7]
+        >>> history.cycle()         # switch to the previously focused view
+    """
+    EVENTS = ["view-focused", "view-mapped", "view-unmapped", "view-minimized", "view-app-id-changed"]
+
+    def __init__(self, socket: WayfireSocket, occupancy: Optional[WorkspaceOccupancy]=None):
+        """
+        Args:
+            socket (WayfireSocket): The connection the events are read from.
+            occupancy (Optional[WorkspaceOccupancy]): Needed to filter by workspace. The caller
+                passes the events to it.
+        """
+        self.socket = socket
+        self.occupancy = occupancy
+        self._entries: Dict[int, FocusEntry] = {}
+        self._newest: Optional[FocusEntry] = None
+        self._oldest: Optional[FocusEntry] = None
+        self._loaded = False
+
+    def watch(self):
+        """Subscribe the socket to the events the history needs."""
+        events = list(self.EVENTS)
+        if self.occupancy is not None:
+            events += [event for event in self.occupancy.EVENTS if event not in events]
+        return self.socket.watch(events)
+
+    def __len__(self):
+        self._load()
+        return len(self._entries)
+
+    def __contains__(self, view_id: int) -> bool:
+        self._load()
+        return view_id in self._entries
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        views = [view for view in self.socket.list_views() if _is_switchable(view)]
+        views.sort(key=lambda view: view.get("last-focus-timestamp", 0))
+        for view in views:
+            self._push_front(FocusEntry(view))
+        for view in views:
+            if view.get("minimized"):
+                self._move_back(self._entries[view["id"]])
+
+    def _unlink(self, entry: FocusEntry):
+        if entry.newer is not None:
+            entry.newer.older = entry.older
+        else:
+            self._newest = entry.older
+        if entry.older is not None:
+            entry.older.newer = entry.newer
+        else:
+            self._oldest = entry.newer
+        entry.newer = entry.older = None
+
+    def _push_front(self, entry: FocusEntry):
+        entry.older = self._newest
+        entry.newer = None
+        if self._newest is not None:
+            self._newest.newer = entry
+        else:
+            self._oldest = entry
+        self._newest = entry
+        self._entries[entry.view_id] = entry
+
+    def _push_back(self, entry: FocusEntry):
+        entry.newer = self._oldest
+        entry.older = None
+        if self._oldest is not None:
+            self._oldest.older = entry
+        else:
+            self._newest = entry
+        self._oldest = entry
+        self._entries[entry.view_id] = entry
+
+    def _move_back(self, entry: FocusEntry):
+        self._unlink(entry)
+        self._push_back(entry)
+
+    def focused(self, view: dict):
+        """Move a view to the front of the history."""
+        self._load()
+        entry = self._entries.get(view["id"])
+        if entry is None:
+            if not _is_switchable(view):
+                return
+            entry = FocusEntry(view)
+        else:
+            entry.update(view)
+            self._unlink(entry)
+        self._push_front(entry)
+
+    def remove(self, view_id: int):
+        entry = self._entries.pop(view_id, None)
+        if entry is not None:
+            self._unlink(entry)
+
+    def __iter__(self) -> Iterator[FocusEntry]:
+        return self.iter()
+
+    def iter(self, output_id: Optional[int]=None, app_id: Optional[str]=None,
+             workspace: Optional[Tuple[int, int]]=None, include_minimized: bool=True,
+             reverse: bool=False) -> Iterator[FocusEntry]:
+        """
+        Iterate over the views from the most to the least recently focused.
+
+        Args:
+            output_id (Optional[int]): Only views on this output.
+            app_id (Optional[str]): Only views of this application.
+            workspace (Optional[Tuple[int, int]]): Only views on this workspace of their output. Needs
+                an occupancy map.
+            include_minimized (bool): Whether to include minimized views.
+            reverse (bool): Iterate from the least recently focused view instead.
+
+        Raises:
+            ValueError: If a workspace is given but the history has no occupancy map.
+        """
+        self._load()
+        if workspace is not None and self.occupancy is None:
+            raise ValueError("Filtering by workspace needs a WorkspaceOccupancy.")
+        entry = self._oldest if reverse else self._newest
+        while entry is not None:
+            following = entry.newer if reverse else entry.older
+            if ((output_id is None or entry.output_id == output_id) and
+                    (app_id is None or entry.app_id == app_id) and
+                    (include_minimized or not entry.minimized) and
+                    (workspace is None or workspace in self.occupancy.workspaces_of(entry.view_id))):
+                yield entry
+            entry = following
+
+    def view_ids(self, **filters) -> List[int]:
+        """The view ids in most-recently-focused order, see `iter()` for the filters."""
+        return [entry.view_id for entry in self.iter(**filters)]
+
+    def cycle(self, reverse: bool=False, **filters) -> Optional[int]:
+        """
+        Focus the view an alt-tab switcher would switch to, with a single `set_focus` request.
+
+        Forward cycling focuses the most recently focused view after the current one, so repeated
+        calls switch back and forth between two views. Reverse cycling focuses the least recently
+        focused view, so repeated calls visit every view.
+
+        Args:
+            reverse (bool): Cycle backwards.
+            **filters: Restrict the views cycled through, see `iter()`.
+
+        Returns:
+            Optional[int]: The id of the focused view, None if there is no other view.
+        """
+        entries = self.iter(reverse=reverse, **filters)
+        target = next(entries, None)
+        if not reverse and target is self._newest:
+            target = next(entries, None)
+        if target is None or target is self._newest:
+            return None
+        self.socket.set_focus(target.view_id)
+        # Don't wait for the event, so repeated key presses keep cycling
+        self._unlink(target)
+        self._push_front(target)
+        target.minimized = False
+        return target.view_id
+
+    def invalidate(self):
+        """Forget the history, it is read again from `list_views` on next use."""
+        self._entries = {}
+        self._newest = self._oldest = None
+        self._loaded = False
+
+    def handle_event(self, event: dict):
+        """Update the history according to an event. Unrelated events are ignored."""
+        if not self._loaded:
+            return
+        view = event.get("view")
+        if not isinstance(view, dict) or "id" not in view:
+            return
+        name = event.get("event")
+        if name == "view-focused":
+            self.focused(view)
+        elif name == "view-unmapped":
+            self.remove(view["id"])
+        elif name == "view-minimized":
+            entry = self._entries.get(view["id"])
+            if entry is not None:
+                entry.minimized = bool(view.get("minimized"))
+                if entry.minimized:
+                    self._move_back(entry)
+        elif name in ("view-mapped", "view-app-id-changed"):
+            entry = self._entries.get(view["id"])
+            if entry is not None:
+                entry.update(view)
+            elif _is_switchable(view):
+                # Mapped but not focused yet
+                self._push_back(FocusEntry(view))
@@ -0,0 +1,155 @@
+from typing import Any, Dict, List, Optional, Tuple
+from wayfire.ipc import WayfireSocket
+
+# View states learned from the view objects in events
+_VIEW_STATES = ("sticky", "minimized", "fullscreen")
+
+_ALPHA_TOLERANCE = 1e-4
+
+
+class IdempotentSocket:
+    """
+    A socket wrapper which skips view state writes that would not change anything.
+
+    The wrapper remembers the last known value of every (view, property): from its own successful
+    writes, and from the view objects carried by view events, which are learned from when read
+    through the wrapper's `read_next_event()` or passed to `handle_event()`. A call to
+    one of the wrapped setters whose value equals the remembered one is answered locally with
+    `{"result": "ok"}` and never reaches the compositor. Everything a view knows is forgotten when
+    it is unmapped.
+
+    Wrapped setters: `set_view_alpha`, `set_view_sticky`, `set_view_always_on_top`,
+    `set_view_minimized`, `set_view_fullscreen` and `configure_view`. All other attributes are
+    forwarded to the wrapped socket, so the wrapper can replace it in existing scripts.
+
+    Suppression is only safe while the events in `EVENTS` are watched and handled: otherwise a
+    state changed by the user or another client is never learned, and a write restoring the
+    remembered value is skipped wrongly. `watch()` always subscribes to them. Alpha and
+    always-on-top are not reported in events, so if other clients change them, call `forget()` for
+    the view or its writes may be skipped wrongly.
+
+    Example:
+        >>> sock = IdempotentSocket(WayfireSocket())
+        >>> sock.watch(["view-focused"])    # also subscribes to EVENTS
+        >>> sock.set_view_alpha(view_id, 1.0)
+        >>> sock.set_view_alpha(view_id, 1.0)    # not sent
+        >>> sock.suppressed
+        {'set_view_alpha': 1}
+
+    Attributes:
+        sent (Dict[str, int]): Writes passed on to the compositor, per method.
+        suppressed (Dict[str, int]): Writes skipped because they would not change anything, per method.
+    """
+    EVENTS = ["view-geometry-changed", "view-minimized", "view-sticky", "view-fullscreen", "view-unmapped"]
+
+    def __init__(self, socket: WayfireSocket):
+        self.socket = socket
+        self.sent: Dict[str, int] = {}
+        self.suppressed: Dict[str, int] = {}
+        self._known: Dict[int, Dict[str, Any]] = {}
+
+    def __getattr__(self, name):
+        return getattr(self.socket, name)
+
+    def watch(self, events: Optional[List[str]]=None):
+        """
+        Subscribe the socket to `events` and to the events the wrapper needs.
+
+        Args:
+            events (Optional[List[str]]): Further events to receive. None subscribes to all events,
+                like `WayfireSocket.watch`.
+        """
+        if events is None:
+            return self.socket.watch()
+        return self.socket.watch(list(self.EVENTS) + [event for event in events if event not in self.EVENTS])
+
+    def known(self, view_id: int, key: str) -> Any:
+        """The remembered value of a view property, None if unknown."""
+        return self._known.get(view_id, {}).get(key)
+
+    def forget(self, view_id: Optional[int]=None):
+        """Forget everything about a view, or about all views."""
+        if view_id is None:
+            self._known = {}
+        else:
+            self._known.pop(view_id, None)
+
+    def _write(self, method: str, view_id: int, key: str, value: Any, unchanged: bool, call, *args):
+        if unchanged:
+            self.suppressed[method] = self.suppressed.get(method, 0) + 1
+            return {"result": "ok"}
+        response = call(*args)
+        self.sent[method] = self.sent.get(method, 0) + 1
+        self._known.setdefault(view_id, {})[key] = value
+        return response
+
+    def _same(self, view_id: int, key: str, value: Any) -> bool:
+        known = self._known.get(view_id)
+        return known is not None and key in known and known[key] == value
+
+    def set_view_alpha(self, view_id: int, alpha: float):
+        known = self.known(view_id, "alpha")
+        unchanged = known is not None and abs(known - alpha) < _ALPHA_TOLERANCE
+        return self._write("set_view_alpha", view_id, "alpha", alpha, unchanged,
+                           self.socket.set_view_alpha, view_id, alpha)
+
+    def get_view_alpha(self, view_id: int):
+        response = self.socket.get_view_alpha(view_id)
+        if isinstance(response, dict) and "alpha" in response:
+            self._known.setdefault(view_id, {})["alpha"] = response["alpha"]
+        return response
+
+    def set_view_sticky(self, view_id: int, state: bool):
+        return self._write("set_view_sticky", view_id, "sticky", state, self._same(view_id, "sticky", state),
+                           self.socket.set_view_sticky, view_id, state)
+
+    def set_view_always_on_top(self, view_id: int, always_on_top: bool):
+        return self._write("set_view_always_on_top", view_id, "always-on-top", always_on_top,
+                           self._same(view_id, "always-on-top", always_on_top),
+                           self.socket.set_view_always_on_top, view_id, always_on_top)
+
+    def set_view_minimized(self, view_id: int, state: bool):
+        return self._write("set_view_minimized", view_id, "minimized", state, self._same(view_id, "minimized", state),
+                           self.socket.set_view_minimized, view_id, state)
+
+    def set_view_fullscreen(self, view_id: int, state: bool):
+        return self._write("set_view_fullscreen", view_id, "fullscreen", state,
+                           self._same(view_id, "fullscreen", state),
+                           self.socket.set_view_fullscreen, view_id, state)
+
+    def configure_view(self, view_id: int, x: int, y: int, w: int, h: int, output_id=None):
+        geometry: Tuple[int, int, int, int] = (x, y, w, h)
+        unchanged = (self._same(view_id, "geometry", geometry) and
+                     (output_id is None or self._same(view_id, "output-id", output_id)))
+        response = self._write("configure_view", view_id, "geometry", geometry, unchanged,
+                               self.socket.configure_view, view_id, x, y, w, h, output_id)
+        if not unchanged and output_id is not None:
+            self._known[view_id]["output-id"] = output_id
+        return response
+
+    def _learn(self, view: dict):
+        known = self._known.setdefault(view["id"], {})
+        for state in _VIEW_STATES:
+            if state in view:
+                known[state] = view[state]
+        geometry = view.get("geometry")
+        if geometry:
+            known["geometry"] = (geometry["x"], geometry["y"], geometry["width"], geometry["height"])
+        if "output-id" in view:
+            known["output-id"] = view["output-id"]
+
+    def handle_event(self, event: dict):
+        """Learn the state of the view carried by a view event, or forget it when it is unmapped."""
+        view = event.get("view")
+        if not isinstance(view, dict) or "id" not in view:
+            return
+        if event.get("event") == "view-unmapped":
+            self.forget(view["id"])
+        else:
+            self._learn(view)
+
+    def read_next_event(self):
+        """Read the next event from the wrapped socket and learn from it."""
+        event = self.socket.read_next_event()
+        self.handle_event(event)
+        return event
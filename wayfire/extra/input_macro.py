@@ -0,0 +1,221 @@
+import json as js
+import select
+import time
+from typing import Dict, List, Optional
+from wayfire.extra.input_sequence import InputSequence, PlaybackReport, SequencePlayer
+from wayfire.extra.stipc import Stipc
+from wayfire.ipc import WayfireSocket
+
+TRACE_FORMAT = "wayfire-input-trace"
+TRACE_VERSION = 1
+
+# Record kinds in a trace. Every record is a list starting with the time in milliseconds and the kind.
+KEY = "k"            # [t, "k", key, state]
+BUTTON = "b"         # [t, "b", combo, mode]
+MOVE = "m"           # [t, "m", x, y]
+TOUCH = "t"          # [t, "t", finger, x, y]
+TOUCH_RELEASE = "r"  # [t, "r", finger]
+MODIFIERS = "M"      # [t, "M", depressed modifier mask]
+
+# XKB modifier mask bits and the key which is replayed for them
+MODIFIER_KEYS = {
+    1: "KEY_LEFTSHIFT",
+    4: "KEY_LEFTCTRL",
+    8: "KEY_LEFTALT",
+    64: "KEY_LEFTMETA",
+}
+
+
+class InputTrace:
+    """
+    A timestamped list of input records, stored as one compact JSON array per line.
+
+    The first line of a trace file is a header identifying the format and its version.
+    """
+    def __init__(self, records: Optional[List[list]]=None):
+        self.records: List[list] = records if records is not None else []
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def duration(self) -> float:
+        """Length of the trace in milliseconds."""
+        return self.records[-1][0] if self.records else 0.0
+
+    def save(self, path: str):
+        with open(path, "w") as file:
+            file.write(js.dumps({"format": TRACE_FORMAT, "version": TRACE_VERSION}) + "\n")
+            for record in self.records:
+                file.write(js.dumps(record, separators=(",", ":")) + "\n")
+
+    @classmethod
+    def load(cls, path: str) -> "InputTrace":
+        with open(path) as file:
+            header = js.loads(file.readline())
+            if header.get("format") != TRACE_FORMAT:
+                raise ValueError(f"{path} is not an input trace.")
+            if header.get("version") != TRACE_VERSION:
+                raise ValueError(f"Unsupported input trace version {header.get('version')}.")
+            return cls([js.loads(line) for line in file if line.strip()])
+
+    def to_sequence(self) -> InputSequence:
+        """Convert the trace to an input sequence which reproduces it with the original timing."""
+        sequence = InputSequence()
+        modifiers = 0
+        for record in self.records:
+            at, kind, args = record[0], record[1], record[2:]
+            if kind == KEY:
+                sequence.key(args[0], args[1], at=at)
+            elif kind == BUTTON:
+                sequence.button(args[0], args[1], at=at)
+            elif kind == MOVE:
+                sequence.move(args[0], args[1], at=at)
+            elif kind == TOUCH:
+                sequence.touch(args[0], args[1], args[2], at=at)
+            elif kind == TOUCH_RELEASE:
+                sequence.release_touch(args[0], at=at)
+            elif kind == MODIFIERS:
+                for bit, key in MODIFIER_KEYS.items():
+                    if (args[0] ^ modifiers) & bit:
+                        sequence.key(key, bool(args[0] & bit), at=at)
+                modifiers = args[0]
+            else:
+                raise ValueError(f"Unknown record kind '{kind}' in input trace.")
+        return sequence
+
+
+class InputRecorder:
+    """
+    Records an interaction into an `InputTrace`.
+
+    Input can be captured in two ways, which may be combined:
+
+    - Input injected through the recorder's `set_key_state`, `click_button`, `move_cursor`,
+      `set_touch` and `release_touch` methods is recorded and, by default, also sent to Wayfire
+      through stipc. Use this to capture scripted scenarios.
+    - `capture()` records real user input: it follows `keyboard-modifier-state-changed` events and
+      samples `get_cursor_position` at a fixed rate. Wayfire does not report individual key presses
+      or button clicks over IPC, so only modifiers and pointer motion are captured this way.
+      Wayfire reports the cursor relative to the focused output; the recorder adds the output's
+      origin, so the trace holds global coordinates like the ones `move_cursor` takes.
+    """
+    def __init__(self, socket: WayfireSocket, passthrough: bool=True):
+        self.socket = socket
+        self.stipc = Stipc(socket) if passthrough else None
+        self.trace = InputTrace()
+        self._start: Optional[float] = None
+        self._outputs: Dict[int, dict] = {}
+        self._origin = (0, 0)
+
+    def _record(self, kind: str, *args):
+        if self._start is None:
+            # The trace starts with the first recorded input, not when the recorder was created
+            self._start = time.monotonic()
+        at = round((time.monotonic() - self._start) * 1000, 2)
+        self.trace.records.append([at, kind, *args])
+
+    def set_key_state(self, key: str, state: bool):
+        self._record(KEY, key, state)
+        if self.stipc:
+            return self.stipc.set_key_state(key, state)
+
+    def click_button(self, btn_with_mod: str, mode: str):
+        self._record(BUTTON, btn_with_mod, mode)
+        if self.stipc:
+            return self.stipc.click_button(btn_with_mod, mode)
+
+    def move_cursor(self, x: int, y: int):
+        self._record(MOVE, x, y)
+        if self.stipc:
+            return self.stipc.move_cursor(x, y)
+
+    def set_touch(self, id: int, x: int, y: int):
+        self._record(TOUCH, id, x, y)
+        if self.stipc:
+            return self.stipc.set_touch(id, x, y)
+
+    def release_touch(self, id: int):
+        self._record(TOUCH_RELEASE, id)
+        if self.stipc:
+            return self.stipc.release_touch(id)
+
+    def _set_origin(self, output):
+        if not isinstance(output, dict) or "geometry" not in output:
+            output = self._outputs.get(output)
+        if output is not None:
+            self._origin = (output["geometry"]["x"], output["geometry"]["y"])
+
+    def _record_event(self, event: dict):
+        if event.get("event") == "output-gain-focus":
+            self._set_origin(event.get("output"))
+            return
+        if event.get("event") != "keyboard-modifier-state-changed":
+            return
+        depressed = event.get("state", {}).get("depressed")
+        if depressed is not None:
+            self._record(MODIFIERS, depressed)
+
+    def capture(self, duration: float, cursor_rate: float=120):
+        """
+        Record modifier changes and cursor motion for `duration` seconds.
+
+        Subscribes the socket to `keyboard-modifier-state-changed` and `output-gain-focus`. Cursor
+        positions are only recorded when they differ from the previous sample. Timestamps start at
+        the beginning of the capture, or at the first input recorded before it.
+
+        Args:
+            duration (float): How long to record, in seconds.
+            cursor_rate (float): Cursor samples per second.
+        """
+        self.socket.watch(["keyboard-modifier-state-changed", "output-gain-focus"])
+        self._outputs = {output["id"]: output for output in self.socket.list_outputs()}
+        self._set_origin(self.socket.get_focused_output())
+        if self._start is None:
+            self._start = time.monotonic()
+        period = 1.0 / cursor_rate
+        end = time.monotonic() + duration
+        next_sample = time.monotonic()
+        last_position = None
+
+        while time.monotonic() < end:
+            # get_cursor_position queues any events which arrive in the meantime
+            while self.socket.pending_events:
+                self._record_event(self.socket.pending_events.pop(0))
+
+            now = time.monotonic()
+            if now >= next_sample:
+                x, y = self.socket.get_cursor_position()
+                position = (round(self._origin[0] + x), round(self._origin[1] + y))
+                if position != last_position:
+                    self._record(MOVE, *position)
+                    last_position = position
+                next_sample += period
+                continue
+
+            readable, _, _ = select.select([self.socket.client], [], [], max(0.0, min(next_sample, end) - now))
+            if readable:
+                self._record_event(self.socket.read_next_event())
+
+        while self.socket.pending_events:
+            self._record_event(self.socket.pending_events.pop(0))
+        return self.trace
+
+
+def replay(socket: WayfireSocket, trace: InputTrace, speed: float=1.0) -> PlaybackReport:
+    """
+    Send a recorded trace to Wayfire through stipc.
+
+    The trace is compiled into pre-encoded frames and sent pipelined. Every frame is scheduled
+    against the start of the replay rather than the previous frame, so delays do not accumulate
+    over long traces.
+
+    Args:
+        socket (WayfireSocket): The socket to send the input on.
+        trace (InputTrace): The trace to replay.
+        speed (float): Replay speed factor, e.g. 4.0 replays four times faster than recorded.
+
+    Returns:
+        PlaybackReport: Deviation from the recorded timeline and any errors reported by Wayfire.
+    """
+    return SequencePlayer(socket).play(trace.to_sequence().compile(), speed=speed)
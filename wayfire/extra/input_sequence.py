@@ -0,0 +1,276 @@
+import statistics
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from wayfire.core.template import get_msg_template
+from wayfire.extra.stipc import KEY_MODIFIERS
+from wayfire.ipc import WayfireSocket
+
+
+class CompiledSequence:
+    """
+    An input sequence turned into a timeline of pre-encoded request frames.
+
+    Attributes:
+        timeline (List[Tuple[float, str, bytes]]): (offset in seconds, method, frame), sorted by offset.
+    """
+    def __init__(self, timeline: List[Tuple[float, str, bytes]]):
+        self.timeline = timeline
+
+    def __len__(self):
+        return len(self.timeline)
+
+    @property
+    def duration(self) -> float:
+        return self.timeline[-1][0] if self.timeline else 0.0
+
+
+class PlaybackReport:
+    """
+    Timing and error information about one playback of a `CompiledSequence`.
+
+    Attributes:
+        duration (float): Seconds from the start of the playback until the last reply was received.
+        deviations (List[float]): For each frame, seconds between its intended and its actual send time.
+        errors (List[Tuple[int, str, str]]): (frame index, method, error) for every rejected request.
+    """
+    def __init__(self):
+        self.duration = 0.0
+        self.deviations: List[float] = []
+        self.errors: List[Tuple[int, str, str]] = []
+
+    @property
+    def frames(self) -> int:
+        return len(self.deviations)
+
+    @property
+    def mean_deviation(self) -> float:
+        return statistics.fmean(self.deviations) if self.deviations else 0.0
+
+    @property
+    def max_deviation(self) -> float:
+        return max(self.deviations, default=0.0)
+
+    @property
+    def jitter(self) -> float:
+        """Standard deviation of the send time deviations, in seconds."""
+        return statistics.pstdev(self.deviations) if len(self.deviations) > 1 else 0.0
+
+
+class InputSequence:
+    """
+    A declarative script of key, pointer, touch and tablet input with explicit timestamps.
+
+    Every action is scheduled at a point in time, given in milliseconds from the start of the sequence.
+    Actions without an explicit `at` are scheduled at the current position of the script cursor, which
+    starts at 0 and is advanced with `wait()`. The sequence is compiled once into pre-encoded frames and
+    can then be played back any number of times with `SequencePlayer`.
+
+    Example:
+        >>> seq = InputSequence()
+        >>> seq.press_key("A-KEY_TAB", hold=50)
+        >>> seq.wait(100)
+        >>> seq.drag("BTN_LEFT", 100, 100, 500, 300, duration=250, steps=50)
+        >>> report = SequencePlayer(socket).play(seq.compile())
+    """
+    def __init__(self):
+        self._actions: List[Tuple[float, int, dict]] = []
+        self._cursor = 0.0
+
+    def __len__(self):
+        return len(self._actions)
+
+    def _add(self, at: Optional[float], method: str, data: Dict[str, Any]):
+        message = get_msg_template(method)
+        message["data"] = data
+        when = self._cursor if at is None else at
+        if when < 0:
+            raise ValueError(f"Cannot schedule {method} at negative time {when}ms.")
+
+        # The insertion index keeps actions with equal timestamps in the order they were added
+        self._actions.append((when, len(self._actions), message))
+        return self
+
+    def wait(self, ms: float):
+        """Advance the script cursor by `ms` milliseconds."""
+        self._cursor += ms
+        return self
+
+    def key(self, key: str, state: bool, at: Optional[float]=None):
+        return self._add(at, "stipc/feed_key", {"key": key, "state": state})
+
+    def press_key(self, keys: str, hold: float=0, at: Optional[float]=None):
+        """
+        Press and release a key combination, in the format accepted by `Stipc.press_key`.
+
+        The modifiers and the key are pressed at the start, the key is released after `hold`
+        milliseconds, followed by the modifiers. The script cursor is moved past the release.
+        """
+        start = self._cursor if at is None else at
+        key_combinations = keys.split("-")
+        modifiers = [KEY_MODIFIERS[m] for m in key_combinations[:-1] if m in KEY_MODIFIERS]
+
+        for modifier in modifiers:
+            self.key(modifier, True, at=start)
+        self.key(key_combinations[-1], True, at=start)
+        self.key(key_combinations[-1], False, at=start + hold)
+        for modifier in modifiers:
+            self.key(modifier, False, at=start + hold)
+
+        self._cursor = max(self._cursor, start + hold)
+        return self
+
+    def button(self, btn_with_mod: str, mode: str, at: Optional[float]=None):
+        return self._add(at, "stipc/feed_button", {"mode": mode, "combo": btn_with_mod})
+
+    def move(self, x: int, y: int, at: Optional[float]=None):
+        return self._add(at, "stipc/move_cursor", {"x": x, "y": y})
+
+    def drag(self, button: str, start_x: int, start_y: int, end_x: int, end_y: int,
+             duration: float, steps: int=10, release: bool=True, at: Optional[float]=None):
+        """
+        Press `button` at the start position and move to the end position over `duration` milliseconds.
+
+        Unlike `Stipc.click_and_drag`, the motion events are evenly spaced in time, so the speed of the
+        drag does not depend on the IPC latency. The script cursor is moved past the end of the drag.
+        """
+        if steps < 1:
+            raise ValueError(f"A drag needs at least one step, got {steps}.")
+        start = self._cursor if at is None else at
+        dx = end_x - start_x
+        dy = end_y - start_y
+
+        self.move(start_x, start_y, at=start)
+        self.button(button, "press", at=start)
+        for i in range(steps + 1):
+            self.move(start_x + dx * i // steps, start_y + dy * i // steps, at=start + duration * i / steps)
+        if release:
+            self.button(button, "release", at=start + duration)
+
+        self._cursor = max(self._cursor, start + duration)
+        return self
+
+    def touch(self, finger: int, x: int, y: int, at: Optional[float]=None):
+        return self._add(at, "stipc/touch", {"finger": finger, "x": x, "y": y})
+
+    def release_touch(self, finger: int, at: Optional[float]=None):
+        return self._add(at, "stipc/touch_release", {"finger": finger})
+
+    def tablet_proximity(self, x: int, y: int, prox_in: bool, at: Optional[float]=None):
+        return self._add(at, "stipc/tablet/tool_proximity", {"x": x, "y": y, "proximity_in": prox_in})
+
+    def tablet_tip(self, x: int, y: int, state: bool, at: Optional[float]=None):
+        return self._add(at, "stipc/tablet/tool_tip", {"x": x, "y": y, "state": state})
+
+    def tablet_axis(self, x: int, y: int, pressure: float, at: Optional[float]=None):
+        return self._add(at, "stipc/tablet/tool_axis", {"x": x, "y": y, "pressure": pressure})
+
+    def tablet_button(self, btn: int, state: bool, at: Optional[float]=None):
+        return self._add(at, "stipc/tablet/tool_button", {"button": btn, "state": state})
+
+    def pad_button(self, btn: int, state: bool, at: Optional[float]=None):
+        return self._add(at, "stipc/tablet/pad_button", {"button": btn, "state": state})
+
+    @classmethod
+    def from_script(cls, script: List[dict]) -> "InputSequence":
+        """
+        Build a sequence from a list of action dictionaries, e.g. loaded from JSON.
+
+        Each entry has an "action" key naming one of the builder methods of this class
+        ("key", "press_key", "move", "drag", "touch", "wait", ...), and the arguments of
+        that method as the remaining keys.
+
+        Example:
+            >>> InputSequence.from_script([
+            ...     {"action": "move", "x": 10, "y": 10},
+            ...     {"action": "wait", "ms": 16},
+            ...     {"action": "button", "btn_with_mod": "BTN_LEFT", "mode": "full"},
+            ... ])
+        """
+        sequence = cls()
+        for entry in script:
+            args = dict(entry)
+            action = args.pop("action", None)
+            if action is None or action.startswith("_") or action in ("compile", "from_script"):
+                raise ValueError(f"Invalid action in input script: {entry}")
+            builder = getattr(sequence, action, None)
+            if builder is None:
+                raise ValueError(f"Unknown action '{action}' in input script.")
+            builder(**args)
+        return sequence
+
+    def compile(self) -> CompiledSequence:
+        """Sort the actions by time and encode each of them into a request frame."""
+        timeline = []
+        for when, _, message in sorted(self._actions, key=lambda a: (a[0], a[1])):
+            timeline.append((when / 1000, message["method"], WayfireSocket.encode_message(message)))
+        return CompiledSequence(timeline)
+
+
+class SequencePlayer:
+    """
+    Plays compiled input sequences on a monotonic-clock schedule without waiting for each reply.
+
+    Frames are written to the socket at their scheduled time. Replies are collected while the player
+    waits for the next frame and are checked for errors, but they never delay the following frames.
+    """
+    def __init__(self, socket: WayfireSocket, max_in_flight: int=256, spin: float=0.001):
+        """
+        Args:
+            socket (WayfireSocket): The socket to send the input on.
+            max_in_flight (int): Upper bound on requests sent but not yet answered. Once reached, the
+                player waits for a reply before sending the next frame.
+            spin (float): Seconds before each deadline during which the player busy-waits instead of
+                sleeping, to avoid oversleeping. Set to 0 to never busy-wait.
+        """
+        self.socket = socket
+        self.max_in_flight = max_in_flight
+        self.spin = spin
+
+    def play(self, sequence: CompiledSequence, speed: float=1.0) -> PlaybackReport:
+        """
+        Send all frames of `sequence` and wait for all replies.
+
+        Args:
+            sequence (CompiledSequence): The sequence to play.
+            speed (float): Playback speed factor, 2.0 plays the sequence twice as fast.
+
+        Returns:
+            PlaybackReport: Deviation from the intended timeline and any errors reported by Wayfire.
+        """
+        report = PlaybackReport()
+        in_flight: List[Tuple[int, str]] = []
+
+        def collect(response):
+            index, method = in_flight.pop(0)
+            if "error" in response:
+                report.errors.append((index, method, response["error"]))
+
+        self.socket.drain_replies()
+        start = time.monotonic()
+        for index, (offset, method, frame) in enumerate(sequence.timeline):
+            deadline = start + offset / speed
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                if in_flight:
+                    # Use the idle time to collect replies, but wake up in time for the deadline
+                    response = self.socket.poll_response(max(0.0, remaining - self.spin))
+                    if response is not None:
+                        collect(response)
+                    continue
+                if remaining > self.spin:
+                    time.sleep(remaining - self.spin)
+
+            while len(in_flight) >= self.max_in_flight:
+                collect(self.socket.read_response())
+
+            self.socket.send_frame(frame)
+            report.deviations.append(time.monotonic() - deadline)
+            in_flight.append((index, method))
+
+        while in_flight:
+            collect(self.socket.read_response())
+
+        report.duration = time.monotonic() - start
+        return report
@@ -0,0 +1,176 @@
+import select
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+from wayfire.core.template import get_msg_template
+from wayfire.ipc import WayfireSocket
+
+
+class InputStreamStats:
+    """
+    Counters of an `InputStream`.
+
+    Attributes:
+        sent (int): Samples written to the socket.
+        acked (int): Replies received for sent samples.
+        dropped (int): Samples replaced by a newer sample for the same channel before they were sent.
+        errors (int): Replies which reported an error.
+        backoffs (int): How many times the send rate was reduced because the socket backed up.
+        current_rate (float): The send rate currently in effect, in samples per second.
+    """
+    def __init__(self, rate: float):
+        self.sent = 0
+        self.acked = 0
+        self.dropped = 0
+        self.errors = 0
+        self.backoffs = 0
+        self.current_rate = rate
+        self.started = time.monotonic()
+
+    @property
+    def achieved_rate(self) -> float:
+        """Samples sent per second since the stream was created."""
+        elapsed = time.monotonic() - self.started
+        return self.sent / elapsed if elapsed > 0 else 0.0
+
+
+class InputStream:
+    """
+    Sends pointer motion, touch motion and tablet axis samples at a target rate without waiting for replies.
+
+    Each kind of sample (the cursor, every touch finger and the tablet tool) is a channel holding only its
+    most recent unsent sample. Samples are sent at most `rate` times per second; a sample which is replaced
+    before its turn comes is counted as dropped, which is the right thing for absolute positions. Replies
+    are collected in bulk whenever the stream is used, and the first error reply is raised from the next
+    call to the stream.
+
+    If the socket stops accepting data or too many replies are outstanding, the send rate is halved, and it
+    slowly recovers towards the target rate afterwards.
+
+    Call `flush()` when done to send the remaining samples and wait for all replies, before the socket is
+    used for anything else.
+
+    Example:
+        >>> with InputStream(socket, rate=1000) as stream:
+        ...     for x in range(0, 1000):
+        ...         stream.move_cursor(x, 500)
+        >>> print(stream.stats.achieved_rate, stream.stats.dropped)
+    """
+    def __init__(self, socket: WayfireSocket, rate: float=1000, max_in_flight: int=512, min_rate: float=50):
+        self.socket = socket
+        self.target_rate = rate
+        self.min_rate = min_rate
+        self.max_in_flight = max_in_flight
+        self.stats = InputStreamStats(rate)
+        self.first_error: Optional[str] = None
+
+        self._pending: "OrderedDict[Tuple, bytes]" = OrderedDict()
+        self._next_send = time.monotonic()
+        self.socket.drain_replies()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
+
+    def _check_error(self):
+        if self.first_error is not None:
+            raise Exception(f"Input stream request failed: {self.first_error}")
+
+    def _push(self, channel: Tuple, method: str, data: dict):
+        self._check_error()
+        message = get_msg_template(method)
+        message["data"] = data
+        if channel in self._pending:
+            self.stats.dropped += 1
+        self._pending[channel] = self.socket.encode_message(message)
+        self.pump()
+
+    def move_cursor(self, x: int, y: int):
+        self._push(("cursor",), "stipc/move_cursor", {"x": x, "y": y})
+
+    def set_touch(self, id: int, x: int, y: int):
+        self._push(("touch", id), "stipc/touch", {"finger": id, "x": x, "y": y})
+
+    def tablet_tool_axis(self, x: int, y: int, pressure: float):
+        self._push(("tablet",), "stipc/tablet/tool_axis", {"x": x, "y": y, "pressure": pressure})
+
+    def _collect_replies(self):
+        while self.socket.unread_replies > 0:
+            response = self.socket.poll_response()
+            if response is None:
+                return
+            self._handle_reply(response)
+
+    def _handle_reply(self, response: dict):
+        self.stats.acked += 1
+        if "error" in response:
+            self.stats.errors += 1
+            if self.first_error is None:
+                self.first_error = response["error"]
+
+    def _backed_up(self) -> bool:
+        if self.socket.unread_replies >= self.max_in_flight:
+            return True
+        _, writable, _ = select.select([], [self.socket.client], [], 0)
+        return not writable
+
+    def _adapt_rate(self, backed_up: bool):
+        if backed_up:
+            self.stats.current_rate = max(self.min_rate, self.stats.current_rate / 2)
+            self.stats.backoffs += 1
+        elif self.stats.current_rate < self.target_rate:
+            # Additive increase: regain the target rate within about a second
+            step = self.target_rate / max(self.stats.current_rate, 1.0)
+            self.stats.current_rate = min(self.target_rate, self.stats.current_rate + step)
+
+    def pump(self):
+        """
+        Send the pending samples whose send slot has come and collect the available replies.
+
+        This is called automatically by every sample method, and only needs to be called explicitly
+        to make progress while no new samples are produced.
+        """
+        self._collect_replies()
+        while self._pending:
+            now = time.monotonic()
+            if now < self._next_send:
+                break
+
+            backed_up = self._backed_up()
+            self._adapt_rate(backed_up)
+            period = 1.0 / self.stats.current_rate
+            if backed_up:
+                self._next_send = now + period
+                break
+
+            _, frame = self._pending.popitem(last=False)
+            self.socket.send_frame(frame)
+            self.stats.sent += 1
+
+            # Don't try to catch up on slots which were missed while the caller was busy
+            self._next_send = max(self._next_send + period, now - period)
+
+        self._check_error()
+
+    def flush(self, timeout: Optional[float]=None):
+        """
+        Send all pending samples, respecting the send rate, and wait until every sample has been answered.
+
+        Args:
+            timeout (Optional[float]): Seconds to wait for each reply. Defaults to the socket timeout.
+
+        Raises:
+            Exception: If any sample was rejected by the compositor.
+        """
+        while self._pending:
+            self.pump()
+            delay = self._next_send - time.monotonic()
+            if self._pending and delay > 0:
+                time.sleep(delay)
+
+        while self.socket.unread_replies > 0:
+            self._handle_reply(self.socket.read_response(timeout))
+        self._check_error()
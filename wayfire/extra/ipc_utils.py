@@ -1,13 +1,27 @@
 from itertools import filterfalse
 from typing import Any, List, Optional, Tuple
 from wayfire import WayfireSocket
+from wayfire.extra.outputs import OutputTopology
 from wayfire.extra.stipc import Stipc
+from wayfire.extra.workspaces import WorkspaceGrid, WorkspaceOccupancy, workspace_grid
 
 
 class WayfireUtils:
-    def __init__(self, socket: WayfireSocket):
+    def __init__(self, socket: WayfireSocket, occupancy: Optional[WorkspaceOccupancy] = None,
+                 topology: Optional[OutputTopology] = None):
+        """
+        Args:
+            socket (WayfireSocket): The connection to Wayfire.
+            occupancy (Optional[WorkspaceOccupancy]): An event-driven occupancy map. If given, the
+                helpers which ask which views are on which workspace answer from it instead of
+                fetching and intersecting all views.
+            topology (Optional[OutputTopology]): An event-driven output index. If given, output
+                lookups by name or id answer from it instead of calling `list_outputs`.
+        """
         self._socket = socket
         self._stipc = Stipc(socket)
+        self._occupancy = occupancy
+        self._topology = topology
 
     def _find_view_middle_cursor_position(self, view_geometry: dict, monitor_geometry: dict):
         """
@@ -132,7 +146,8 @@ class WayfireUtils:
         :param plugin_name: The name of the plugin to set.
         :param enabled: If True, enables the plugin. If False, disables it. Defaults to True.
         """
-        plugins = self._get_plugins()
+        current = self._get_plugins()
+        plugins = list(current)
 
         if enabled:
             if plugin_name not in plugins:
@@ -140,7 +155,9 @@ class WayfireUtils:
         else:
             plugins = [plugin for plugin in plugins if plugin_name not in plugin]
 
-        self._set_plugins(plugins)
+        # Setting core/plugins reloads the plugin list, skip it if nothing changed
+        if plugins != current:
+            self._set_plugins(plugins)
 
     def is_plugin_enabled(self, plugin_name: str) -> bool:
         """
@@ -165,7 +182,7 @@ class WayfireUtils:
                 - total_width (int): The sum of the widths of all connected outputs.
                 - total_height (int): The sum of the heights of all connected outputs.
         """
-        outputs = self._socket.list_outputs()
+        outputs = self._topology if self._topology is not None else self._socket.list_outputs()
         total_width = 0
         total_height = 0
         for output in outputs:
@@ -286,9 +303,7 @@ class WayfireUtils:
         """
         Retrieve the workspace number corresponding to the given coordinates.
 
-        This method compares the provided `workspace_x` and `workspace_y` coordinates 
-        with a list of all available workspace coordinates. It returns the workspace 
-        number if a match is found.
+        Workspaces are numbered from 1, row by row, on the grid of the focused output.
 
         Args:
             workspace_x (int): The x-coordinate of the workspace.
@@ -298,13 +313,10 @@ class WayfireUtils:
             int: The number of the workspace that matches the given coordinates. 
                   Returns None if no matching workspace is found.
         """
-        workspaces_coordinates = self._total_workspaces()
-        if not workspaces_coordinates:
+        grid = self._workspace_grid()
+        if grid is None:
             return None
-        for workspace_number, coords in workspaces_coordinates.items():
-            if coords == [workspace_x, workspace_y]:
-                return workspace_number
-        return None
+        return grid.number(workspace_x, workspace_y)
 
     def get_active_workspace_info(self):
         """
@@ -340,9 +352,9 @@ class WayfireUtils:
             str or None: The ID of the output with the specified name, or None if no 
                          matching output is found.
         """
-        for output in self._socket.list_outputs():
-            if output["name"] == output_name:
-                return output["id"]
+        output = self._find_output(name=output_name)
+        if output is not None:
+            return output["id"]
 
     def get_output_name_by_id(self, output_id: int):
         """
@@ -359,9 +371,18 @@ class WayfireUtils:
             str or None: The name of the output with the specified ID, or None if no 
                          matching output is found.
         """
+        output = self._find_output(output_id=output_id)
+        if output is not None:
+            return output["name"]
+
+    def _find_output(self, output_id: Optional[int] = None, name: Optional[str] = None) -> Optional[dict]:
+        """Find an output by id or name, from the topology index if there is one."""
+        if self._topology is not None:
+            return self._topology.by_id(output_id) if output_id is not None else self._topology.by_name(name)
         for output in self._socket.list_outputs():
-            if output["id"] == output_id:
-                return output["name"]
+            if (output_id is not None and output["id"] == output_id) or (name is not None and output["name"] == name):
+                return output
+        return None
 
     def get_output(self, output_id: int, key: str):
         output = self._socket.get_output(output_id)
@@ -541,7 +562,8 @@ class WayfireUtils:
     def get_view_wset_index(self, view_id: int):
         return self.get_view(view_id, "wset-index")
 
-    def _get_adjacent_workspace(self, workspace_x: int, workspace_y: int, direction: str) -> Optional[Tuple[int, int]]:
+    def _get_adjacent_workspace(self, workspace_x: int, workspace_y: int, direction: str,
+                                grid: Optional[WorkspaceGrid] = None) -> Optional[Tuple[int, int]]:
         """
         Retrieves the coordinates of an adjacent workspace based on the specified direction.
 
@@ -551,12 +573,14 @@ class WayfireUtils:
         - "previous": Returns the coordinates of the previous workspace in the sorted list.
         - "next": Returns the coordinates of the next workspace in the sorted list.
 
-        The list of unique workspaces is sorted by row (y) and then column (x) to determine adjacency.
+        Workspaces are ordered by row (y) and then column (x), and the order wraps around. Lookups use
+        the precomputed `WorkspaceGrid` of the grid size.
 
         Parameters:
         - workspace_x (int): The x-coordinate of the current workspace.
         - workspace_y (int): The y-coordinate of the current workspace.
         - direction (str): The direction to move. Should be one of 'current', 'previous', or 'next'.
+        - grid (WorkspaceGrid, optional): The grid of the output. Fetched from the focused output if omitted.
 
         Returns:
         - Optional[Tuple[int, int]]: The coordinates of the adjacent workspace as a tuple (x, y),
@@ -565,39 +589,23 @@ class WayfireUtils:
         Raises:
         - ValueError: If an invalid direction is specified.
         """
-        total_workspaces = self._total_workspaces()
-
-        unique_workspaces = []
-
-        # Extract and filter out duplicate workspace coordinates
-        for coords in total_workspaces.values():
-            if coords not in unique_workspaces:
-                unique_workspaces.append(coords)
-
-        # Sort the list based on the 'x' and 'y' values, ensuring x is the primary sort key
-        unique_workspaces.sort(key=lambda d: (d[1], d[0]))  # Sort by y (row), then x (column)
-
-        # Find the index of the active workspace in the list
-        active_index = next((i for i, coords in enumerate(unique_workspaces)
-                            if coords[1] == workspace_y and coords[0] == workspace_x), None)
-
-        if active_index is None:
-            first_workspace = self.get_workspaces_with_views()
-            if first_workspace:
-                return first_workspace[0]
-            return None
+        if grid is None:
+            grid = self._workspace_grid()
+            if grid is None:
+                return None
 
         if direction == "current":
-            return unique_workspaces[active_index]
-        elif direction == "previous":
-            adjacent_index = (active_index - 1) % len(unique_workspaces)
-        elif direction == "next":
-            # Calculate the index of the next workspace cyclically
-            adjacent_index = (active_index + 1) % len(unique_workspaces)
+            coords = (workspace_x, workspace_y) if (workspace_x, workspace_y) in grid else None
+        elif direction in ("previous", "next"):
+            coords = grid.step(workspace_x, workspace_y, direction)
         else:
             raise ValueError("Invalid direction specified. Use 'current', 'previous', or 'next'.")
 
-        return unique_workspaces[adjacent_index]
+        if coords is None:
+            first_workspace = self.get_workspaces_with_views()
+            if first_workspace:
+                return first_workspace[0]
+        return coords
 
     def _get_previous_workspace(self, workspace_x: int, workspace_y: int) -> Optional[Tuple[int, int]]:
         return self._get_adjacent_workspace(workspace_x, workspace_y, "previous")
@@ -618,7 +626,8 @@ class WayfireUtils:
         :param direction: 'previous' to go to the previous workspace, 'next' to go to the next workspace.
         :param with_views: If True, go to the next workspace with views instead of any workspace.
         """
-        workspace = self.get_focused_output_workspace()
+        output = self._socket.get_focused_output()
+        workspace = output.get("workspace") if output else None
         if workspace:
             current_x = workspace['x']
             current_y = workspace['y']
@@ -632,19 +641,18 @@ class WayfireUtils:
                     print("Invalid direction for workspaces with views. Use 'next' or 'previous'.")
                     return
             else:
-                if direction == 'previous':
-                    target_workspace_coords = self._get_previous_workspace(current_x, current_y)
-                elif direction == 'next':
-                    target_workspace_coords = self._get_next_workspace(current_x, current_y)
-                else:
+                if direction not in ('previous', 'next'):
                     print("Invalid direction. Use 'previous' or 'next'.")
                     return
+                grid = workspace_grid(workspace["grid_width"], workspace["grid_height"])
+                target_workspace_coords = self._get_adjacent_workspace(current_x, current_y, direction, grid)
  
             if target_workspace_coords is None:
                 return
 
             workspace_x, workspace_y = target_workspace_coords
-            self._socket.set_workspace(workspace_x, workspace_y)
+            # The output is known already, don't let set_workspace ask for it again
+            self._socket.set_workspace(workspace_x, workspace_y, output_id=output["id"])
 
     def go_previous_workspace(self):
         self._go_workspace("previous")
@@ -674,6 +682,13 @@ class WayfireUtils:
                           of the workspace containing the view. Returns None if no matching 
                           workspace is found.
         """
+        if self._occupancy is not None:
+            workspaces = self._occupancy.workspaces_of(view_id, include_sticky=True)
+            if workspaces:
+                x, y = min(workspaces)
+                return {"x": x, "y": y}
+            return None
+
         ws_with_views = self.get_workspaces_with_views()
         if ws_with_views:
             for ws in ws_with_views:
@@ -696,6 +711,9 @@ class WayfireUtils:
         Returns:
             bool: True if the specified workspace has views, otherwise False.
         """
+        if self._occupancy is not None:
+            return self._occupancy.has_views(workspace_x, workspace_y, include_sticky=True)
+
         ws_with_views_list = self.get_workspaces_with_views()
         if ws_with_views_list:
             for workspace_with_views in ws_with_views_list:
@@ -722,6 +740,15 @@ class WayfireUtils:
         - dict: The next or previous workspace with views based on the provided direction, or a list of all
                 workspaces with views if no direction is specified.
         """
+        if self._occupancy is not None:
+            occupancy = self._occupancy
+            occupied = occupancy.occupied(include_sticky=True)
+            if current_x is None or current_y is None or direction is None:
+                return [{"x": x, "y": y, "view-id": view_id}
+                        for x, y in sorted(occupied)
+                        for view_id in sorted(occupancy.views_on(x, y, include_sticky=True))]
+            # The workspaces are already in reading order
+            return self._step_workspaces_with_views(occupied, current_x, current_y, direction)
 
         monitor = self.get_focused_output_geometry()
         workspace = self.get_focused_output_workspace()
@@ -759,7 +786,10 @@ class WayfireUtils:
 
         # Ensure that unique_workspaces are sorted to maintain a consistent order
         sorted_workspaces = sorted(unique_workspaces, key=lambda d: (d[1], d[0]))  # Sort by y, then x
+        return self._step_workspaces_with_views(sorted_workspaces, current_x, current_y, direction)
 
+    def _step_workspaces_with_views(self, sorted_workspaces: List[Tuple[int, int]], current_x: int, current_y: int,
+                                    direction: str):
         # Find the index of the current workspace in the sorted list of workspaces with views
         current_ws_index = next((i for i, (x, y) in enumerate(sorted_workspaces)
                                 if x == current_x and y == current_y), None)
@@ -791,6 +821,11 @@ class WayfireUtils:
                   that do not have any views. Returns an empty list if all workspaces have 
                   views or if no workspaces are available.
         """
+        if self._occupancy is not None:
+            if not self._occupancy.occupied(include_sticky=True):
+                return
+            return [[x, y] for x, y in self._occupancy.empty(include_sticky=True)]
+
         workspace_with_views = self.get_workspaces_with_views()
         if not workspace_with_views:
             return
@@ -815,6 +850,12 @@ class WayfireUtils:
                   an empty list if no views are found or if the active workspace information 
                   is not available.
         """
+        if self._occupancy is not None:
+            active_workspace = self._occupancy.navigator.workspace()
+            if active_workspace is None:
+                return []
+            return sorted(self._occupancy.views_on(*active_workspace, include_sticky=True))
+
         active_workspace = self.get_active_workspace_info()
         workspace_with_views = self.get_workspaces_with_views()
  
@@ -964,20 +1005,17 @@ class WayfireUtils:
                   [column, row]. The keys are workspace numbers, and the values 
                   are lists containing the column and row indices of the workspaces.
         """
-        winfo = self.get_active_workspace_info()
-        if not winfo:
+        grid = self._workspace_grid()
+        if grid is None:
             return {}
+        return grid.numbered()
 
-        total_workspaces = winfo["grid_height"] * winfo["grid_width"]
-        workspaces = {}
-
-        # Loop through each row and column to assign workspace numbers and coordinates
-        for row in range(winfo["grid_height"]):
-            for col in range(winfo["grid_width"]):
-                workspace_num = row * winfo["grid_width"] + col + 1
-                if workspace_num <= total_workspaces:
-                    workspaces[workspace_num] = [col, row]
-        return workspaces
+    def _workspace_grid(self) -> Optional[WorkspaceGrid]:
+        """The precomputed workspace grid of the focused output."""
+        winfo = self.get_active_workspace_info()
+        if not winfo:
+            return None
+        return workspace_grid(winfo["grid_width"], winfo["grid_height"])
 
     def _calculate_intersection_area(self, view: dict, ws_x: int, ws_y: int, monitor: dict):
         """
@@ -1063,9 +1101,10 @@ class WayfireUtils:
         Raises:
             ValueError: If the output name does not correspond to a valid output.
         """
-        output_id = self.get_output_id_by_name(output_name)
-        if output_id:
-            wset = self.get_output_wset_index(output_id)
+        # The output already carries its wset, no need to ask for it separately
+        output = self._find_output(name=output_name)
+        if output:
+            wset = output.get("wset-index")
             if view_id and wset:
                 self._socket.send_view_to_wset(view_id, wset)
 
@@ -1075,8 +1114,8 @@ class WayfireUtils:
 
         This method extracts information about views from the given tiling layout. 
         If the layout contains a single view, it returns a list with that view's ID 
-        and dimensions. If the layout contains split sections, it recursively gathers 
-        information from child layouts.
+        and dimensions. If the layout contains split sections, it walks all child 
+        layouts in order.
 
         Args:
             layout (dict): A dictionary representing the tiling layout. It may contain 
@@ -1085,23 +1124,19 @@ class WayfireUtils:
 
         Returns:
             list: A list of tuples, each containing a view ID and its dimensions 
-                  (width, height). If the layout contains split sections, the method 
-                  recursively processes and combines views from all child layouts.
-        """
-        if "view-id" in layout:
-            return [
-                (
-                    layout["view-id"],
-                    layout["geometry"]["width"],
-                    layout["geometry"]["height"],
-                )
-            ]
-
-        split = "horizontal-split" if "horizontal-split" in layout else "vertical-split"
-        list = []
-        for child in layout[split]:
-            list += self.get_tile_list_views(child)
-        return list
+                  (width, height), in layout order.
+        """
+        views = []
+        stack = [layout]
+        while stack:
+            node = stack.pop()
+            if "view-id" in node:
+                views.append((node["view-id"], node["geometry"]["width"], node["geometry"]["height"]))
+                continue
+
+            split = "horizontal-split" if "horizontal-split" in node else "vertical-split"
+            stack.extend(reversed(node[split]))
+        return views
 
     def get_current_tiling_layout(self):
         """
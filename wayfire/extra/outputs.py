@@ -0,0 +1,187 @@
+import bisect
+from typing import Dict, List, Optional, Tuple
+from wayfire.core.template import object_id
+from wayfire.ipc import WayfireSocket
+
+
+def _overlap(a: dict, x: int, y: int, width: int, height: int) -> int:
+    overlap_width = min(a["x"] + a["width"], x + width) - max(a["x"], x)
+    overlap_height = min(a["y"] + a["height"], y + height) - max(a["y"], y)
+    if overlap_width <= 0 or overlap_height <= 0:
+        return 0
+    return overlap_width * overlap_height
+
+
+class TopologyDiff:
+    """
+    Changes between two output layouts.
+
+    Attributes:
+        added (List[dict]): Outputs which were connected.
+        removed (List[dict]): Outputs which were disconnected, as they were before.
+        moved (List[Tuple[dict, dict]]): Outputs whose position, size or scale changed, as (before, after).
+    """
+    def __init__(self, added: List[dict], removed: List[dict], moved: List[Tuple[dict, dict]]):
+        self.added = added
+        self.removed = removed
+        self.moved = moved
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.moved)
+
+    def __repr__(self):
+        return (f"TopologyDiff(added={[o['name'] for o in self.added]}, removed={[o['name'] for o in self.removed]}, "
+                f"moved={[new['name'] for _, new in self.moved]})")
+
+    @property
+    def affected_ids(self) -> List[int]:
+        """Ids of the outputs whose views may need to be placed again."""
+        return [output["id"] for output in self.removed] + [new["id"] for _, new in self.moved]
+
+
+def diff_outputs(old: Dict[int, dict], new: Dict[int, dict]) -> TopologyDiff:
+    """Compare two {id: output} maps."""
+    added = [output for output_id, output in new.items() if output_id not in old]
+    removed = [output for output_id, output in old.items() if output_id not in new]
+    moved = [(old[output_id], output) for output_id, output in new.items()
+             if output_id in old and (old[output_id]["geometry"] != output["geometry"] or
+                                      old[output_id].get("scale") != output.get("scale"))]
+    return TopologyDiff(added, removed, moved)
+
+
+class OutputTopology:
+    """
+    The output layout, indexed for lookups by name, id and position.
+
+    Outputs are read once with `list_outputs`, and again on every `output-layout-changed`, which
+    also yields the `TopologyDiff` against the previous layout so policies only need to re-place the
+    views of the affected outputs. The wset shown on each output follows `output-wset-changed`.
+
+    Positions are in layout coordinates, in which every output's geometry is already divided by its
+    scale, so lookups work the same with mixed-DPI outputs. The layout is split into a grid along all
+    output edges; `output_at()` finds the cell of a point with two binary searches.
+
+    Pass every event read from the socket to `handle_event()`.
+
+    Example:
+        >>> topology = OutputTopology(sock)
+        >>> topology.watch()
+        >>> topology.output_at(2500, 300)["name"]
+        'HDMI-A-1'
+        >>> diff = topology.handle_event(sock.read_next_event())
+        >>> if diff:
+        ...     replace_views_on(diff.affected_ids)
+
+    Attributes:
+        reloads (int): Number of `list_outputs` requests made.
+        last_diff (Optional[TopologyDiff]): The diff of the last layout change.
+    """
+    EVENTS = ["output-layout-changed", "output-wset-changed"]
+
+    def __init__(self, socket: WayfireSocket):
+        self.socket = socket
+        self.reloads = 0
+        self.last_diff: Optional[TopologyDiff] = None
+        self._outputs: Optional[Dict[int, dict]] = None
+        self._by_name: Dict[str, dict] = {}
+        self._xs: List[int] = []
+        self._ys: List[int] = []
+        self._cells: Dict[Tuple[int, int], dict] = {}
+
+    def watch(self):
+        """Subscribe the socket to the events the index needs."""
+        return self.socket.watch(self.EVENTS)
+
+    def _load(self) -> Dict[int, dict]:
+        if self._outputs is None:
+            self._build(self._fetch())
+        return self._outputs
+
+    def _fetch(self) -> Dict[int, dict]:
+        self.reloads += 1
+        return {output["id"]: output for output in self.socket.list_outputs()}
+
+    def _build(self, outputs: Dict[int, dict]):
+        self._outputs = outputs
+        self._by_name = {output["name"]: output for output in outputs.values()}
+        self._xs = sorted({edge for output in outputs.values()
+                           for edge in (output["geometry"]["x"], output["geometry"]["x"] + output["geometry"]["width"])})
+        self._ys = sorted({edge for output in outputs.values()
+                           for edge in (output["geometry"]["y"], output["geometry"]["y"] + output["geometry"]["height"])})
+        self._cells = {}
+        for output in outputs.values():
+            geometry = output["geometry"]
+            columns = range(bisect.bisect_left(self._xs, geometry["x"]),
+                            bisect.bisect_left(self._xs, geometry["x"] + geometry["width"]))
+            rows = range(bisect.bisect_left(self._ys, geometry["y"]),
+                         bisect.bisect_left(self._ys, geometry["y"] + geometry["height"]))
+            for column in columns:
+                for row in rows:
+                    self._cells[(column, row)] = output
+
+    def refresh(self) -> TopologyDiff:
+        """Read the outputs again and return what changed."""
+        old = self._outputs or {}
+        self._build(self._fetch())
+        self.last_diff = diff_outputs(old, self._outputs)
+        return self.last_diff
+
+    def __len__(self):
+        return len(self._load())
+
+    def __iter__(self):
+        return iter(list(self._load().values()))
+
+    def by_id(self, output_id: int) -> Optional[dict]:
+        return self._load().get(output_id)
+
+    def by_name(self, name: str) -> Optional[dict]:
+        self._load()
+        return self._by_name.get(name)
+
+    def id_of(self, name: str) -> Optional[int]:
+        output = self.by_name(name)
+        return output["id"] if output else None
+
+    def name_of(self, output_id: int) -> Optional[str]:
+        output = self.by_id(output_id)
+        return output["name"] if output else None
+
+    def bounding_box(self) -> Optional[dict]:
+        """The smallest rectangle containing all outputs, None without outputs."""
+        self._load()
+        if not self._xs:
+            return None
+        return {"x": self._xs[0], "y": self._ys[0],
+                "width": self._xs[-1] - self._xs[0], "height": self._ys[-1] - self._ys[0]}
+
+    def output_at(self, x: float, y: float) -> Optional[dict]:
+        """The output containing a point in layout coordinates, None if the point is in a gap between outputs."""
+        self._load()
+        column = bisect.bisect_right(self._xs, x) - 1
+        row = bisect.bisect_right(self._ys, y) - 1
+        return self._cells.get((column, row))
+
+    def outputs_in(self, x: int, y: int, width: int, height: int) -> List[dict]:
+        """The outputs a rectangle intersects, the one with the largest overlap first."""
+        overlaps = [(_overlap(output["geometry"], x, y, width, height), output) for output in self._load().values()]
+        overlaps = [(area, output) for area, output in overlaps if area > 0]
+        overlaps.sort(key=lambda item: -item[0])
+        return [output for _, output in overlaps]
+
+    def handle_event(self, event: dict) -> Optional[TopologyDiff]:
+        """
+        Update the index according to an event.
+
+        Returns:
+            Optional[TopologyDiff]: The changes for `output-layout-changed`, None for other events.
+        """
+        name = event.get("event")
+        if name == "output-layout-changed":
+            return self.refresh()
+        if name == "output-wset-changed" and self._outputs is not None:
+            output = self._outputs.get(object_id(event.get("output")))
+            wset = object_id(event.get("new-wset"))
+            if output is not None and wset is not None:
+                output["wset-index"] = wset
+        return None
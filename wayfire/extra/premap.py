@@ -0,0 +1,197 @@
+import bisect
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from wayfire.ipc import WayfireSocket
+
+PreMapHandler = Callable[[dict, WayfireSocket], Any]
+
+# Upper bounds of the histogram buckets, in milliseconds
+DEFAULT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+class LatencyHistogram:
+    """
+    Counts latencies in fixed buckets.
+
+    Attributes:
+        buckets (Tuple[float, ...]): Upper bounds of the buckets in milliseconds. Latencies above the
+            last bound are counted in an extra overflow bucket.
+        counts (List[int]): Number of latencies per bucket, one more than `buckets`.
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        ms = seconds * 1000
+        self.counts[bisect.bisect_left(self.buckets, ms)] += 1
+        self.total += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.total if self.total else 0.0
+
+    def percentile(self, p: float) -> float:
+        """Upper bound in milliseconds of the bucket containing the p-th percentile (inf for the overflow bucket)."""
+        if not self.total:
+            return 0.0
+        rank = p / 100 * self.total
+        seen = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def __str__(self):
+        lines = []
+        lower = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            lines.append(f"{lower:>6} - {bound:<6} ms: {count}")
+            lower = bound
+        return "\n".join(lines)
+
+
+class PreMapGate:
+    """
+    Holds new views in `view-pre-map` while placement handlers run, and guarantees they are shown.
+
+    Every registered handler is called with the view and the socket for each `view-pre-map` event.
+    The view is unblocked as soon as all handlers are done, or immediately if a handler raises. A
+    watchdog thread unblocks the view, over a separate connection, if the handlers are still running
+    `deadline` seconds after the event was received; a slow handler then keeps running, but its
+    remaining changes apply to the already visible view.
+
+    The time every view was held is recorded in `histogram`. Handlers which raise and unblock requests
+    which fail are reported in `errors` instead of being raised, since neither may keep a view hidden.
+
+    Example:
+        >>> gate = PreMapGate(sock, deadline=0.05)
+        >>> @gate.handler
+        ... def place(view, socket):
+        ...     if view["app-id"] == "gedit":
+        ...         socket.configure_view(view["id"], 100, 100, 800, 600)
+        >>> gate.watch()
+        >>> while True:
+        ...     gate.handle_event(sock.read_next_event())
+
+    Attributes:
+        histogram (LatencyHistogram): Time between receiving the event and unblocking each view.
+        timeouts (int): Views unblocked by the watchdog because the deadline passed.
+        errors (List[Tuple[int, str, str]]): (view id, handler or method, error) for every handler call
+            which raised and every unblock request which failed.
+    """
+    def __init__(self, socket: WayfireSocket, deadline: float=0.1, unblock_socket: Optional[WayfireSocket]=None):
+        """
+        Args:
+            socket (WayfireSocket): The connection receiving `view-pre-map` events.
+            deadline (float): Maximum seconds a view is held.
+            unblock_socket (Optional[WayfireSocket]): Connection used by the watchdog. Defaults to a new
+                connection to the same socket, opened when the first view is held.
+        """
+        self.socket = socket
+        self.deadline = deadline
+        self.histogram = LatencyHistogram()
+        self.timeouts = 0
+        self.errors: List[Tuple[int, str, str]] = []
+
+        self._handlers: List[PreMapHandler] = []
+        self._unblock_socket = unblock_socket
+        self._held: Dict[int, float] = {}
+        self._lock = threading.Condition()
+        self._watchdog: Optional[threading.Thread] = None
+
+    def handler(self, handler: PreMapHandler) -> PreMapHandler:
+        """Register a placement handler. Can be used as a decorator."""
+        self._handlers.append(handler)
+        return handler
+
+    def watch(self):
+        """Subscribe the socket to `view-pre-map`."""
+        return self.socket.watch(["view-pre-map"])
+
+    @property
+    def held(self) -> List[int]:
+        """Ids of the views currently held."""
+        with self._lock:
+            return list(self._held)
+
+    def _release(self, view_id: int) -> bool:
+        # Returns whether the caller is the one who has to unblock the view
+        with self._lock:
+            received = self._held.pop(view_id, None)
+            if received is None:
+                return False
+            self.histogram.add(time.monotonic() - received)
+            return True
+
+    def _error(self, view_id: int, source: str, error: Exception):
+        with self._lock:
+            self.errors.append((view_id, source, str(error)))
+
+    def _start_watchdog(self):
+        if self._unblock_socket is None:
+            self._unblock_socket = WayfireSocket(self.socket.socket_name)
+        self._watchdog = threading.Thread(target=self._watch_deadlines, name="premap-watchdog", daemon=True)
+        self._watchdog.start()
+
+    def _watch_deadlines(self):
+        while True:
+            with self._lock:
+                while not self._held:
+                    self._lock.wait()
+                now = time.monotonic()
+                view_id, received = min(self._held.items(), key=lambda item: item[1])
+                remaining = received + self.deadline - now
+                if remaining > 0:
+                    self._lock.wait(remaining)
+                    continue
+                del self._held[view_id]
+                self.timeouts += 1
+                self.histogram.add(time.monotonic() - received)
+
+            try:
+                self._unblock_socket.unblock_view_map(view_id)
+            except Exception as e:
+                self._error(view_id, "unblock_view_map", e)
+
+    def handle_event(self, event: dict) -> bool:
+        """
+        Run the handlers for a `view-pre-map` event and unblock the view.
+
+        Returns:
+            bool: Whether the event was a `view-pre-map` event.
+        """
+        if event.get("event") != "view-pre-map":
+            return False
+        view = event["view"]
+        view_id = view["id"]
+
+        if self._watchdog is None:
+            self._start_watchdog()
+        with self._lock:
+            self._held[view_id] = time.monotonic()
+            self._lock.notify()
+
+        for handler in self._handlers:
+            try:
+                handler(view, self.socket)
+            except Exception as e:
+                self._error(view_id, getattr(handler, "__name__", repr(handler)), e)
+                break
+            if view_id not in self._held:
+                # The watchdog already unblocked the view, don't delay it any further
+                break
+
+        if self._release(view_id):
+            try:
+                self.socket.unblock_view_map(view_id)
+            except Exception as e:
+                self._error(view_id, "unblock_view_map", e)
+        return True
@@ -0,0 +1,213 @@
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+from wayfire.core.template import object_id
+from wayfire.core.transaction import LayoutTransaction
+from wayfire.extra.rules import Rule, RuleEngine, add_actions
+from wayfire.ipc import WayfireSocket
+
+# Changes list_views doesn't report; once applied, they are not sent again until the view is remapped
+_UNREPORTED = ("slot", "alpha", "always-on-top")
+
+# Events after which a view may no longer match the desired state
+_DRIFT_EVENTS = ("view-geometry-changed", "view-wset-changed", "view-workspace-changed", "view-sticky",
+                 "view-minimized", "view-fullscreen", "view-set-output")
+
+# Events after which other rules may match a view
+_IDENTITY_EVENTS = ("view-mapped", "view-title-changed", "view-app-id-changed")
+
+
+class ReconcileReport:
+    """
+    Result of one `Reconciler.reconcile()`.
+
+    Attributes:
+        views (int): Views compared with the desired state.
+        plan (List[Tuple[str, int, Any]]): The changes sent, in order, as (change, view id, value).
+        plan_time (float): Seconds spent matching rules and computing the plan.
+        apply_time (float): Seconds spent sending the plan and waiting for the replies.
+        errors (List[Tuple[Optional[int], str, str]]): (view id, method, error) for every rejected request.
+    """
+    def __init__(self):
+        self.views = 0
+        self.plan: List[Tuple[str, int, Any]] = []
+        self.plan_time = 0.0
+        self.apply_time = 0.0
+        self.errors: List[Tuple[Optional[int], str, str]] = []
+
+    def __repr__(self):
+        return (f"ReconcileReport(views={self.views}, changes={len(self.plan)}, errors={len(self.errors)}, "
+                f"plan={self.plan_time * 1000:.2f}ms, apply={self.apply_time * 1000:.2f}ms)")
+
+
+class Reconciler:
+    """
+    Makes the views match a declarative description of the desktop.
+
+    The desired state is a list of `Rule`s: every view gets the merged actions of the rules matching
+    its app-id, role and title, exactly like with `RuleEngine`. `reconcile()` compares the desired
+    state with the current views, and sends only the changes which are not in effect yet, in the
+    order `LayoutTransaction` uses (wset, geometry, workspace, ..., fullscreen), as one pipelined burst.
+
+    The views and outputs are read once, and then mirrored from the events passed to
+    `handle_event()`. A view is reconciled again on its own when it is mapped or its title or
+    app-id changes. With `enforce`, it is also reconciled when it drifts from the desired state,
+    e.g. because the user moved it; a change which was sent less than `settle` seconds ago is not
+    sent again, so the reconciler doesn't fight the compositor over geometry it adjusts.
+
+    Alpha, always-on-top and slots are not reported by Wayfire, so they are sent once per view.
+
+    Example:
+        >>> reconciler = Reconciler(sock, [Rule(app_id="firefox", wset=2),
+        ...                                Rule(app_id="mpv", sticky=True, alpha=0.8),
+        ...                                Rule(title=r"^Editor", geometry=(0, 0, 1280, 1080)),
+        ...                                Rule(title=r"^Terminal", geometry=(1280, 0, 640, 1080))])
+        >>> reconciler.reconcile()
+        >>> reconciler.watch()
+        >>> while True:
+        ...     reconciler.handle_event(sock.read_next_event())
+
+    Attributes:
+        reports (int): Number of reconciliations.
+        plan_time (float): Total seconds spent planning.
+        apply_time (float): Total seconds spent applying.
+    """
+    EVENTS = ["view-unmapped", "wset-workspace-changed", "output-layout-changed"] + \
+             list(_IDENTITY_EVENTS) + list(_DRIFT_EVENTS)
+
+    def __init__(self, socket: WayfireSocket, rules: Union[RuleEngine, List[Rule]], enforce: bool=False,
+                 settle: float=0.5, use_stipc: bool=True):
+        self.socket = socket
+        self.engine = rules if isinstance(rules, RuleEngine) else RuleEngine(rules)
+        self.enforce = enforce
+        self.settle = settle
+        self.use_stipc = use_stipc
+        self.reports = 0
+        self.plan_time = 0.0
+        self.apply_time = 0.0
+        self._views: Optional[Dict[int, dict]] = None
+        self._outputs: Optional[Dict[int, dict]] = None
+        self._sent: Dict[Tuple[int, str], Tuple[Any, float]] = {}
+
+    @classmethod
+    def from_dicts(cls, socket: WayfireSocket, rules: List[dict], **kwargs) -> "Reconciler":
+        """Build a reconciler from rule dictionaries, see `RuleEngine.from_dicts`."""
+        return cls(socket, RuleEngine.from_dicts(rules), **kwargs)
+
+    def watch(self):
+        """Subscribe the socket to the events the reconciler needs."""
+        return self.socket.watch(self.EVENTS)
+
+    def _load(self) -> Dict[int, dict]:
+        if self._views is None:
+            self._views = {view["id"]: view for view in self.socket.list_views()}
+        if self._outputs is None:
+            self._outputs = {output["id"]: output for output in self.socket.list_outputs()}
+        return self._views
+
+    def refresh(self):
+        """Forget the mirrored state, it is read again by the next reconciliation."""
+        self._views = None
+        self._outputs = None
+
+    def _recently_sent(self, view_id: int, key: str, value: Any, now: float) -> bool:
+        sent = self._sent.get((view_id, key))
+        if sent is None or sent[0] != value:
+            return False
+        return key in _UNREPORTED or now - sent[1] < self.settle
+
+    def plan(self, view_ids: Optional[Iterable[int]]=None) -> Tuple[LayoutTransaction, List[Tuple[str, int, Any]]]:
+        """
+        Compute the changes needed for some views, or for all views.
+
+        Returns:
+            Tuple[LayoutTransaction, List[Tuple[str, int, Any]]]: A transaction holding only the needed
+                changes, and the ordered (change, view id, value) steps it will send.
+        """
+        views = self._load()
+        targets = views.values() if view_ids is None else [views[i] for i in view_ids if i in views]
+        transaction = LayoutTransaction(self.socket)
+        for view in targets:
+            if view.get("mapped") is False:
+                continue
+            actions = self.engine.actions(view)
+            if actions:
+                add_actions(transaction, view["id"], actions)
+
+        now = time.monotonic()
+        steps = [step for step in transaction.plan(views, self._outputs)
+                 if not self._recently_sent(step[1], step[0], step[2], now)]
+
+        # The changes already in effect or sent just now are left out
+        needed = LayoutTransaction(self.socket)
+        for key, view_id, value in steps:
+            needed._set(view_id, key, value)
+        return needed, steps
+
+    def reconcile(self, view_ids: Optional[Iterable[int]]=None) -> ReconcileReport:
+        """
+        Send the changes needed to make some views, or all views, match the desired state.
+
+        Rejected requests are reported in the result instead of raised, since one closed view must not
+        stop the others from being reconciled.
+        """
+        report = ReconcileReport()
+        start = time.perf_counter()
+        view_ids = None if view_ids is None else list(view_ids)
+        transaction, steps = self.plan(view_ids)
+        report.views = len(self._views) if view_ids is None else len(view_ids)
+        report.plan = steps
+        report.plan_time = time.perf_counter() - start
+
+        if steps:
+            result = transaction.commit(validate=False, use_stipc=self.use_stipc, raise_on_error=False,
+                                        outputs=self._outputs)
+            report.apply_time = result.commit_time
+            report.errors = result.errors
+            # Rejected changes are not remembered as sent, so they are tried again
+            failed = {(view_id, method) for view_id, method, _ in result.errors}
+            now = time.monotonic()
+            for key, view_id, value in steps:
+                method = transaction._build_message(view_id, key, value)["method"]
+                if (view_id, method) in failed or (key == "geometry" and (view_id, "stipc/layout_views") in failed):
+                    continue
+                self._sent[(view_id, key)] = (value, now)
+
+        self.reports += 1
+        self.plan_time += report.plan_time
+        self.apply_time += report.apply_time
+        return report
+
+    def handle_event(self, event: dict) -> Optional[ReconcileReport]:
+        """
+        Update the mirrored state, and reconcile the view of the event if needed.
+
+        Returns:
+            Optional[ReconcileReport]: The report if the event caused a reconciliation.
+        """
+        name = event.get("event")
+        if name == "output-layout-changed":
+            self._outputs = None
+            return None
+        if self._views is None:
+            return None
+        if name == "wset-workspace-changed":
+            output = self._outputs.get(object_id(event.get("output"))) if self._outputs else None
+            workspace = event.get("new-workspace")
+            if output is not None and workspace is not None:
+                output["workspace"] = dict(output["workspace"], x=workspace["x"], y=workspace["y"])
+            return None
+
+        view = event.get("view")
+        if not isinstance(view, dict) or "id" not in view:
+            return None
+        view_id = view["id"]
+        if name == "view-unmapped":
+            self._views.pop(view_id, None)
+            for key in _UNREPORTED + ("geometry", "wset", "workspace", "sticky", "minimized", "fullscreen"):
+                self._sent.pop((view_id, key), None)
+            return None
+
+        self._views[view_id] = view
+        if name in _IDENTITY_EVENTS or (self.enforce and name in _DRIFT_EVENTS):
+            return self.reconcile([view_id])
+        return None
@@ -0,0 +1,250 @@
+import re
+import time
+from typing import Any, Dict, List, Optional, Set
+from wayfire.core.template import get_msg_template
+from wayfire.core.transaction import LayoutTransaction, LayoutTransactionResult
+
+# Actions a rule can set
+ACTIONS = ("geometry", "wset", "workspace", "slot", "sticky", "always_on_top", "alpha", "minimized", "fullscreen")
+
+_SPECIAL = set(".^$*+?{}[]()|\\")
+
+
+def _required_literal(pattern: str) -> str:
+    """
+    The longest piece of plain text which every string matching `pattern` must contain, or "" if
+    none can be determined. Only simple patterns are analyzed; anything with alternation, groups or
+    inline flags yields "".
+    """
+    if "|" in pattern or "(" in pattern:
+        return ""
+    runs = []
+    run = ""
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\" and i + 1 < len(pattern):
+            escaped = pattern[i + 1]
+            i += 2
+            if escaped.isalnum():
+                # A character class or an assertion like \d or \b
+                runs.append(run)
+                run = ""
+            else:
+                run += escaped
+            continue
+        if char in "*?{":
+            # The preceding character is optional or repeated
+            runs.append(run[:-1])
+            run = ""
+            if char == "{":
+                close = pattern.find("}", i)
+                i = len(pattern) if close < 0 else close
+        elif char == "[":
+            runs.append(run)
+            run = ""
+            close = pattern.find("]", i + 2)
+            i = len(pattern) if close < 0 else close
+        elif char in _SPECIAL:
+            runs.append(run)
+            run = ""
+        else:
+            run += char
+        i += 1
+    runs.append(run)
+    return max(runs, key=len)
+
+
+def _trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def add_actions(transaction: LayoutTransaction, view_id: int, actions: Dict[str, Any]) -> LayoutTransaction:
+    """Add the changes for rule actions of a view to a transaction."""
+    for key, value in actions.items():
+        if key == "geometry":
+            transaction.configure(view_id, *value)
+        elif key == "wset":
+            transaction.send_to_wset(view_id, value)
+        elif key == "workspace":
+            transaction.send_to_workspace(view_id, *value)
+        elif key == "slot":
+            transaction.assign_slot(view_id, value)
+        elif key == "alpha":
+            transaction.set_alpha(view_id, value)
+        else:
+            getattr(transaction, "set_" + key)(view_id, value)
+    return transaction
+
+
+class Rule:
+    """
+    A window rule: conditions on a view and the actions to apply to matching views.
+
+    All given conditions must match. `app_id` and `role` are compared exactly, `title` is a regular
+    expression searched anywhere in the title. A rule without conditions matches every view.
+
+    Actions:
+        geometry (Tuple[int, int, int, int]): x, y, width and height relative to the output.
+        wset (int): Index of the workspace set to move the view to.
+        workspace (Tuple[int, int]): Workspace to move the view to.
+        slot (str): A grid slot, e.g. "slot_br".
+        sticky, always_on_top, minimized, fullscreen (bool): View states.
+        alpha (float): Opacity between 0 and 1.
+    """
+    def __init__(self, app_id: Optional[str]=None, role: Optional[str]=None, title: Optional[str]=None,
+                 name: Optional[str]=None, **actions):
+        unknown = set(actions) - set(ACTIONS)
+        if unknown:
+            raise ValueError(f"Unknown rule actions: {', '.join(sorted(unknown))}.")
+        self.app_id = app_id
+        self.role = role
+        self.title = title
+        self.name = name
+        self.actions: Dict[str, Any] = actions
+        self.index = -1
+
+    def __repr__(self):
+        conditions = {"app_id": self.app_id, "role": self.role, "title": self.title}
+        described = ", ".join(f"{k}={v!r}" for k, v in conditions.items() if v is not None)
+        return f"Rule({described}, {self.actions})"
+
+
+class RuleEngine:
+    """
+    Matches views against many rules without evaluating every rule for every view.
+
+    Rules are compiled into hash tables on the exact app-id and role conditions. Title patterns are
+    indexed by a trigram of the plain text they require (e.g. "Window 3" in r"Window 3\\b"), so a title
+    is only tested against the patterns whose trigram occurs in it. Patterns without such text are
+    always tested. Matching a view therefore only looks at the rules registered under its app-id and
+    role, the title rules whose trigram occurs in its title, and the rules without any condition.
+
+    When several rules match, their actions are merged in rule order, so later rules override earlier ones.
+
+    Example:
+        >>> engine = RuleEngine([Rule(app_id="gedit", geometry=(200, 200, 960, 540), always_on_top=True, alpha=0.5),
+        ...                      Rule(title=r"Picture-in-Picture", sticky=True, slot="slot_br")])
+        >>> sock.watch(["view-pre-map"])
+        >>> while True:
+        ...     engine.handle_event(sock, sock.read_next_event())
+
+    Attributes:
+        matches (int): Number of views matched.
+        match_time (float): Total seconds spent matching.
+    """
+    def __init__(self, rules: List[Rule]):
+        self.rules = list(rules)
+        self.matches = 0
+        self.match_time = 0.0
+
+        self._by_app_id: Dict[str, List[Rule]] = {}
+        self._by_role: Dict[str, List[Rule]] = {}
+        self._by_trigram: Dict[str, List[Rule]] = {}
+        self._unindexed_titles: List[Rule] = []
+        self._unconditional: List[Rule] = []
+        self._patterns: Dict[int, re.Pattern] = {}
+
+        for index, rule in enumerate(self.rules):
+            rule.index = index
+            if rule.app_id is not None:
+                self._by_app_id.setdefault(rule.app_id, []).append(rule)
+            elif rule.role is not None:
+                self._by_role.setdefault(rule.role, []).append(rule)
+            elif rule.title is not None:
+                self._index_title(rule)
+            else:
+                self._unconditional.append(rule)
+            if rule.title is not None:
+                self._patterns[index] = re.compile(rule.title)
+
+    def _index_title(self, rule: Rule):
+        trigrams = _trigrams(_required_literal(rule.title))
+        if not trigrams:
+            self._unindexed_titles.append(rule)
+            return
+        # Use the trigram shared with the fewest other patterns, to keep the buckets small
+        trigram = min(sorted(trigrams), key=lambda t: len(self._by_trigram.get(t, ())))
+        self._by_trigram.setdefault(trigram, []).append(rule)
+
+    @classmethod
+    def from_dicts(cls, rules: List[dict]) -> "RuleEngine":
+        """Build an engine from rule dictionaries, e.g. loaded from JSON. Geometry and workspace may be lists."""
+        compiled = []
+        for rule in rules:
+            rule = dict(rule)
+            for key in ("geometry", "workspace"):
+                if key in rule:
+                    rule[key] = tuple(rule[key])
+            compiled.append(Rule(**rule))
+        return cls(compiled)
+
+    def match(self, view: dict) -> List[Rule]:
+        """All rules matching a view, in rule order."""
+        start = time.perf_counter()
+        app_id = view.get("app-id")
+        role = view.get("role")
+        title = view.get("title") or ""
+
+        candidates = self._by_app_id.get(app_id, []) + self._by_role.get(role, []) + self._unconditional
+        candidates += self._unindexed_titles
+        if self._by_trigram:
+            for trigram in _trigrams(title):
+                candidates += self._by_trigram.get(trigram, ())
+
+        matched = [rule for rule in candidates
+                   if (rule.role is None or rule.role == role) and
+                      (rule.title is None or self._patterns[rule.index].search(title))]
+        matched.sort(key=lambda rule: rule.index)
+
+        self.match_time += time.perf_counter() - start
+        self.matches += 1
+        return matched
+
+    def actions(self, view: dict) -> Dict[str, Any]:
+        """The merged actions of all rules matching a view."""
+        merged: Dict[str, Any] = {}
+        for rule in self.match(view):
+            merged.update(rule.actions)
+        return merged
+
+    def apply(self, socket, view: dict, unblock: bool=False) -> Optional[LayoutTransactionResult]:
+        """
+        Apply the actions of the matching rules to a view, with pipelined requests.
+
+        Args:
+            socket (WayfireSocket): The socket to send the requests on.
+            view (dict): The view, as found in view events.
+            unblock (bool): Whether to unblock the map of the view after the actions, for views held in
+                `view-pre-map`. The view is unblocked even if no rule matches or an action fails.
+
+        Returns:
+            Optional[LayoutTransactionResult]: The result of the requests, None if nothing was sent.
+        """
+        actions = self.actions(view)
+        follow_up = []
+        if unblock:
+            message = get_msg_template("window-rules/unblock-map")
+            message["data"]["id"] = view["id"]
+            follow_up.append(message)
+        if not actions and not follow_up:
+            return None
+
+        transaction = LayoutTransaction(socket)
+        add_actions(transaction, view["id"], actions)
+
+        # A view held before mapping can't be validated against list_views, and the view must be unblocked
+        # even if an action fails, so errors are reported in the result instead of raised.
+        return transaction.commit(validate=False, use_stipc=False, raise_on_error=False, follow_up=follow_up)
+
+    def handle_event(self, socket, event: dict) -> Optional[LayoutTransactionResult]:
+        """Apply the rules for `view-pre-map` (before unblocking the view) and `view-mapped` events."""
+        name = event.get("event")
+        view = event.get("view")
+        if view is None:
+            return None
+        if name == "view-pre-map":
+            return self.apply(socket, view, unblock=True)
+        if name == "view-mapped":
+            return self.apply(socket, view)
+        return None
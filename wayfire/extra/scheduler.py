@@ -0,0 +1,284 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Deque, Dict, List, Optional, Tuple
+from wayfire.ipc import WayfireSocket
+
+INTERACTIVE = "interactive"
+NORMAL = "normal"
+BULK = "bulk"
+
+# Priority classes, highest priority first
+PRIORITIES = (INTERACTIVE, NORMAL, BULK)
+
+
+class TokenBucket:
+    """
+    Allows `rate` requests per second on average, and bursts of up to `burst` requests.
+
+    A rate of None means no limit.
+    """
+    def __init__(self, rate: Optional[float]=None, burst: float=1.0):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        if self.rate is not None:
+            self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self, now: float) -> float:
+        """Seconds until a token is available, 0 if one is available now."""
+        if self.rate is None:
+            return 0.0
+        self._refill(now)
+        if self.tokens >= 1.0:
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        if self.rate is not None:
+            self._refill(now)
+            self.tokens -= 1.0
+
+
+class ClassStats:
+    """
+    Metrics of one priority class.
+
+    Attributes:
+        depth (int): Requests currently queued.
+        max_depth (int): Largest queue depth seen.
+        sent (int): Requests sent to the compositor.
+        errors (int): Requests the compositor rejected.
+        wait_time (float): Total seconds requests spent queued before being sent.
+        max_wait (float): Longest time a request was queued.
+    """
+    def __init__(self):
+        self.depth = 0
+        self.max_depth = 0
+        self.sent = 0
+        self.errors = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+
+    @property
+    def mean_wait(self) -> float:
+        return self.wait_time / self.sent if self.sent else 0.0
+
+    def __repr__(self):
+        return (f"ClassStats(depth={self.depth}, max_depth={self.max_depth}, sent={self.sent}, errors={self.errors}, "
+                f"mean_wait={self.mean_wait * 1000:.2f}ms, max_wait={self.max_wait * 1000:.2f}ms)")
+
+
+class _Request:
+    __slots__ = ("frame", "future", "queued", "priority")
+
+    def __init__(self, frame: bytes, priority: str):
+        self.frame = frame
+        self.priority = priority
+        self.future: Future = Future()
+        self.queued = time.monotonic()
+
+
+class SchedulerLane:
+    """
+    Sends requests through a `CommandScheduler` with a fixed priority.
+
+    Lanes provide `send_json`, so helper classes built on it can be scheduled too:
+
+        >>> wpe = WPE(scheduler.lane(BULK))
+        >>> for view in views:
+        ...     wpe.set_view_shader(view["id"], shader)
+    """
+    def __init__(self, scheduler: "CommandScheduler", priority: str):
+        self.scheduler = scheduler
+        self.priority = priority
+
+    def submit(self, message: dict) -> Future:
+        return self.scheduler.submit(message, self.priority)
+
+    def send_json(self, message: dict):
+        return self.scheduler.call(message, self.priority)
+
+    def send_json_batch(self, messages: List[dict], raise_on_error: bool=True) -> List[dict]:
+        futures = [self.submit(message) for message in messages]
+        responses = [future.result() for future in futures]
+        if raise_on_error:
+            for response in responses:
+                if "error" in response:
+                    raise Exception(f"Error reading message: {response['error']}")
+        return responses
+
+
+class CommandScheduler:
+    """
+    Sends requests from several priority classes over one connection, without letting bulk work
+    delay interactive requests.
+
+    Requests are queued per class (`INTERACTIVE`, `NORMAL`, `BULK`) and sent by a worker thread,
+    which always takes the next request from the highest priority class that has one queued and is
+    within its rate limit. Requests are pipelined, but at most `window` replies are outstanding, so
+    an interactive request waits for at most `window` earlier replies, no matter how much bulk work
+    is queued. Every class has a token bucket limiting its requests per second, so bulk work can't
+    flood the compositor's main loop.
+
+    The worker owns the socket while the scheduler runs: use a dedicated connection, and send all
+    requests through `submit()`, `call()` or a `lane()`. Events arriving on it are queued in the
+    socket's `pending_events`.
+
+    Example:
+        >>> scheduler = CommandScheduler(WayfireSocket(), rates={BULK: 200})
+        >>> bulk = scheduler.lane(BULK)
+        >>> futures = [bulk.submit(message) for message in relayout_messages]
+        >>> scheduler.call(focus_message, INTERACTIVE)     # overtakes the queued layout requests
+        >>> scheduler.stats[BULK].mean_wait
+
+    Attributes:
+        stats (Dict[str, ClassStats]): Queue depth and wait time metrics per class.
+    """
+    def __init__(self, socket: WayfireSocket, rates: Optional[Dict[str, Optional[float]]]=None,
+                 bursts: Optional[Dict[str, float]]=None, window: int=4):
+        """
+        Args:
+            socket (WayfireSocket): The connection to send the requests on, used only by the scheduler.
+            rates (Optional[Dict[str, Optional[float]]]): Requests per second per class. Classes which
+                are not given are not limited.
+            bursts (Optional[Dict[str, float]]): Burst size per class, defaults to a tenth of a second of
+                requests at the class rate.
+            window (int): Maximum number of requests awaiting a reply.
+        """
+        rates = rates or {}
+        bursts = bursts or {}
+        self.socket = socket
+        self.window = max(1, window)
+        self.stats: Dict[str, ClassStats] = {priority: ClassStats() for priority in PRIORITIES}
+        self._buckets: Dict[str, TokenBucket] = {}
+        for priority in PRIORITIES:
+            rate = rates.get(priority)
+            default_burst = rate / 10 if rate else 1.0
+            self._buckets[priority] = TokenBucket(rate, bursts.get(priority, default_burst))
+        self._queues: Dict[str, Deque[_Request]] = {priority: deque() for priority in PRIORITIES}
+        self._in_flight: Deque[_Request] = deque()
+        self._lock = threading.Condition()
+        self._running = True
+        self._worker = threading.Thread(target=self._run, name="wayfire-scheduler", daemon=True)
+        self._worker.start()
+
+    def lane(self, priority: str) -> SchedulerLane:
+        if priority not in self._queues:
+            raise ValueError(f"Unknown priority {priority!r}. Use one of {', '.join(PRIORITIES)}.")
+        return SchedulerLane(self, priority)
+
+    def submit(self, message: dict, priority: str=NORMAL) -> Future:
+        """
+        Queue a request.
+
+        Returns:
+            Future: Resolves to the reply. Error replies are returned like any other reply. The request
+                is dropped if the future is cancelled before it is sent.
+        """
+        queue = self._queues.get(priority)
+        if queue is None:
+            raise ValueError(f"Unknown priority {priority!r}. Use one of {', '.join(PRIORITIES)}.")
+        request = _Request(self.socket.encode_message(message), priority)
+        with self._lock:
+            if not self._running:
+                raise Exception("The scheduler is closed.")
+            queue.append(request)
+            stats = self.stats[priority]
+            stats.depth = len(queue)
+            stats.max_depth = max(stats.max_depth, stats.depth)
+            self._lock.notify()
+        return request.future
+
+    def call(self, message: dict, priority: str=INTERACTIVE, timeout: Optional[float]=None) -> dict:
+        """Send a request and wait for the reply, raising if the compositor reports an error."""
+        response = self.submit(message, priority).result(timeout)
+        if "error" in response:
+            raise Exception(f"Error reading message: {response['error']}")
+        return response
+
+    def _next(self, now: float) -> Tuple[Optional[_Request], Optional[float]]:
+        # The next request to send, or else how long to wait for a token (None: nothing queued)
+        wait: Optional[float] = None
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            while queue and queue[0].future.cancelled():
+                queue.popleft()
+            self.stats[priority].depth = len(queue)
+            if not queue:
+                continue
+            delay = self._buckets[priority].delay(now)
+            if delay == 0.0:
+                request = queue.popleft()
+                self.stats[priority].depth = len(queue)
+                if not request.future.set_running_or_notify_cancel():
+                    # Cancelled just now, try again without spending a token
+                    return self._next(now)
+                self._buckets[priority].take(now)
+                return request, None
+            wait = delay if wait is None else min(wait, delay)
+        return None, wait
+
+    def _run(self):
+        while True:
+            with self._lock:
+                request, wait = None, None
+                if len(self._in_flight) < self.window:
+                    request, wait = self._next(time.monotonic())
+                if request is None and not self._in_flight:
+                    if not self._running and wait is None:
+                        # Closed, and every queue is empty: rate limited requests are still waited for
+                        return
+                    self._lock.wait(wait)
+                    continue
+
+            try:
+                if request is not None:
+                    self._send(request)
+                else:
+                    # The window is full or every queued class is rate limited
+                    self._receive()
+            except Exception as e:
+                # Keep the worker alive for the other requests
+                if request is not None and not request.future.done():
+                    request.future.set_exception(e)
+
+    def _send(self, request: _Request):
+        stats = self.stats[request.priority]
+        waited = time.monotonic() - request.queued
+        stats.wait_time += waited
+        stats.max_wait = max(stats.max_wait, waited)
+        try:
+            self.socket.send_frame(request.frame)
+        except Exception as e:
+            request.future.set_exception(e)
+            return
+        stats.sent += 1
+        self._in_flight.append(request)
+
+    def _receive(self):
+        request = self._in_flight.popleft()
+        try:
+            response = self.socket.read_response()
+        except Exception as e:
+            # Replies can't be matched to requests any more, fail all of them
+            for failed in [request] + list(self._in_flight):
+                failed.future.set_exception(e)
+            self._in_flight.clear()
+            return
+        if "error" in response:
+            self.stats[request.priority].errors += 1
+        request.future.set_result(response)
+
+    def close(self, wait: bool=True):
+        """Stop accepting requests. With `wait`, block until the queued requests are sent and answered."""
+        with self._lock:
+            self._running = False
+            self._lock.notify()
+        if wait:
+            self._worker.join()
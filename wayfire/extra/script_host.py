@@ -0,0 +1,212 @@
+import argparse
+import importlib.util
+import os
+import sys
+import time
+import traceback
+from types import ModuleType
+from typing import Dict, List, Optional
+from wayfire.ipc import WayfireSocket
+
+ALL_EVENTS = "*"
+
+
+class PolicyStats:
+    """
+    Resource accounting of one policy.
+
+    Attributes:
+        events (int): Events passed to the policy.
+        errors (int): Handler calls which raised an exception.
+        cpu_time (float): CPU seconds spent in the handler.
+        handler_time (float): Wall-clock seconds spent in the handler, including IPC round trips.
+        max_latency (float): Longest single handler call, in seconds.
+    """
+    def __init__(self):
+        self.events = 0
+        self.errors = 0
+        self.cpu_time = 0.0
+        self.handler_time = 0.0
+        self.max_latency = 0.0
+
+    @property
+    def mean_latency(self) -> float:
+        return self.handler_time / self.events if self.events else 0.0
+
+
+class Policy:
+    """A loaded policy module and its statistics."""
+    def __init__(self, name: str, module: ModuleType):
+        self.name = name
+        self.module = module
+        self.events: List[str] = list(getattr(module, "EVENTS", []))
+        self.handle = getattr(module, "handle", None)
+        self.stats = PolicyStats()
+        self.enabled = True
+        if self.handle is None:
+            raise ValueError(f"Policy {name} has no handle(event, socket) function.")
+        if not self.events:
+            raise ValueError(f"Policy {name} does not declare any EVENTS.")
+
+
+def load_policy(path: str) -> Policy:
+    """Import a policy module from a file."""
+    name = os.path.splitext(os.path.basename(path))[0]
+    spec = importlib.util.spec_from_file_location(f"wayfire_policy_{name}", path)
+    if spec is None or spec.loader is None:
+        raise ValueError(f"Cannot load policy from {path}.")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return Policy(name, module)
+
+
+class ScriptHost:
+    """
+    Runs many policy scripts in one process, over one connection to Wayfire.
+
+    A policy is a Python module which declares the events it needs and a handler for them:
+
+        EVENTS = ["view-mapped"]
+
+        def setup(socket):          # optional, called once after loading
+            ...
+
+        def handle(event, socket):
+            if event["view"]["app-id"] == "gedit":
+                socket.set_view_alpha(event["view"]["id"], 0.8)
+
+    Use `EVENTS = ["*"]` to receive every event. The host subscribes to the union of the events of all
+    policies, reads and decodes every event once, and passes it to the policies which asked for it with
+    a single dictionary lookup. Requests made by a handler use the shared socket. Handler exceptions are
+    printed and counted, and never stop the host or the other policies. Policies which fail to load or
+    whose `setup` raises are skipped, the others still run.
+
+    The `wayfire-script-host [directory] [--stats SECONDS]` command runs all policies in a directory.
+    """
+    def __init__(self, socket: WayfireSocket):
+        self.socket = socket
+        self.policies: List[Policy] = []
+        self._routes: Dict[str, List[Policy]] = {}
+        self._catch_all: List[Policy] = []
+        # Files which could not be loaded, with the error
+        self.failed: Dict[str, str] = {}
+
+    def add(self, policy: Policy):
+        self.policies.append(policy)
+        for event in policy.events:
+            if event == ALL_EVENTS:
+                self._catch_all.append(policy)
+            else:
+                self._routes.setdefault(event, []).append(policy)
+
+    def load_directory(self, directory: str):
+        """
+        Load every `*.py` file in a directory, in alphabetical order. Files starting with `_` are skipped.
+
+        Files which fail to import are reported, recorded in `failed` and skipped.
+        """
+        for filename in sorted(os.listdir(directory)):
+            if filename.endswith(".py") and not filename.startswith("_"):
+                path = os.path.join(directory, filename)
+                try:
+                    policy = load_policy(path)
+                except Exception as e:
+                    self.failed[path] = str(e)
+                    print(f"Failed to load policy {path}:", file=sys.stderr)
+                    traceback.print_exc()
+                    continue
+                self.add(policy)
+
+    def remove(self, policy: Policy):
+        """Stop passing events to a policy. It stays in `policies`, so its statistics are still reported."""
+        policy.enabled = False
+        for routed in self._routes.values():
+            if policy in routed:
+                routed.remove(policy)
+        if policy in self._catch_all:
+            self._catch_all.remove(policy)
+
+    def events(self) -> Optional[List[str]]:
+        """The events to subscribe to, None for all events."""
+        if self._catch_all:
+            return None
+        return sorted(self._routes)
+
+    def start(self):
+        """Subscribe to the events of all policies and run their `setup` functions."""
+        self.socket.watch(self.events())
+        for policy in self.policies:
+            setup = getattr(policy.module, "setup", None)
+            if setup is None or not policy.enabled:
+                continue
+            try:
+                setup(self.socket)
+            except Exception:
+                policy.stats.errors += 1
+                print(f"Policy {policy.name} failed to set up and is skipped:", file=sys.stderr)
+                traceback.print_exc()
+                self.remove(policy)
+
+    def dispatch(self, event: dict):
+        name = event.get("event")
+        if name is None:
+            return
+        for policy in self._routes.get(name, []) + self._catch_all:
+            stats = policy.stats
+            start_cpu = time.thread_time()
+            start = time.perf_counter()
+            try:
+                policy.handle(event, self.socket)
+            except Exception:
+                stats.errors += 1
+                print(f"Policy {policy.name} failed to handle {name}:", file=sys.stderr)
+                traceback.print_exc()
+            elapsed = time.perf_counter() - start
+            stats.cpu_time += time.thread_time() - start_cpu
+            stats.handler_time += elapsed
+            stats.max_latency = max(stats.max_latency, elapsed)
+            stats.events += 1
+
+    def report(self) -> str:
+        lines = [f"{'policy':<24} {'events':>8} {'errors':>6} {'cpu ms':>10} {'mean ms':>8} {'max ms':>8}"]
+        for policy in self.policies:
+            s = policy.stats
+            name = policy.name if policy.enabled else policy.name + " (off)"
+            lines.append(f"{name:<24} {s.events:>8} {s.errors:>6} {s.cpu_time * 1000:>10.2f} "
+                         f"{s.mean_latency * 1000:>8.3f} {s.max_latency * 1000:>8.3f}")
+        return "\n".join(lines)
+
+    def run(self, stats_interval: Optional[float]=None):
+        """Start the policies and dispatch events until interrupted."""
+        self.start()
+        next_report = time.monotonic() + stats_interval if stats_interval else None
+        while True:
+            self.dispatch(self.socket.read_next_event())
+            if next_report is not None and time.monotonic() >= next_report:
+                print(self.report(), file=sys.stderr)
+                next_report = time.monotonic() + stats_interval
+
+
+def main(argv: Optional[List[str]]=None):
+    config_home = os.getenv("XDG_CONFIG_HOME") or os.path.join(os.path.expanduser("~"), ".config")
+    parser = argparse.ArgumentParser(prog="wayfire-script-host",
+                                     description="Run Wayfire policy scripts over a single IPC connection.")
+    parser.add_argument("directory", nargs="?", default=os.path.join(config_home, "wayfire", "policies"),
+                        help="directory containing the policy modules")
+    parser.add_argument("--stats", type=float, metavar="SECONDS",
+                        help="print per-policy statistics at most this often")
+    args = parser.parse_args(argv)
+
+    host = ScriptHost(WayfireSocket())
+    host.load_directory(args.directory)
+    if not host.policies:
+        parser.error(f"no policies found in {args.directory}")
+
+    try:
+        host.run(args.stats)
+    except KeyboardInterrupt:
+        print(host.report(), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,477 @@
+import json as js
+import os
+import select
+import subprocess
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from wayfire.core.template import get_msg_template, geometry_to_json
+
+SESSION_FORMAT = "wayfire-session"
+SESSION_VERSION = 1
+
+# Record kinds in a session journal. Every record is a list starting with the kind and the view id.
+ADD = "+"         # ["+", id, app-id, title, x, y, w, h, wset, output]
+GEOMETRY = "g"    # ["g", id, x, y, w, h]
+REMOVE = "-"      # ["-", id]
+
+
+class SavedView:
+    """The saved state of one window."""
+    __slots__ = ("app_id", "title", "geometry", "wset", "output")
+
+    def __init__(self, app_id: str, title: str, geometry: Tuple[int, int, int, int],
+                 wset: Optional[int]=None, output: Optional[str]=None):
+        self.app_id = app_id
+        self.title = title
+        self.geometry = geometry
+        self.wset = wset
+        self.output = output
+
+    @classmethod
+    def from_view(cls, view: dict) -> "SavedView":
+        g = view["geometry"]
+        return cls(view["app-id"], view.get("title", ""), (g["x"], g["y"], g["width"], g["height"]),
+                   view.get("wset-index"), view.get("output-name"))
+
+    def __repr__(self):
+        return f"SavedView({self.app_id!r}, {self.title!r}, {self.geometry}, {self.wset}, {self.output!r})"
+
+
+class SessionJournal:
+    """
+    Append-only on-disk log of window changes, compacted into a snapshot when it grows too long.
+
+    The file starts with a header line identifying the format and its version, followed by one compact
+    JSON record per line. Records are buffered in memory, and geometry updates of the same view replace
+    each other until they are written, so dragging a window produces one record per flush instead of
+    one file rewrite per motion event. Flushes (and the fsync after them) happen at most once every
+    `flush_interval` seconds unless forced.
+    """
+    def __init__(self, path: str, flush_interval: float=1.0, compact_threshold: int=512):
+        """
+        Args:
+            path (str): The journal file.
+            flush_interval (float): Minimum seconds between two writes to the file.
+            compact_threshold (int): Number of records after which the journal is rewritten as a snapshot,
+                if it holds more than twice as many records as there are live views.
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self.compact_threshold = compact_threshold
+        self.bytes_written = 0
+        self.flushes = 0
+        self.compactions = 0
+
+        self._records = 0
+        self._buffer: List[list] = []
+        self._pending_geometry: Dict[int, Tuple[int, int, int, int]] = {}
+        self._last_flush = 0.0
+        self._file = None
+
+    def load(self) -> Dict[int, SavedView]:
+        """Replay the journal and return the saved views by their view id at the time they were saved."""
+        views: Dict[int, SavedView] = {}
+        self._records = 0
+        try:
+            with open(self.path) as file:
+                lines = file.read().splitlines()
+        except FileNotFoundError:
+            return views
+        if not lines:
+            return views
+
+        header = js.loads(lines[0])
+        if header.get("format") != SESSION_FORMAT:
+            raise ValueError(f"{self.path} is not a session journal.")
+        if header.get("version") != SESSION_VERSION:
+            raise ValueError(f"Unsupported session journal version {header.get('version')}.")
+
+        for line in lines[1:]:
+            if not line:
+                continue
+            try:
+                record = js.loads(line)
+            except ValueError:
+                # A crash while appending can leave a truncated last line behind
+                break
+            kind, view_id = record[0], record[1]
+            if kind == ADD:
+                views[view_id] = SavedView(record[2], record[3], tuple(record[4:8]), record[8], record[9])
+            elif kind == GEOMETRY:
+                if view_id in views:
+                    views[view_id].geometry = tuple(record[2:6])
+            elif kind == REMOVE:
+                views.pop(view_id, None)
+            self._records += 1
+        return views
+
+    def add(self, view_id: int, view: SavedView):
+        self._buffer.append([ADD, view_id, view.app_id, view.title, *view.geometry, view.wset, view.output])
+
+    def update_geometry(self, view_id: int, geometry: Tuple[int, int, int, int]):
+        self._pending_geometry[view_id] = geometry
+
+    def remove(self, view_id: int):
+        self._pending_geometry.pop(view_id, None)
+        self._buffer.append([REMOVE, view_id])
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._buffer or self._pending_geometry)
+
+    def time_until_flush(self) -> Optional[float]:
+        """Seconds until the pending records can be written, or None if there is nothing to write."""
+        if not self.dirty:
+            return None
+        return max(0.0, self._last_flush + self.flush_interval - time.monotonic())
+
+    def _write(self, lines: List[str]):
+        data = "".join(lines).encode()
+        if self._file is None:
+            new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+            self._file = open(self.path, "ab")
+            if new:
+                data = self._header() + data
+        self._file.write(data)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.bytes_written += len(data)
+
+    @staticmethod
+    def _header() -> bytes:
+        return (js.dumps({"format": SESSION_FORMAT, "version": SESSION_VERSION}) + "\n").encode()
+
+    @staticmethod
+    def _encode(record: list) -> str:
+        return js.dumps(record, separators=(",", ":")) + "\n"
+
+    def flush(self, views: Dict[int, SavedView], force: bool=False):
+        """
+        Write the pending records if the flush interval has passed, or immediately if `force` is set.
+
+        Args:
+            views (Dict[int, SavedView]): The current live views, used when the journal is compacted.
+            force (bool): Write even if the last flush was less than `flush_interval` seconds ago.
+        """
+        if not self.dirty:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_flush < self.flush_interval:
+            return
+
+        records = self._buffer
+        records.extend([GEOMETRY, view_id, *geometry] for view_id, geometry in self._pending_geometry.items())
+        self._buffer = []
+        self._pending_geometry = {}
+        self._last_flush = now
+        self.flushes += 1
+
+        if self._records + len(records) > max(self.compact_threshold, 2 * len(views)):
+            self.compact(views)
+        else:
+            self._write([self._encode(record) for record in records])
+            self._records += len(records)
+
+    def compact(self, views: Dict[int, SavedView]):
+        """Atomically replace the journal with a snapshot holding one record per live view."""
+        self.close()
+        temp_path = self.path + ".tmp"
+        lines = [self._encode([ADD, view_id, v.app_id, v.title, *v.geometry, v.wset, v.output])
+                 for view_id, v in views.items()]
+        data = self._header() + "".join(lines).encode()
+        with open(temp_path, "wb") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, self.path)
+
+        self.bytes_written += len(data)
+        self.compactions += 1
+        self._records = len(views)
+        self._buffer = []
+        self._pending_geometry = {}
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class SessionStore:
+    """
+    The windows of the current session, indexed by view id and app-id, persisted through a `SessionJournal`.
+
+    Feed it `view-mapped`, `view-unmapped`, `view-geometry-changed`, `view-title-changed` and
+    `view-wset-changed` events with `handle_event()`. Only mapped toplevel views with an app-id are
+    tracked. Views of the previous session are available in `saved` after `load()`, and stay in
+    `views` under negative placeholder ids until a view with their app-id replaces them.
+
+    Example:
+        >>> store = SessionStore(SessionJournal(os.path.expanduser("~/.config/wayfire-session.journal")))
+        >>> saved = store.load()
+        >>> sock.watch(SessionStore.EVENTS)
+        >>> while True:
+        ...     store.handle_event(sock.read_next_event())
+    """
+    EVENTS = ["view-mapped", "view-unmapped", "view-geometry-changed", "view-title-changed", "view-wset-changed"]
+
+    def __init__(self, journal: SessionJournal):
+        self.journal = journal
+        self.views: Dict[int, SavedView] = {}
+        self.by_app_id: Dict[str, Dict[int, SavedView]] = {}
+        self.saved: List[SavedView] = []
+        self._unclaimed: Dict[str, List[int]] = {}
+
+    def load(self) -> List[SavedView]:
+        """
+        Read the views of the previous session.
+
+        The view ids in the journal are meaningless in the new session, so the saved views are kept in
+        `views` under negative placeholder ids, which never collide with real ones. Each one is replaced
+        when a view with its app-id is tracked, so the saved session stays on disk until its windows are
+        back, even if the script is restarted during the restore.
+        """
+        self.saved = list(self.journal.load().values())
+        self._unclaimed = {}
+        for index, saved in enumerate(self.saved):
+            placeholder = -1 - index
+            self.views[placeholder] = saved
+            self._unclaimed.setdefault(saved.app_id, []).append(placeholder)
+        self.journal.compact(self.views)
+        return self.saved
+
+    def discard(self, saved: List[SavedView]):
+        """Drop saved views which will not come back, e.g. because their application failed to launch."""
+        for view in saved:
+            placeholders = self._unclaimed.get(view.app_id, [])
+            placeholder = next((p for p in placeholders if self.views[p] is view), None)
+            if placeholder is not None:
+                self._release(view.app_id, placeholder)
+
+    def _release(self, app_id: str, placeholder: int):
+        placeholders = self._unclaimed[app_id]
+        placeholders.remove(placeholder)
+        if not placeholders:
+            del self._unclaimed[app_id]
+        del self.views[placeholder]
+        self.journal.remove(placeholder)
+
+    def _claim(self, saved: SavedView):
+        # The new view takes the place of a saved view with its app-id, preferably one with its title
+        placeholders = self._unclaimed.get(saved.app_id)
+        if placeholders:
+            placeholder = next((p for p in placeholders if self.views[p].title == saved.title), placeholders[0])
+            self._release(saved.app_id, placeholder)
+
+    def find(self, app_id: str) -> List[SavedView]:
+        """The tracked views with the given app-id."""
+        return list(self.by_app_id.get(app_id, {}).values())
+
+    def track(self, view: dict) -> SavedView:
+        saved = SavedView.from_view(view)
+        self.views[view["id"]] = saved
+        self.by_app_id.setdefault(saved.app_id, {})[view["id"]] = saved
+        self.journal.add(view["id"], saved)
+        return saved
+
+    def untrack(self, view_id: int):
+        saved = self.views.pop(view_id, None)
+        if saved is None:
+            return
+        same_app = self.by_app_id[saved.app_id]
+        del same_app[view_id]
+        if not same_app:
+            del self.by_app_id[saved.app_id]
+        self.journal.remove(view_id)
+
+    def handle_event(self, event: dict):
+        """Update the store from an event and flush the journal if the flush interval has passed."""
+        view = event.get("view")
+        if view is None or not view.get("app-id") or view.get("type") != "toplevel":
+            self.journal.flush(self.views)
+            return
+
+        name = event.get("event")
+        view_id = view["id"]
+        if name == "view-mapped":
+            if view_id not in self.views:
+                self._claim(self.track(view))
+        elif name == "view-unmapped":
+            self.untrack(view_id)
+        elif view_id in self.views and view.get("mapped", True):
+            saved = self.views[view_id]
+            if name == "view-geometry-changed":
+                g = view["geometry"]
+                saved.geometry = (g["x"], g["y"], g["width"], g["height"])
+                self.journal.update_geometry(view_id, saved.geometry)
+            elif name in ("view-title-changed", "view-wset-changed"):
+                # Rare enough to simply re-add the view with its new state
+                self.untrack(view_id)
+                self.track(view)
+        self.journal.flush(self.views)
+
+    def flush(self):
+        """Write all pending changes now."""
+        self.journal.flush(self.views, force=True)
+
+    def close(self):
+        self.flush()
+        self.journal.close()
+
+
+def gtk_launch(app_id: str):
+    """Start an application through its .desktop file, which must be named after its app-id."""
+    subprocess.run(["gtk-launch", app_id], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+class RestoreResult:
+    """
+    Outcome of `SessionRestorer.run()`.
+
+    Attributes:
+        restored (List[Tuple[SavedView, int]]): Every restored window and the id of the view it was matched to.
+        timed_out (List[SavedView]): Saved windows for which no view appeared before the timeout.
+        failed (List[Tuple[SavedView, str]]): Saved windows whose application could not be launched.
+        duration (float): Seconds from the start of the restore until the last window was placed.
+        hold_latency (Dict[int, float]): For every restored view, seconds between receiving its
+            `view-pre-map` event and unblocking its map.
+    """
+    def __init__(self):
+        self.restored: List[Tuple[SavedView, int]] = []
+        self.timed_out: List[SavedView] = []
+        self.failed: List[Tuple[SavedView, str]] = []
+        self.duration = 0.0
+        self.hold_latency: Dict[int, float] = {}
+
+
+class SessionRestorer:
+    """
+    Launches the applications of a saved session concurrently and places their windows before they are shown.
+
+    All applications are launched from a pool of worker threads. The restorer subscribes to `view-pre-map`,
+    so Wayfire holds every new view until it is unblocked. Each held view is matched to a saved window with
+    the same app-id, preferring one with the same title, and is moved to the saved wset, output and geometry
+    in one pipelined burst which ends with `unblock_view_map`. Views which don't match any saved window are
+    unblocked right away. Saved windows without a view after `timeout` seconds are given up on.
+
+    Use a dedicated connection for the restorer and close it afterwards: Wayfire keeps holding new views
+    for as long as a client is subscribed to `view-pre-map`. Other events received during the restore are
+    put back into the socket's pending events.
+
+    Example:
+        >>> restore_socket = WayfireSocket()
+        >>> result = SessionRestorer(restore_socket, store.load()).run()
+        >>> restore_socket.close()
+    """
+    def __init__(self, socket, saved: List[SavedView], launcher: Callable[[str], None]=gtk_launch,
+                 workers: int=8, timeout: float=10.0):
+        """
+        Args:
+            socket (WayfireSocket): The connection used to receive `view-pre-map` and place the views.
+            saved (List[SavedView]): The windows to restore, one application launch per window.
+            launcher (Callable[[str], None]): Starts an application given its app-id; raises on failure.
+            workers (int): Maximum number of concurrent launches.
+            timeout (float): Seconds to wait for all windows to appear.
+        """
+        self.socket = socket
+        self.saved = list(saved)
+        self.launcher = launcher
+        self.workers = workers
+        self.timeout = timeout
+        self._slots: Dict[str, List[SavedView]] = {}
+        for slot in self.saved:
+            self._slots.setdefault(slot.app_id, []).append(slot)
+
+    def _match(self, view: dict) -> Optional[SavedView]:
+        slots = self._slots.get(view.get("app-id"))
+        if not slots:
+            return None
+        index = next((i for i, slot in enumerate(slots) if slot.title == view.get("title")), 0)
+        slot = slots.pop(index)
+        if not slots:
+            del self._slots[slot.app_id]
+        return slot
+
+    def _drop(self, slot: SavedView):
+        slots = self._slots.get(slot.app_id, [])
+        if slot in slots:
+            slots.remove(slot)
+            if not slots:
+                del self._slots[slot.app_id]
+
+    def _placement(self, view: dict, slot: SavedView, outputs: Dict[str, int]) -> List[dict]:
+        messages = []
+        if slot.wset is not None and slot.wset != view.get("wset-index"):
+            message = get_msg_template("wsets/send-view-to-wset")
+            message["data"]["view-id"] = view["id"]
+            message["data"]["wset-index"] = slot.wset
+            messages.append(message)
+
+        message = get_msg_template("window-rules/configure-view")
+        message["data"]["id"] = view["id"]
+        message["data"]["geometry"] = geometry_to_json(*slot.geometry)
+        if slot.output in outputs and outputs[slot.output] != view.get("output-id"):
+            message["data"]["output_id"] = outputs[slot.output]
+        messages.append(message)
+        return messages
+
+    def _unblock(self, view_id: int, messages: Optional[List[dict]]=None):
+        unblock = get_msg_template("window-rules/unblock-map")
+        unblock["data"]["id"] = view_id
+        # Placement errors are ignored, the view has to be unblocked in any case
+        self.socket.send_json_batch((messages or []) + [unblock], raise_on_error=False)
+
+    def run(self) -> RestoreResult:
+        """Launch all saved applications and place their windows. Returns once all are placed or the timeout expires."""
+        result = RestoreResult()
+        start = time.monotonic()
+        deadline = start + self.timeout
+        deferred = []
+
+        self.socket.watch(["view-pre-map"])
+        outputs = {output["name"]: output["id"] for output in self.socket.list_outputs()}
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            launches: List[Tuple[SavedView, Future]] = [(slot, pool.submit(self.launcher, slot.app_id))
+                                                        for slot in self.saved]
+            while self._slots:
+                for slot, launch in [entry for entry in launches if entry[1].done()]:
+                    launches.remove((slot, launch))
+                    if launch.exception() is not None:
+                        result.failed.append((slot, str(launch.exception())))
+                        self._drop(slot)
+                if not self._slots:
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                if not self.socket.pending_events:
+                    # Wake up regularly to notice failed launches
+                    readable, _, _ = select.select([self.socket.client], [], [], min(remaining, 0.05))
+                    if not readable:
+                        continue
+
+                event = self.socket.read_next_event()
+                if event.get("event") != "view-pre-map":
+                    deferred.append(event)
+                    continue
+
+                received = time.monotonic()
+                view = event["view"]
+                slot = self._match(view)
+                if slot is None:
+                    self._unblock(view["id"])
+                    continue
+
+                self._unblock(view["id"], self._placement(view, slot, outputs))
+                result.restored.append((slot, view["id"]))
+                result.hold_latency[view["id"]] = time.monotonic() - received
+                result.duration = time.monotonic() - start
+
+        for slots in self._slots.values():
+            result.timed_out.extend(slots)
+        self._slots = {}
+        self.socket.pending_events[:0] = deferred
+        return result
@@ -0,0 +1,213 @@
+import select
+import time
+from typing import Callable, Dict, List, Optional, Set
+from wayfire.core.template import object_id
+from wayfire.ipc import WayfireSocket
+
+# XKB modifier mask bits, as reported in `keyboard-modifier-state-changed`
+MODIFIER_MASKS = {
+    "shift": 1,
+    "caps_lock": 2,
+    "ctrl": 4,
+    "alt": 8,
+    "num_lock": 16,
+    "super": 64,
+}
+
+
+def modifier_mask(*modifiers: str) -> int:
+    """The mask of modifier names, e.g. `modifier_mask("super", "shift")`."""
+    mask = 0
+    for modifier in modifiers:
+        try:
+            mask |= MODIFIER_MASKS[modifier.lower()]
+        except KeyError:
+            raise ValueError(f"Unknown modifier {modifier!r}. Use one of {', '.join(MODIFIER_MASKS)}.")
+    return mask
+
+
+class StateTracker:
+    """
+    Compositor state which changes often, kept up to date from IPC events.
+
+    Tracks which plugins are active on which output (`plugin-activation-state-changed`), the
+    depressed keyboard modifiers (`keyboard-modifier-state-changed`), the focused output
+    (`output-gain-focus`) and the wset shown on every output (`output-wset-changed`). Every query
+    is answered from memory.
+
+    The focused output and the wsets are read once with `get_focused_output` and `list_outputs`.
+    Wayfire can't be asked which plugins are active or which modifiers are held, so until the first
+    event the tracker assumes no plugin is active and no modifier is held.
+
+    Pass every event read from the socket to `handle_event()`, or use the `wait_for*()` helpers,
+    which read events until a condition holds.
+
+    Example:
+        >>> state = StateTracker(sock)
+        >>> state.watch()
+        >>> if state.wait_for_plugin("scale", output_id=2, timeout=1.0):
+        ...     print("scale is active on output 2")
+        >>> state.modifiers_held("super")
+        False
+
+    Attributes:
+        modifiers (int): The depressed modifier mask.
+        events (int): Number of events handled.
+    """
+    EVENTS = ["plugin-activation-state-changed", "keyboard-modifier-state-changed", "output-gain-focus",
+              "output-wset-changed", "output-layout-changed"]
+
+    def __init__(self, socket: WayfireSocket):
+        self.socket = socket
+        self.modifiers = 0
+        self.events = 0
+        self._plugins: Dict[str, Set[int]] = {}
+        self._by_output: Dict[int, Set[str]] = {}
+        self._focused: Optional[int] = None
+        self._wsets: Optional[Dict[int, int]] = None
+        # Events handled by wait_for() and put back into the socket's pending events, by id
+        self._handled: Dict[int, dict] = {}
+
+    def watch(self):
+        """Subscribe the socket to the events the tracker needs."""
+        return self.socket.watch(self.EVENTS)
+
+    def _load(self) -> Dict[int, int]:
+        if self._wsets is None:
+            self._wsets = {output["id"]: output["wset-index"] for output in self.socket.list_outputs()}
+            if self._focused is None:
+                focused = self.socket.get_focused_output()
+                self._focused = focused["id"] if focused else None
+        return self._wsets
+
+    def is_active(self, plugin: str, output_id: Optional[int]=None) -> bool:
+        """Whether a plugin is active on an output, or on any output if no output is given."""
+        outputs = self._plugins.get(plugin)
+        if not outputs:
+            return False
+        return output_id is None or output_id in outputs
+
+    def active_plugins(self, output_id: Optional[int]=None) -> Set[str]:
+        """The plugins active on an output, or on any output if no output is given."""
+        if output_id is None:
+            return {plugin for plugin, outputs in self._plugins.items() if outputs}
+        return set(self._by_output.get(output_id, ()))
+
+    def modifiers_held(self, *modifiers: str) -> bool:
+        """Whether all the given modifiers are held. Other modifiers may be held as well."""
+        mask = modifier_mask(*modifiers)
+        return self.modifiers & mask == mask
+
+    @property
+    def focused_output_id(self) -> Optional[int]:
+        self._load()
+        return self._focused
+
+    def wset(self, output_id: Optional[int]=None) -> Optional[int]:
+        """The index of the wset shown on an output, the focused output by default."""
+        wsets = self._load()
+        return wsets.get(self._focused if output_id is None else output_id)
+
+    def _set_plugin(self, plugin: str, output_id: Optional[int], active: bool):
+        outputs = self._plugins.setdefault(plugin, set())
+        if active:
+            outputs.add(output_id)
+            self._by_output.setdefault(output_id, set()).add(plugin)
+        else:
+            outputs.discard(output_id)
+            self._by_output.get(output_id, set()).discard(plugin)
+
+    def handle_event(self, event: dict):
+        """
+        Update the state according to an event. Unrelated events are ignored, and so are events
+        `wait_for()` already handled and put back into the socket's pending events.
+        """
+        if self._handled.pop(id(event), None) is event:
+            return
+        self._apply(event)
+
+    def _apply(self, event: dict):
+        name = event.get("event")
+        if name == "plugin-activation-state-changed":
+            self._set_plugin(event.get("plugin"), object_id(event.get("output")), bool(event.get("state")))
+        elif name == "keyboard-modifier-state-changed":
+            depressed = (event.get("state") or {}).get("depressed")
+            if depressed is not None:
+                self.modifiers = depressed
+        elif name == "output-gain-focus":
+            self._focused = object_id(event.get("output"))
+        elif name == "output-wset-changed":
+            output_id = object_id(event.get("output"))
+            wset = object_id(event.get("new-wset"))
+            if self._wsets is not None and output_id is not None and wset is not None:
+                self._wsets[output_id] = wset
+        elif name == "output-layout-changed":
+            # Outputs may have been added or removed
+            self._wsets = None
+            for output_id in list(self._by_output):
+                if output_id not in self._load():
+                    for plugin in self._by_output.pop(output_id):
+                        self._plugins[plugin].discard(output_id)
+        else:
+            return
+        self.events += 1
+
+    def wait_for(self, condition: Callable[["StateTracker"], bool], timeout: Optional[float]=None,
+                 requeue: bool=True) -> bool:
+        """
+        Read and handle events until a condition holds.
+
+        Args:
+            condition (Callable[[StateTracker], bool]): Called with the tracker after every event.
+            timeout (Optional[float]): Maximum seconds to wait, None to wait forever.
+            requeue (bool): Put the events read while waiting back into the socket's pending events,
+                so the caller's event loop still sees them. The tracker remembers that it handled them,
+                and ignores them when they are passed to `handle_event()` again.
+
+        Returns:
+            bool: Whether the condition holds, False if the timeout expired first.
+        """
+        if condition(self):
+            return True
+        # Forget handled events the caller has dropped from the pending events without handling them
+        pending = {id(event) for event in self.socket.pending_events}
+        self._handled = {key: event for key, event in self._handled.items() if key in pending}
+
+        end = None if timeout is None else time.monotonic() + timeout
+        consumed: List[dict] = []
+        try:
+            while True:
+                if not self.socket.pending_events and self.socket.unread_replies > 0:
+                    # Replies to pipelined requests are not events, consume them first
+                    self.socket.drain_replies()
+                    continue
+                if self.socket.pending_events:
+                    event = self.socket.pending_events.pop(0)
+                else:
+                    remaining = None if end is None else end - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    readable, _, _ = select.select([self.socket.client], [], [], remaining)
+                    if not readable:
+                        return False
+                    event = self.socket.read_next_event()
+                consumed.append(event)
+                self.handle_event(event)
+                if condition(self):
+                    return True
+        finally:
+            if requeue:
+                self.socket.pending_events[:0] = consumed
+                self._handled.update((id(event), event) for event in consumed)
+
+    def wait_for_plugin(self, plugin: str, active: bool=True, output_id: Optional[int]=None,
+                        timeout: Optional[float]=None) -> bool:
+        """Wait until a plugin is (or is no longer) active on an output, or on any output."""
+        return self.wait_for(lambda state: state.is_active(plugin, output_id) == active, timeout)
+
+    def wait_for_modifiers(self, *modifiers: str, released: bool=False, timeout: Optional[float]=None) -> bool:
+        """Wait until all the given modifiers are held, or until none of them is held if `released` is set."""
+        mask = modifier_mask(*modifiers)
+        if released:
+            return self.wait_for(lambda state: not state.modifiers & mask, timeout)
+        return self.wait_for(lambda state: state.modifiers & mask == mask, timeout)
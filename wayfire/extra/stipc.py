@@ -1,6 +1,15 @@
 import time
 from wayfire.core.template import get_msg_template
 from wayfire.ipc import WayfireSocket
+from wayfire.extra.input_stream import InputStream
+
+# Modifier prefixes accepted by press_key(), e.g. "A-S-KEY_TAB"
+KEY_MODIFIERS = {
+    "A": "KEY_LEFTALT",
+    "S": "KEY_LEFTSHIFT",
+    "C": "KEY_LEFTCTRL",
+    "W": "KEY_LEFTMETA",
+}
 
 class Stipc:
     def __init__(self, socket: WayfireSocket):
@@ -46,6 +55,19 @@ class Stipc:
         message["data"]["y"] = y
         return self.socket.send_json(message)
 
+    def stream(self, rate: float=1000) -> InputStream:
+        """
+        Create a stream which sends cursor, touch and tablet axis motion without waiting for replies.
+
+        Args:
+            rate (float): Target number of samples per second.
+
+        Returns:
+            InputStream: A stream bound to the same socket. Call its `flush()` method before using
+                         this object again.
+        """
+        return InputStream(self.socket, rate)
+
     def set_touch(self, id: int, x: int, y: int):
         method = "stipc/touch"
         message = get_msg_template(method)
@@ -187,12 +209,7 @@ class Stipc:
         Returns:
             None: This method performs actions without returning a value.
         """
-        modifiers = {
-            "A": "KEY_LEFTALT",
-            "S": "KEY_LEFTSHIFT",
-            "C": "KEY_LEFTCTRL",
-            "W": "KEY_LEFTMETA",
-        }
+        modifiers = KEY_MODIFIERS
         key_combinations = keys.split("-")
 
         for modifier in key_combinations[:-1]:
@@ -0,0 +1,785 @@
+import math
+import time
+from typing import Dict, Iterator, List, Optional, Set, Tuple, Type, Union
+from wayfire.core.template import object_id
+
+# Orientation of a split, using the keys of the simple-tile layout format.
+# In a vertical split the children are placed side by side, in a horizontal split they are stacked.
+VERTICAL = "vertical-split"
+HORIZONTAL = "horizontal-split"
+
+
+def _flip(orientation: str) -> str:
+    return HORIZONTAL if orientation == VERTICAL else VERTICAL
+
+
+class TileLeaf:
+    def __init__(self, view_id: int, weight: float=1.0):
+        self.view_id = view_id
+        self.weight = weight
+        self.parent: Optional["TileSplit"] = None
+
+
+class TileSplit:
+    def __init__(self, orientation: str, weight: float=1.0):
+        if orientation not in (VERTICAL, HORIZONTAL):
+            raise ValueError(f"Invalid split orientation '{orientation}'.")
+        self.orientation = orientation
+        self.weight = weight
+        self.parent: Optional["TileSplit"] = None
+        self.children: List[Union["TileSplit", TileLeaf]] = []
+
+    def insert(self, index: int, node: Union["TileSplit", TileLeaf]):
+        node.parent = self
+        self.children.insert(index, node)
+
+    def append(self, node: Union["TileSplit", TileLeaf]):
+        self.insert(len(self.children), node)
+
+
+TileNode = Union[TileSplit, TileLeaf]
+
+
+class TileTree:
+    """
+    A simple-tile layout of one workspace, as a tree of splits with views in the leaves.
+
+    The tree keeps an index from view id to leaf, so looking up, inserting next to, removing and
+    swapping views only touches the path from the leaf to the root (plus the sibling list of the
+    affected split), instead of walking the whole layout.
+
+    Trees can be created from and converted to the format used by `WayfireSocket.get_tiling_layout`
+    and `WayfireSocket.set_tiling_layout`.
+    """
+    def __init__(self, orientation: str=VERTICAL):
+        self.root = TileSplit(orientation)
+        self.last_inserted: Optional[int] = None
+        self._leaves: Dict[int, TileLeaf] = {}
+
+    def __len__(self):
+        return len(self._leaves)
+
+    def __contains__(self, view_id: int):
+        return view_id in self._leaves
+
+    def _assign(self, other: "TileTree"):
+        self.root = other.root
+        self.last_inserted = other.last_inserted
+        self._leaves = other._leaves
+
+    def leaf(self, view_id: int) -> TileLeaf:
+        return self._leaves[view_id]
+
+    def depth(self, view_id: int) -> int:
+        node = self._leaves[view_id]
+        depth = 0
+        while node.parent is not None:
+            node = node.parent
+            depth += 1
+        return depth
+
+    def nodes(self) -> Iterator[TileNode]:
+        """Iterate over all nodes in depth-first order, starting with the root."""
+        stack: List[TileNode] = [self.root]
+        while stack:
+            node = stack.pop()
+            yield node
+            if isinstance(node, TileSplit):
+                stack.extend(reversed(node.children))
+
+    def views(self) -> List[int]:
+        """The ids of all views in layout order (left to right, top to bottom)."""
+        return [node.view_id for node in self.nodes() if isinstance(node, TileLeaf)]
+
+    def last_leaf(self) -> Optional[TileLeaf]:
+        node: TileNode = self.root
+        while isinstance(node, TileSplit):
+            if not node.children:
+                return None
+            node = node.children[-1]
+        return node
+
+    def insert(self, view_id: int, target: Optional[int]=None, orientation: Optional[str]=None,
+               weight: float=1.0, before: bool=False) -> TileLeaf:
+        """
+        Add a view to the layout.
+
+        Args:
+            view_id (int): The view to add.
+            target (Optional[int]): The view next to which the new view is placed. If None, the view
+                is appended to the root split.
+            orientation (Optional[str]): `VERTICAL` or `HORIZONTAL`. If it differs from the orientation
+                of the split containing `target`, the target is replaced by a new split containing both
+                views, which inherits the weight of the target. Defaults to the orientation of that split.
+            weight (float): The weight of the new view within its split.
+            before (bool): Whether to place the new view before the target instead of after it.
+
+        Returns:
+            TileLeaf: The leaf of the new view.
+        """
+        if view_id in self._leaves:
+            raise ValueError(f"View {view_id} is already part of the layout.")
+
+        leaf = TileLeaf(view_id, weight)
+        if target is None:
+            self.root.append(leaf)
+        else:
+            target_leaf = self._leaves[target]
+            parent = target_leaf.parent
+            if parent.children[-1] is target_leaf:
+                index = len(parent.children) - 1
+            else:
+                index = parent.children.index(target_leaf)
+            if orientation is None or orientation == parent.orientation:
+                parent.insert(index + (0 if before else 1), leaf)
+            else:
+                split = TileSplit(orientation, target_leaf.weight)
+                parent.children[index] = split
+                split.parent = parent
+                target_leaf.weight = 1.0
+                split.append(target_leaf)
+                split.insert(0 if before else 1, leaf)
+
+        self._leaves[view_id] = leaf
+        self.last_inserted = view_id
+        return leaf
+
+    def remove(self, view_id: int):
+        """
+        Remove a view from the layout.
+
+        Splits left with a single child are replaced by that child, and empty splits are removed.
+        """
+        leaf = self._leaves.pop(view_id)
+        node = leaf.parent
+        node.children.remove(leaf)
+
+        while node is not self.root and len(node.children) <= 1:
+            parent = node.parent
+            index = parent.children.index(node)
+            if node.children:
+                child = node.children[0]
+                if isinstance(child, TileSplit) and child.orientation == parent.orientation:
+                    # Splice the grandchildren in, keeping their share of the removed split
+                    total = sum(c.weight for c in child.children)
+                    for c in child.children:
+                        c.weight = c.weight * node.weight / total
+                        c.parent = parent
+                    parent.children[index:index + 1] = child.children
+                else:
+                    child.weight = node.weight
+                    child.parent = parent
+                    parent.children[index] = child
+            else:
+                del parent.children[index]
+            node = parent
+
+        # A root with a single split child is replaced by that child
+        if len(self.root.children) == 1 and isinstance(self.root.children[0], TileSplit):
+            self.root = self.root.children[0]
+            self.root.parent = None
+            self.root.weight = 1.0
+
+        if self.last_inserted == view_id:
+            last = self.last_leaf()
+            self.last_inserted = last.view_id if last else None
+
+    def swap(self, view_a: int, view_b: int):
+        """Exchange the positions of two views. Both keep the weight of the position they move to."""
+        leaf_a = self._leaves[view_a]
+        leaf_b = self._leaves[view_b]
+        leaf_a.view_id, leaf_b.view_id = view_b, view_a
+        self._leaves[view_a] = leaf_b
+        self._leaves[view_b] = leaf_a
+
+    def to_layout(self) -> dict:
+        """Convert the tree to the format expected by `WayfireSocket.set_tiling_layout`."""
+        # Built iteratively, deep layouts (e.g. spiral with many views) would exceed the recursion limit
+        layout = {self.root.orientation: []}
+        stack = [(self.root, layout[self.root.orientation])]
+        while stack:
+            split, output = stack.pop()
+            for child in split.children:
+                if isinstance(child, TileLeaf):
+                    output.append({"view-id": child.view_id, "weight": child.weight})
+                else:
+                    converted = {"weight": child.weight, child.orientation: []}
+                    output.append(converted)
+                    stack.append((child, converted[child.orientation]))
+        return layout
+
+    @staticmethod
+    def _weight(layout: dict, parent_orientation: Optional[str]) -> float:
+        if "weight" in layout:
+            return layout["weight"]
+        # get_tiling_layout reports geometry instead of weights; the size along the axis
+        # of the parent split is proportional to the weight.
+        geometry = layout.get("geometry")
+        if geometry is not None and parent_orientation is not None:
+            return geometry["width"] if parent_orientation == VERTICAL else geometry["height"]
+        return 1.0
+
+    @classmethod
+    def from_layout(cls, layout: dict) -> "TileTree":
+        """Build a tree from a layout as returned by `WayfireSocket.get_tiling_layout`."""
+        tree = cls()
+        if "view-id" in layout:
+            tree.insert(layout["view-id"])
+            return tree
+
+        tree.root = TileSplit(HORIZONTAL if HORIZONTAL in layout else VERTICAL)
+        stack = [(layout, tree.root)]
+        while stack:
+            node, split = stack.pop()
+            for child in node.get(split.orientation, []):
+                weight = cls._weight(child, split.orientation)
+                if "view-id" in child:
+                    leaf = TileLeaf(child["view-id"], weight)
+                    split.append(leaf)
+                    tree._leaves[leaf.view_id] = leaf
+                else:
+                    child_split = TileSplit(HORIZONTAL if HORIZONTAL in child else VERTICAL, weight)
+                    split.append(child_split)
+                    stack.append((child, child_split))
+
+        last = tree.last_leaf()
+        tree.last_inserted = last.view_id if last else None
+        return tree
+
+    def compute_geometry(self, x: int, y: int, width: int, height: int) -> Dict[int, Tuple[int, int, int, int]]:
+        """
+        Compute the geometry of every view when the layout fills the given rectangle.
+
+        Space is divided among the children of each split proportionally to their weights. Edges are
+        rounded so that neighbouring views never overlap or leave gaps.
+
+        Returns:
+            Dict[int, Tuple[int, int, int, int]]: (x, y, width, height) for every view id.
+        """
+        result: Dict[int, Tuple[int, int, int, int]] = {}
+        stack: List[Tuple[TileNode, int, int, int, int]] = [(self.root, x, y, width, height)]
+        while stack:
+            node, nx, ny, nw, nh = stack.pop()
+            if isinstance(node, TileLeaf):
+                result[node.view_id] = (nx, ny, nw, nh)
+                continue
+
+            total = sum(child.weight for child in node.children)
+            if total <= 0:
+                continue
+            vertical = node.orientation == VERTICAL
+            length = nw if vertical else nh
+            accumulated = 0.0
+            start = 0
+            for child in node.children:
+                accumulated += child.weight
+                end = round(length * accumulated / total)
+                if vertical:
+                    stack.append((child, nx + start, ny, end - start, nh))
+                else:
+                    stack.append((child, nx, ny + start, nw, end - start))
+                start = end
+        return result
+
+
+class LayoutChange:
+    """
+    One difference between two layouts, as found by `diff_layouts`.
+
+    Attributes:
+        kind (str): "insert" (view only in the desired layout), "remove" (view only in the current
+            layout), "move" (view at another position in the tree) or "resize" (view at the same
+            position, but with a different share of the space).
+        view_id (int): The affected view.
+        old: The previous position or shares, None for inserted views.
+        new: The new position or shares, None for removed views.
+    """
+    def __init__(self, kind: str, view_id: int, old=None, new=None):
+        self.kind = kind
+        self.view_id = view_id
+        self.old = old
+        self.new = new
+
+    def __repr__(self):
+        return f"LayoutChange({self.kind!r}, {self.view_id}, {self.old!r}, {self.new!r})"
+
+    def __eq__(self, other):
+        return (isinstance(other, LayoutChange) and
+                (self.kind, self.view_id, self.old, self.new) == (other.kind, other.view_id, other.old, other.new))
+
+
+def _leaf_positions(tree: TileTree) -> Dict[int, Tuple[Tuple[Tuple[str, int], ...], Tuple[float, ...]]]:
+    # For every view: the path of (split orientation, child index) from the root, and the share of
+    # the space of its split at every step of that path. Splits with a single child do not affect
+    # the geometry and are skipped, so equivalent layouts produce equal positions.
+    positions = {}
+    stack: List[Tuple[TileNode, tuple, tuple]] = [(tree.root, (), ())]
+    while stack:
+        node, path, shares = stack.pop()
+        if isinstance(node, TileLeaf):
+            positions[node.view_id] = (path, shares)
+            continue
+        if len(node.children) == 1:
+            stack.append((node.children[0], path, shares))
+            continue
+
+        total = sum(child.weight for child in node.children) or 1.0
+        for index, child in enumerate(node.children):
+            stack.append((child, path + ((node.orientation, index),), shares + (child.weight / total,)))
+    return positions
+
+
+def diff_layouts(current: TileTree, desired: TileTree, tolerance: float=0.01) -> List[LayoutChange]:
+    """
+    Compare two layouts by view id, position in the tree and relative weights.
+
+    Weights are compared as the share of the space of the containing split, so a layout read back
+    from `get_tiling_layout` (where weights are sizes in pixels) compares equal to the layout that
+    was set, as long as every share differs by less than `tolerance`.
+
+    Returns:
+        List[LayoutChange]: The changes needed to turn `current` into `desired`, empty if the layouts
+                            are equivalent.
+    """
+    old_positions = _leaf_positions(current)
+    new_positions = _leaf_positions(desired)
+    changes = []
+
+    for view_id, (old_path, old_shares) in old_positions.items():
+        if view_id not in new_positions:
+            changes.append(LayoutChange("remove", view_id, old_path, None))
+            continue
+
+        new_path, new_shares = new_positions[view_id]
+        if old_path != new_path:
+            changes.append(LayoutChange("move", view_id, old_path, new_path))
+        elif any(abs(a - b) > tolerance for a, b in zip(old_shares, new_shares)):
+            changes.append(LayoutChange("resize", view_id, old_shares, new_shares))
+
+    for view_id, (new_path, _) in new_positions.items():
+        if view_id not in old_positions:
+            changes.append(LayoutChange("insert", view_id, None, new_path))
+    return changes
+
+
+class TilingLayoutWriter:
+    """
+    Sets tiling layouts only when they differ from what the workspace already has.
+
+    The current layout of every (wset, x, y) workspace is taken from a `TilingLayoutCache`, which also
+    stores the layouts the writer applies. When a new layout is requested, it is diffed against the
+    cached layout (or against an explicitly passed current layout), and `set_tiling_layout` is skipped
+    entirely if nothing changed. simple-tile only accepts complete layouts, so when something did change,
+    the full desired layout is sent, without geometry fields.
+
+    Views are tiled, moved and closed behind the writer's back, so the cache has to see the tiling
+    events: call `watch()` and pass every event to `handle_event()`, or share a cache which is already
+    fed with events.
+
+    Attributes:
+        cache (TilingLayoutCache): The layouts the diffs are computed against.
+        diffs (int): Number of layouts compared.
+        skipped (int): Number of `set_tiling_layout` calls avoided because nothing changed.
+        sent (int): Number of `set_tiling_layout` calls made.
+        diff_time (float): Total seconds spent comparing layouts.
+    """
+    def __init__(self, socket, tolerance: float=0.01, cache: Optional["TilingLayoutCache"]=None):
+        self.socket = socket
+        self.tolerance = tolerance
+        self.cache = cache if cache is not None else TilingLayoutCache(socket)
+        self.diffs = 0
+        self.skipped = 0
+        self.sent = 0
+        self.diff_time = 0.0
+
+    def watch(self):
+        """Subscribe the socket to the events the cache needs."""
+        return self.cache.watch()
+
+    def handle_event(self, event: dict):
+        """Pass an event to the cache."""
+        self.cache.handle_event(event)
+
+    def forget(self, wset: Optional[int]=None, x: Optional[int]=None, y: Optional[int]=None):
+        """Re-read the layout of one workspace, all workspaces of a wset, or all workspaces before the next diff."""
+        self.cache.invalidate(wset, x, y)
+
+    def apply(self, wset: int, x: int, y: int, desired: Union[TileTree, dict],
+              current: Union[TileTree, dict, None]=None) -> List[LayoutChange]:
+        """
+        Apply `desired` to a workspace if it differs from the current layout.
+
+        Args:
+            wset (int): The index of the workspace set.
+            x (int): The x-coordinate of the workspace.
+            y (int): The y-coordinate of the workspace.
+            desired (TileTree | dict): The layout to apply.
+            current (TileTree | dict | None): The layout the workspace currently has. Defaults to the
+                cached layout, which is fetched with `get_tiling_layout` if it is missing or stale.
+
+        Returns:
+            List[LayoutChange]: The changes which were applied, empty if the call was skipped.
+        """
+        if isinstance(desired, dict):
+            desired = TileTree.from_layout(desired)
+        if isinstance(current, dict):
+            current = TileTree.from_layout(current)
+
+        if current is None:
+            current = self.cache.get(wset, x, y)
+
+        start = time.perf_counter()
+        changes = diff_layouts(current, desired, self.tolerance)
+        self.diff_time += time.perf_counter() - start
+        self.diffs += 1
+
+        if not changes:
+            self.skipped += 1
+        else:
+            # A copy, so later changes to the caller's tree are still diffed against what was applied
+            self.cache.set(wset, x, y, TileTree.from_layout(desired.to_layout()))
+            self.sent += 1
+        return changes
+
+
+WorkspaceKey = Tuple[int, int, int]
+
+
+class TilingLayoutCache:
+    """
+    Tiling layouts of workspaces, keyed by (wset, x, y) and kept up to date from IPC events.
+
+    Layouts are fetched with `get_tiling_layout` the first time they are needed and whenever an event
+    indicates that the layout of a workspace may have changed (`view-tiled`, `view-mapped`,
+    `view-unmapped`, `view-workspace-changed`, `view-wset-changed`). Such events only mark the affected
+    workspace as stale; it is re-fetched on the next access. Layouts set through the cache are written
+    through to the compositor and stored without another round trip.
+
+    The cache also keeps a flat index from view id to workspace, so `locate()` finds the leaf of a view
+    without walking any tree, and it tracks the active workspace of every wset from
+    `wset-workspace-changed`, so new views can be placed without asking for their output.
+
+    Pass every event read from the socket to `handle_event()`.
+
+    Attributes:
+        hits (int): Number of `get()` calls answered from the cache.
+        misses (int): Number of `get()` calls which needed a `get_tiling_layout` request.
+    """
+    EVENTS = ["view-tiled", "view-mapped", "view-unmapped", "view-workspace-changed", "view-wset-changed",
+              "wset-workspace-changed", "output-wset-changed"]
+
+    def __init__(self, socket):
+        self.socket = socket
+        self.hits = 0
+        self.misses = 0
+        self._layouts: Dict[WorkspaceKey, TileTree] = {}
+        self._stale: Set[WorkspaceKey] = set()
+        self._view_keys: Dict[int, WorkspaceKey] = {}
+        self._active_workspaces: Optional[Dict[int, Tuple[int, int]]] = None
+
+    def watch(self):
+        """Subscribe the socket to the events the cache needs."""
+        return self.socket.watch(self.EVENTS)
+
+    def _index(self, key: WorkspaceKey, tree: TileTree):
+        old = self._layouts.get(key)
+        if old is not None:
+            for view_id in old.views():
+                if self._view_keys.get(view_id) == key:
+                    del self._view_keys[view_id]
+        for view_id in tree.views():
+            self._view_keys[view_id] = key
+        self._layouts[key] = tree
+        self._stale.discard(key)
+
+    def get(self, wset: int, x: int, y: int) -> TileTree:
+        """
+        The layout of a workspace, fetched only if it is not cached or an event has made it stale.
+
+        The returned tree is owned by the cache. Modify it and pass it to `set()` to apply the changes.
+        """
+        key = (wset, x, y)
+        tree = self._layouts.get(key)
+        if tree is not None and key not in self._stale:
+            self.hits += 1
+            return tree
+
+        self.misses += 1
+        tree = TileTree.from_layout(self.socket.get_tiling_layout(wset, x, y))
+        self._index(key, tree)
+        return tree
+
+    def set(self, wset: int, x: int, y: int, tree: TileTree):
+        """Apply a layout to a workspace and store it in the cache."""
+        self.socket.set_tiling_layout(wset, x, y, tree.to_layout())
+        self._index((wset, x, y), tree)
+
+    def locate(self, view_id: int) -> Optional[Tuple[WorkspaceKey, TileLeaf]]:
+        """The workspace and leaf of a tiled view, if it is part of a cached layout."""
+        key = self._view_keys.get(view_id)
+        if key is None:
+            return None
+        return key, self._layouts[key].leaf(view_id)
+
+    def active_workspace(self, wset: int) -> Optional[Tuple[int, int]]:
+        """
+        The active workspace of a wset. The workspaces of all outputs are fetched once with `list_outputs`,
+        afterwards they are followed through events. Returns None for wsets without an output.
+        """
+        if self._active_workspaces is None:
+            self._active_workspaces = {}
+            for output in self.socket.list_outputs():
+                self._active_workspaces[output["wset-index"]] = (output["workspace"]["x"], output["workspace"]["y"])
+        return self._active_workspaces.get(wset)
+
+    def invalidate(self, wset: Optional[int]=None, x: Optional[int]=None, y: Optional[int]=None):
+        """Mark one workspace, all workspaces of a wset, or all workspaces as stale."""
+        for key in self._layouts:
+            if wset is None or (key[0] == wset and (x is None or key[1:] == (x, y))):
+                self._stale.add(key)
+
+    def _invalidate_view(self, view: dict):
+        key = self._view_keys.get(view.get("id"))
+        if key is not None:
+            self._stale.add(key)
+            return
+        wset = view.get("wset-index")
+        workspace = self.active_workspace(wset) if wset is not None and self._active_workspaces is not None else None
+        if workspace is not None:
+            self._stale.add((wset,) + workspace)
+        else:
+            # We don't know where the view is, so any workspace of its wset may have changed
+            self.invalidate(wset)
+
+    def handle_event(self, event: dict):
+        """Update the cache according to an event. Events which don't affect tiling are ignored."""
+        name = event.get("event")
+        view = event.get("view") or {}
+
+        if name == "wset-workspace-changed":
+            wset = object_id(event.get("wset"))
+            workspace = event.get("new-workspace")
+            if self._active_workspaces is not None and wset is not None and workspace is not None:
+                self._active_workspaces[wset] = (workspace["x"], workspace["y"])
+        elif name == "output-wset-changed":
+            # The new wset may have another active workspace, re-read all of them when needed
+            self._active_workspaces = None
+        elif name == "view-tiled":
+            # Views which are already part of a known layout only changed their tiled edges, unless
+            # they lost all of them, i.e. were made floating
+            edges = event.get("new-edges", view.get("tiled-edges"))
+            if view.get("id") not in self._view_keys or not edges:
+                self._invalidate_view(view)
+        elif name in ("view-mapped", "view-unmapped"):
+            if view.get("type") == "toplevel" or view.get("id") in self._view_keys:
+                self._invalidate_view(view)
+        elif name == "view-workspace-changed":
+            self._invalidate_view(view)
+            workspace = event.get("to")
+            wset = view.get("wset-index")
+            if workspace is not None and wset is not None:
+                self._stale.add((wset, workspace["x"], workspace["y"]))
+        elif name == "view-wset-changed":
+            self._invalidate_view(view)
+            self.invalidate(object_id(event.get("new-wset")))
+
+
+class LayoutPolicy:
+    """
+    Base class of tiling policies, which decide where new views are placed in a `TileTree`.
+
+    Subclasses implement `insert`. `build` creates a whole layout by inserting the views one by one,
+    and `remove` removes a view, possibly rearranging the remaining ones.
+    """
+    name = ""
+
+    def insert(self, tree: TileTree, view_id: int, target: Optional[int]=None):
+        raise NotImplementedError
+
+    def remove(self, tree: TileTree, view_id: int):
+        tree.remove(view_id)
+
+    def build(self, view_ids: List[int]) -> TileTree:
+        tree = TileTree()
+        for view_id in view_ids:
+            self.insert(tree, view_id)
+        return tree
+
+
+class ColumnsPolicy(LayoutPolicy):
+    """All views side by side in equally weighted columns (or rows, with `orientation=HORIZONTAL`)."""
+    name = "columns"
+
+    def __init__(self, orientation: str=VERTICAL):
+        self.orientation = orientation
+
+    def build(self, view_ids: List[int]) -> TileTree:
+        tree = TileTree(self.orientation)
+        for view_id in view_ids:
+            self.insert(tree, view_id)
+        return tree
+
+    def insert(self, tree: TileTree, view_id: int, target: Optional[int]=None):
+        if len(tree) == 0:
+            tree.root.orientation = self.orientation
+        tree.insert(view_id, target)
+
+
+class MasterStackPolicy(LayoutPolicy):
+    """
+    One master view on the left and all other views stacked on top of each other on the right.
+
+    This is the layout of `scripts/master-stack-tile-layout.py`. New views go to the bottom of the stack
+    with the average weight of the stacked views. When the master is removed, the top of the stack
+    becomes the new master.
+    """
+    name = "master-stack"
+
+    def __init__(self, master_weight: float=2, stack_weight: float=1):
+        self.master_weight = master_weight
+        self.stack_weight = stack_weight
+
+    def _is_master_stack(self, tree: TileTree) -> bool:
+        children = tree.root.children
+        if tree.root.orientation != VERTICAL or len(children) > 2:
+            return False
+        if children and not isinstance(children[0], TileLeaf):
+            return False
+        if len(children) == 2 and isinstance(children[1], TileSplit):
+            return children[1].orientation == HORIZONTAL
+        return True
+
+    def build(self, view_ids: List[int]) -> TileTree:
+        tree = TileTree()
+        if len(view_ids) < 3:
+            for view_id in view_ids:
+                self.insert(tree, view_id)
+            return tree
+
+        tree.insert(view_ids[0], weight=self.master_weight)
+        tree.insert(view_ids[1], weight=self.stack_weight)
+        stack = TileSplit(HORIZONTAL, self.stack_weight)
+        tree.root.children[1] = stack
+        stack.parent = tree.root
+        for view_id in view_ids[1:]:
+            leaf = tree._leaves.get(view_id) or TileLeaf(view_id)
+            leaf.weight = 1.0
+            stack.append(leaf)
+            tree._leaves[view_id] = leaf
+        tree.last_inserted = view_ids[-1]
+        return tree
+
+    def insert(self, tree: TileTree, view_id: int, target: Optional[int]=None):
+        if not self._is_master_stack(tree):
+            tree._assign(self.build(tree.views()))
+
+        children = tree.root.children
+        if not children:
+            tree.insert(view_id)
+        elif len(children) == 1:
+            children[0].weight = self.master_weight
+            tree.insert(view_id, weight=self.stack_weight)
+        elif isinstance(children[1], TileLeaf):
+            tree.insert(view_id, target=children[1].view_id, orientation=HORIZONTAL)
+        else:
+            stack = children[1]
+            weight = sum(c.weight for c in stack.children) / len(stack.children)
+            leaf = TileLeaf(view_id, weight)
+            stack.append(leaf)
+            tree._leaves[view_id] = leaf
+            tree.last_inserted = view_id
+
+    def remove(self, tree: TileTree, view_id: int):
+        children = tree.root.children
+        if self._is_master_stack(tree) and len(children) == 2 and children[0].view_id == view_id:
+            stack = children[1]
+            top = stack if isinstance(stack, TileLeaf) else stack.children[0]
+            tree.swap(view_id, top.view_id)
+        tree.remove(view_id)
+
+
+class BSPPolicy(LayoutPolicy):
+    """
+    Binary space partitioning: a new view splits the target view (by default the most recently inserted
+    one) in half, alternating between vertical and horizontal splits with increasing depth.
+    """
+    name = "bsp"
+
+    def insert(self, tree: TileTree, view_id: int, target: Optional[int]=None):
+        if target is None:
+            target = tree.last_inserted
+        if target is None or target not in tree:
+            tree.insert(view_id)
+            return
+
+        parent = tree.leaf(target).parent
+        if len(parent.children) < 2:
+            tree.insert(view_id, target=target)
+        else:
+            tree.insert(view_id, target=target, orientation=_flip(parent.orientation))
+
+
+class SpiralPolicy(LayoutPolicy):
+    """
+    Each new view splits the previous one, turning clockwise: right, down, left, up, right, ...
+    """
+    name = "spiral"
+
+    _DIRECTIONS = ((VERTICAL, False), (HORIZONTAL, False), (VERTICAL, True), (HORIZONTAL, True))
+
+    def insert(self, tree: TileTree, view_id: int, target: Optional[int]=None):
+        if target is None:
+            target = tree.last_inserted
+        if target is None or target not in tree:
+            tree.insert(view_id)
+            return
+
+        orientation, before = self._DIRECTIONS[(len(tree) - 1) % 4]
+        tree.insert(view_id, target=target, orientation=orientation, before=before)
+
+
+class GridPolicy(LayoutPolicy):
+    """
+    Views arranged in rows of equal height, with as many columns as needed for a roughly square grid.
+
+    Since the shape of the grid depends on the number of views, inserting or removing a view rebuilds
+    the whole tree.
+    """
+    name = "grid"
+
+    def build(self, view_ids: List[int]) -> TileTree:
+        tree = TileTree(HORIZONTAL)
+        if not view_ids:
+            return tree
+
+        columns = math.ceil(math.sqrt(len(view_ids)))
+        for start in range(0, len(view_ids), columns):
+            row = view_ids[start:start + columns]
+            tree.insert(row[0])
+            for view_id in row[1:]:
+                tree.insert(view_id, target=tree.last_inserted, orientation=VERTICAL)
+        return tree
+
+    def insert(self, tree: TileTree, view_id: int, target: Optional[int]=None):
+        tree._assign(self.build(tree.views() + [view_id]))
+
+    def remove(self, tree: TileTree, view_id: int):
+        tree._assign(self.build([v for v in tree.views() if v != view_id]))
+
+
+POLICIES: Dict[str, Type[LayoutPolicy]] = {
+    policy.name: policy for policy in (ColumnsPolicy, MasterStackPolicy, BSPPolicy, SpiralPolicy, GridPolicy)
+}
+
+
+def register_policy(policy: Type[LayoutPolicy]):
+    """Make a custom policy available through `get_policy` under its `name`."""
+    POLICIES[policy.name] = policy
+    return policy
+
+
+def get_policy(name: str, **kwargs) -> LayoutPolicy:
+    """Create an instance of the policy registered under `name`."""
+    if name not in POLICIES:
+        raise ValueError(f"Unknown tiling policy '{name}'. Available: {', '.join(sorted(POLICIES))}.")
+    return POLICIES[name](**kwargs)
@@ -0,0 +1,503 @@
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from wayfire.core.template import object_id
+from wayfire.ipc import WayfireSocket
+
+Coords = Tuple[int, int]
+
+# Directions understood by `WorkspaceGrid.step()`. "next" and "previous" walk the workspaces in
+# reading order (row by row) and wrap around the whole grid; the others stay within a row or column.
+DIRECTIONS = ("next", "previous", "left", "right", "up", "down")
+
+# Options which change the size of the workspace grid
+GRID_OPTIONS = ("core/vwidth", "core/vheight")
+
+
+class WorkspaceGrid:
+    """
+    The workspace grid of an output, with all neighbours precomputed.
+
+    Workspaces are numbered from 1 in reading order, so on a 3x2 grid workspace 4 is (0, 1). Every
+    lookup is a tuple index; grids are immutable and shared, use `workspace_grid()` to get one.
+
+    Example:
+        >>> grid = workspace_grid(3, 3)
+        >>> grid.step(2, 0, "next")
+        (0, 1)
+        >>> grid.step(0, 0, "left")
+        (2, 0)
+        >>> grid.number(1, 1)
+        5
+    """
+    def __init__(self, width: int, height: int):
+        if width < 1 or height < 1:
+            raise ValueError(f"Invalid workspace grid {width}x{height}.")
+        self.width = width
+        self.height = height
+        count = width * height
+        self._coords: Tuple[Coords, ...] = tuple((i % width, i // width) for i in range(count))
+
+        def neighbour(x: int, y: int, dx: int, dy: int) -> int:
+            return (y + dy) % height * width + (x + dx) % width
+
+        self._steps: Dict[str, Tuple[int, ...]] = {
+            "next": tuple((i + 1) % count for i in range(count)),
+            "previous": tuple((i - 1) % count for i in range(count)),
+            "left": tuple(neighbour(x, y, -1, 0) for x, y in self._coords),
+            "right": tuple(neighbour(x, y, 1, 0) for x, y in self._coords),
+            "up": tuple(neighbour(x, y, 0, -1) for x, y in self._coords),
+            "down": tuple(neighbour(x, y, 0, 1) for x, y in self._coords),
+        }
+
+    def __repr__(self):
+        return f"WorkspaceGrid({self.width}, {self.height})"
+
+    def __len__(self):
+        return len(self._coords)
+
+    def __contains__(self, coords) -> bool:
+        x, y = coords
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def __iter__(self):
+        return iter(self._coords)
+
+    def number(self, x: int, y: int) -> Optional[int]:
+        """The number of a workspace, None if it is outside the grid."""
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return None
+        return y * self.width + x + 1
+
+    def coords(self, number: int) -> Optional[Coords]:
+        """The coordinates of a workspace number, None if there is no such workspace."""
+        if not 1 <= number <= len(self._coords):
+            return None
+        return self._coords[number - 1]
+
+    def step(self, x: int, y: int, direction: str) -> Optional[Coords]:
+        """
+        The workspace next to (x, y) in a direction, wrapping around at the edges.
+
+        Returns:
+            Optional[Tuple[int, int]]: The coordinates of the workspace, None if (x, y) is outside the grid.
+
+        Raises:
+            ValueError: If the direction is not one of `DIRECTIONS`.
+        """
+        steps = self._steps.get(direction)
+        if steps is None:
+            raise ValueError(f"Invalid direction {direction!r}. Use one of {', '.join(DIRECTIONS)}.")
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return None
+        return self._coords[steps[y * self.width + x]]
+
+    def row(self, y: int) -> List[Coords]:
+        return list(self._coords[y * self.width:(y + 1) * self.width])
+
+    def column(self, x: int) -> List[Coords]:
+        return list(self._coords[x::self.width])
+
+    def numbered(self) -> Dict[int, List[int]]:
+        """All workspaces by number, as `[x, y]` lists."""
+        return {number: [x, y] for number, (x, y) in enumerate(self._coords, 1)}
+
+
+@lru_cache(maxsize=None)
+def workspace_grid(width: int, height: int) -> WorkspaceGrid:
+    """The shared grid for a grid size."""
+    return WorkspaceGrid(width, height)
+
+
+class OutputWorkspaces:
+    """The workspace grid of one output, its size and its active workspace."""
+    __slots__ = ("output_id", "name", "wset", "width", "height", "grid", "x", "y")
+
+    def __init__(self, output: dict):
+        workspace = output["workspace"]
+        geometry = output.get("geometry") or {}
+        self.output_id: int = output["id"]
+        self.name: Optional[str] = output.get("name")
+        self.wset: Optional[int] = output.get("wset-index")
+        self.width: int = geometry.get("width", 0)
+        self.height: int = geometry.get("height", 0)
+        self.grid = workspace_grid(workspace["grid_width"], workspace["grid_height"])
+        self.x: int = workspace["x"]
+        self.y: int = workspace["y"]
+
+    @property
+    def workspace(self) -> Coords:
+        return self.x, self.y
+
+
+class WorkspaceNavigator:
+    """
+    Workspace grids and active workspaces of all outputs, kept up to date from IPC events.
+
+    The outputs are read once with `list_outputs` and `get_focused_output`, on first use. Afterwards
+    the active workspaces and the focused output are followed through events, so moving to another
+    workspace sends a single `set_workspace` request and nothing else. Outputs are read again after
+    `output-layout-changed` and `output-wset-changed`. Wayfire sends no event when the grid size
+    is changed in the config; pass the names of changed options to `config_changed()`, or call
+    `invalidate()`, after changing `core/vwidth` or `core/vheight`.
+
+    Pass every event read from the socket to `handle_event()`.
+
+    Example:
+        >>> navigator = WorkspaceNavigator(sock)
+        >>> navigator.watch()
+        >>> navigator.go("next")
+        >>> navigator.go_to_number(5)
+
+    Attributes:
+        switches (int): Number of `set_workspace` requests sent.
+        reloads (int): Number of times the outputs were read from the compositor.
+    """
+    EVENTS = ["wset-workspace-changed", "output-gain-focus", "output-layout-changed", "output-wset-changed"]
+
+    def __init__(self, socket: WayfireSocket):
+        self.socket = socket
+        self.switches = 0
+        self.reloads = 0
+        self._outputs: Optional[Dict[int, OutputWorkspaces]] = None
+        self._focused: Optional[int] = None
+
+    def watch(self):
+        """Subscribe the socket to the events the navigator needs."""
+        return self.socket.watch(self.EVENTS)
+
+    def _load(self) -> Dict[int, OutputWorkspaces]:
+        if self._outputs is None:
+            self.reloads += 1
+            self._outputs = {}
+            for output in self.socket.list_outputs():
+                self._outputs[output["id"]] = OutputWorkspaces(output)
+            focused = self.socket.get_focused_output()
+            self._focused = focused["id"] if focused else None
+        return self._outputs
+
+    def output(self, output_id: Optional[int]=None) -> Optional[OutputWorkspaces]:
+        """The state of an output, the focused output by default. None if the output doesn't exist."""
+        outputs = self._load()
+        return outputs.get(self._focused if output_id is None else output_id)
+
+    @property
+    def focused_output_id(self) -> Optional[int]:
+        self._load()
+        return self._focused
+
+    def grid(self, output_id: Optional[int]=None) -> Optional[WorkspaceGrid]:
+        state = self.output(output_id)
+        return state.grid if state else None
+
+    def workspace(self, output_id: Optional[int]=None) -> Optional[Coords]:
+        """The active workspace of an output, the focused output by default."""
+        state = self.output(output_id)
+        return state.workspace if state else None
+
+    def target(self, direction: str, output_id: Optional[int]=None) -> Optional[Coords]:
+        """The workspace `go()` would switch to, without switching."""
+        state = self.output(output_id)
+        if state is None:
+            return None
+        return state.grid.step(state.x, state.y, direction)
+
+    def _switch(self, state: OutputWorkspaces, coords: Coords):
+        self.socket.set_workspace(coords[0], coords[1], output_id=state.output_id)
+        self.switches += 1
+        # Assume the switch succeeded, so repeated key presses keep moving before the event arrives
+        state.x, state.y = coords
+
+    def go(self, direction: str, output_id: Optional[int]=None) -> Optional[Coords]:
+        """
+        Switch an output, the focused one by default, to the workspace in a direction.
+
+        Returns:
+            Optional[Tuple[int, int]]: The workspace switched to, None if the output is unknown.
+        """
+        state = self.output(output_id)
+        if state is None:
+            return None
+        coords = state.grid.step(state.x, state.y, direction)
+        if coords is not None:
+            self._switch(state, coords)
+        return coords
+
+    def go_to_number(self, number: int, output_id: Optional[int]=None) -> Optional[Coords]:
+        """Switch to a workspace by number. Returns None if the output has no such workspace."""
+        state = self.output(output_id)
+        if state is None:
+            return None
+        coords = state.grid.coords(number)
+        if coords is not None:
+            self._switch(state, coords)
+        return coords
+
+    def invalidate(self):
+        """Forget all outputs, they are read again on next use."""
+        self._outputs = None
+        self._focused = None
+
+    def config_changed(self, options: Iterable[str]):
+        """Invalidate the grids if one of the changed options sets the grid size."""
+        if any(option in GRID_OPTIONS for option in options):
+            self.invalidate()
+
+    def _update_output(self, output: dict):
+        if self._outputs is not None and isinstance(output, dict) and "workspace" in output:
+            self._outputs[output["id"]] = OutputWorkspaces(output)
+
+    def handle_event(self, event: dict):
+        """Update the state according to an event. Unrelated events are ignored."""
+        name = event.get("event")
+        if name == "output-gain-focus":
+            output = event.get("output")
+            self._focused = object_id(output)
+            self._update_output(output)
+        elif name == "wset-workspace-changed":
+            if self._outputs is None:
+                return
+            output_data = event.get("output-data")
+            if isinstance(output_data, dict) and "workspace" in output_data:
+                # Carries the current grid size too
+                self._update_output(output_data)
+                return
+            state = self._outputs.get(object_id(event.get("output")))
+            workspace = event.get("new-workspace")
+            if state is not None and workspace is not None:
+                state.x, state.y = workspace["x"], workspace["y"]
+        elif name in ("output-layout-changed", "output-wset-changed"):
+            self.invalidate()
+
+
+def _counts_as_occupant(view: dict) -> bool:
+    # The same views `WayfireUtils.get_workspaces_with_views` considers
+    return view.get("role") == "toplevel" and view.get("app-id") != "nil" and view.get("pid") != -1
+
+
+class WorkspaceOccupancy:
+    """
+    Which views are on which workspace, for every (output, wset), kept up to date from IPC events.
+
+    The views are read once with `list_views` on first use. Afterwards every view event recomputes
+    only the workspaces of the view it carries, from its geometry and the active workspace of its
+    output when the event arrives, so queries are answered from memory: `has_views()` is a set
+    lookup and `views_on()` is proportional to the number of views on the workspace. Occupancy is
+    stored in absolute workspace coordinates, which a workspace switch doesn't change: on
+    `wset-workspace-changed` only the navigator's active workspace moves, and sticky views, stored as
+    offsets from it, move along.
+
+    A view occupies every workspace its geometry intersects. Sticky views move along with the active
+    workspace; they are kept apart in `sticky` and only counted by the queries which are asked to
+    `include_sticky`. Minimized views only count if `count_minimized` is set.
+    Only toplevel views of applications are considered, like in `WayfireUtils.get_workspaces_with_views`.
+
+    The grids and active workspaces come from a `WorkspaceNavigator`. If none is passed the map
+    creates its own and forwards the events to it; a shared navigator must be given every event
+    before the map, so view events are placed against the workspace that was active when they arrived.
+
+    Pass every event read from the socket to `handle_event()`.
+
+    Example:
+        >>> occupancy = WorkspaceOccupancy(sock)
+        >>> occupancy.watch()
+        >>> occupancy.has_views(1, 0)
+        False
+    """
+    EVENTS = ["view-mapped", "view-unmapped", "view-geometry-changed", "view-workspace-changed",
+              "view-minimized", "view-sticky", "view-wset-changed"] + WorkspaceNavigator.EVENTS
+
+    def __init__(self, socket: WayfireSocket, navigator: Optional[WorkspaceNavigator]=None,
+                 count_minimized: bool=True):
+        """
+        Args:
+            socket (WayfireSocket): The connection the events are read from.
+            navigator (Optional[WorkspaceNavigator]): Source of the grids and active workspaces. Events
+                are only forwarded to a navigator created by the map.
+            count_minimized (bool): Whether minimized views occupy their workspaces.
+        """
+        self.socket = socket
+        self.count_minimized = count_minimized
+        self.reloads = 0
+        self._owns_navigator = navigator is None
+        self.navigator = navigator if navigator is not None else WorkspaceNavigator(socket)
+        self.sticky: Set[int] = set()
+        self._sticky_offsets: Dict[int, Tuple[Tuple[int, int], Set[Coords]]] = {}
+        self._loaded = False
+        self._by_workspace: Dict[Tuple[int, int, Coords], Set[int]] = {}
+        self._by_view: Dict[int, Tuple[Tuple[int, int], Set[Coords]]] = {}
+
+    def watch(self):
+        """Subscribe the socket to the events the map needs."""
+        return self.socket.watch(self.EVENTS)
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        self.reloads += 1
+        for view in self.socket.list_views():
+            self._place(view)
+
+    def _key(self, output_id: Optional[int]) -> Optional[Tuple[int, int]]:
+        state = self.navigator.output(output_id)
+        if state is None:
+            return None
+        return state.output_id, state.wset
+
+    def _remove(self, view_id: int):
+        self.sticky.discard(view_id)
+        self._sticky_offsets.pop(view_id, None)
+        entry = self._by_view.pop(view_id, None)
+        if entry is None:
+            return
+        key, workspaces = entry
+        for coords in workspaces:
+            views = self._by_workspace.get(key + (coords,))
+            if views is not None:
+                views.discard(view_id)
+                if not views:
+                    del self._by_workspace[key + (coords,)]
+
+    def _place(self, view: dict):
+        view_id = view["id"]
+        self._remove(view_id)
+        if not _counts_as_occupant(view) or view.get("mapped") is False:
+            return
+        if view.get("minimized") and not self.count_minimized:
+            return
+        if view.get("sticky"):
+            self.sticky.add(view_id)
+
+        state = self.navigator.output(view.get("output-id"))
+        geometry = view.get("geometry")
+        if state is None or not geometry or not state.width or not state.height:
+            return
+        if view.get("wset-index", state.wset) != state.wset:
+            # A workspace set which is not shown, its active workspace is unknown
+            return
+
+        # View geometry is relative to the active workspace of the output
+        left = geometry["x"]
+        top = geometry["y"]
+        right = left + geometry["width"]
+        bottom = top + geometry["height"]
+        offsets = {(x, y) for y in range(top // state.height, -(-bottom // state.height))
+                   for x in range(left // state.width, -(-right // state.width))}
+        key = (state.output_id, state.wset)
+        if view_id in self.sticky:
+            # Sticky views move along with the active workspace, only their offset from it is kept
+            self._sticky_offsets[view_id] = (key, offsets)
+            return
+
+        workspaces = {(state.x + dx, state.y + dy) for dx, dy in offsets} & set(state.grid)
+        if not workspaces:
+            return
+        self._by_view[view_id] = (key, workspaces)
+        for coords in workspaces:
+            self._by_workspace.setdefault(key + (coords,), set()).add(view_id)
+
+    def _sticky_workspaces(self, state: OutputWorkspaces) -> Dict[int, Set[Coords]]:
+        # The workspaces the sticky views of an output are currently shown on
+        key = (state.output_id, state.wset)
+        grid = set(state.grid)
+        return {view_id: {(state.x + dx, state.y + dy) for dx, dy in offsets} & grid
+                for view_id, (view_key, offsets) in self._sticky_offsets.items() if view_key == key}
+
+    def views_on(self, x: int, y: int, output_id: Optional[int]=None, include_sticky: bool=False) -> Set[int]:
+        """
+        Ids of the views on a workspace of an output, the focused output by default.
+
+        Sticky views are included with `include_sticky`, on the workspaces their geometry intersects
+        relative to the active workspace, like `WayfireUtils.get_workspaces_with_views` counts them.
+        """
+        self._load()
+        state = self.navigator.output(output_id)
+        if state is None:
+            return set()
+        views = set(self._by_workspace.get((state.output_id, state.wset, (x, y)), ()))
+        if include_sticky:
+            views.update(view_id for view_id, workspaces in self._sticky_workspaces(state).items()
+                         if (x, y) in workspaces)
+        return views
+
+    def has_views(self, x: int, y: int, output_id: Optional[int]=None, include_sticky: bool=False) -> bool:
+        self._load()
+        key = self._key(output_id)
+        if key is None:
+            return False
+        if key + ((x, y),) in self._by_workspace:
+            return True
+        return include_sticky and bool(self.views_on(x, y, output_id, include_sticky=True))
+
+    def workspaces_of(self, view_id: int, include_sticky: bool=False) -> Set[Coords]:
+        """The workspaces a view is on, empty for unknown views and, unless `include_sticky` is set, sticky views."""
+        self._load()
+        entry = self._by_view.get(view_id)
+        if entry is not None:
+            return set(entry[1])
+        sticky = self._sticky_offsets.get(view_id)
+        if not include_sticky or sticky is None:
+            return set()
+        state = self.navigator.output(sticky[0][0])
+        if state is None or state.wset != sticky[0][1]:
+            return set()
+        return self._sticky_workspaces(state).get(view_id, set())
+
+    def _occupied(self, state: OutputWorkspaces, include_sticky: bool) -> Set[Coords]:
+        key = (state.output_id, state.wset)
+        occupied = {coords for coords in state.grid if key + (coords,) in self._by_workspace}
+        if include_sticky:
+            for workspaces in self._sticky_workspaces(state).values():
+                occupied |= workspaces
+        return occupied
+
+    def occupied(self, output_id: Optional[int]=None, include_sticky: bool=False) -> List[Coords]:
+        """The workspaces of an output with views, in reading order."""
+        self._load()
+        state = self.navigator.output(output_id)
+        if state is None:
+            return []
+        occupied = self._occupied(state, include_sticky)
+        return [coords for coords in state.grid if coords in occupied]
+
+    def empty(self, output_id: Optional[int]=None, include_sticky: bool=False) -> List[Coords]:
+        """The workspaces of an output without views, in reading order."""
+        self._load()
+        state = self.navigator.output(output_id)
+        if state is None:
+            return []
+        occupied = self._occupied(state, include_sticky)
+        return [coords for coords in state.grid if coords not in occupied]
+
+    def config_changed(self, options: Iterable[str]):
+        """Rebuild the map if one of the changed options sets the grid size."""
+        if any(option in GRID_OPTIONS for option in options):
+            self.navigator.invalidate()
+            self.invalidate()
+
+    def invalidate(self):
+        """Forget all views, they are read again on next use."""
+        self._loaded = False
+        self._by_workspace = {}
+        self._by_view = {}
+        self.sticky = set()
+        self._sticky_offsets = {}
+
+    def handle_event(self, event: dict):
+        """Update the map according to an event. Unrelated events are ignored."""
+        if self._owns_navigator:
+            self.navigator.handle_event(event)
+        name = event.get("event")
+        if name in ("output-layout-changed", "output-wset-changed"):
+            # Output sizes or the wsets shown may have changed, which moves views between keys
+            self.invalidate()
+            return
+        if not self._loaded or not name or not name.startswith("view-"):
+            return
+        view = event.get("view")
+        if not isinstance(view, dict) or "id" not in view:
+            return
+        if name == "view-unmapped":
+            self._remove(view["id"])
+        else:
+            self._place(view)
@@ -5,6 +5,7 @@ import time
 import os
 from typing import Any, List, Optional
 from wayfire.core.template import get_msg_template, geometry_to_json
+from wayfire.core.transaction import LayoutTransaction
 
 class WayfireSocketError(Exception):
     pass
@@ -17,7 +18,9 @@ class WayfireSocket:
 
         self.socket_name = None
         self.pending_events = []
+        self.unread_replies = 0
         self.timeout = 3
+        self._methods = None
 
         if socket_name is not None:
             try:
@@ -91,56 +94,166 @@ class WayfireSocket:
         self.client.close()
 
     def read_message(self):
+        response = self._read_raw_message()
+        self._check_response(response)
+        return response
+
+    def _read_raw_message(self):
         rlen = int.from_bytes(self.read_exact(4), byteorder="little")
         response_message = self.read_exact(rlen)
         if not response_message:
             raise Exception("Received empty response message")
         try:
-            response = js.loads(response_message.decode("utf-8"))
+            return js.loads(response_message.decode("utf-8"))
         except js.JSONDecodeError as e:
             raise Exception(f"JSON decoding error: {e}")
 
+    def _check_response(self, response):
         if "error" in response and response["error"] == "No such method found!":
             raise Exception(f"Method {response['method']} is not available. \
                     Please ensure that the '{self._wayfire_plugin_from_method(response['method'])}' Wayfire plugin is enabled. \
                     Once enabled, restart Wayfire to ensure that ipc was correctly loaded.")
         elif "error" in response:
             raise Exception(response["error"])
-        return response
 
-    def send_json(self, msg):
+    @staticmethod
+    def encode_message(msg) -> bytes:
+        """
+        Serialize a request into a length-prefixed frame ready to be written to the socket.
+
+        Encoding is separated from sending so that callers which replay the same requests
+        many times (input sequences, streams) can pay the JSON cost once up front.
+
+        Args:
+            msg (dict): The request, as created by `get_msg_template`.
+
+        Returns:
+            bytes: The 4-byte little-endian length header followed by the UTF-8 JSON payload.
+        """
         if 'method' not in msg:
             raise Exception("Malformed JSON request: missing method!")
 
         data = js.dumps(msg).encode("utf-8")
-        header = len(data).to_bytes(4, byteorder="little")
+        return len(data).to_bytes(4, byteorder="little") + data
 
-        if self.is_connected():
-            self.client.send(header)
-            self.client.send(data)
-        else:
+    def send_frame(self, frame: bytes):
+        """
+        Write an already encoded request to the socket without waiting for its reply.
+
+        Every frame sent this way is owed a reply by Wayfire. The replies must be collected
+        with `read_response`, otherwise the next `send_json` call will consume them first.
+
+        Args:
+            frame (bytes): A frame created by `encode_message`.
+        """
+        if not self.is_connected():
             raise Exception("Unable to send data: The Wayfire socket instance is not connected.")
 
-        end_time = time.time() + self.timeout
-        while True:
-            remaining_time = end_time - time.time()
-            if remaining_time <= 0:
-                raise Exception("Response timeout")
+        self.client.sendall(frame)
+        self.unread_replies += 1
 
+    def read_response(self, timeout: Optional[float]=None):
+        """
+        Wait for the reply to the oldest request which has not been answered yet.
+
+        Events which arrive in the meantime are queued and can be retrieved with
+        `read_next_event`. Error replies are returned as they are, it is up to the
+        caller to inspect the "error" field.
+
+        Args:
+            timeout (Optional[float]): Seconds to wait for the reply. Defaults to `self.timeout`.
+
+        Returns:
+            dict: The decoded reply.
+        """
+        response = self.poll_response(self.timeout if timeout is None else timeout)
+        if response is None:
+            raise Exception("Response timeout")
+        return response
+
+    def poll_response(self, timeout: float=0.0):
+        """
+        Like `read_response`, but returns None instead of raising if no reply arrives in time.
+
+        With the default timeout of 0 this never blocks waiting for the compositor, which lets
+        callers collect replies to pipelined requests while they wait for something else.
+
+        Args:
+            timeout (float): Seconds to wait for the reply.
+
+        Returns:
+            dict or None: The decoded reply, or None if there was none within `timeout`.
+        """
+        end_time = time.time() + timeout
+        while True:
+            remaining_time = max(0.0, end_time - time.time())
             readable, _, _ = select.select([self.client], [], [], remaining_time)
-            if readable:
+            if not readable:
+                return None
+
+            try:
+                response = self._read_raw_message()
+            except Exception as e:
+                raise Exception(f"Error reading message: {e}")
+
+            if 'event' in response:
+                self.pending_events.append(response)
+                continue
+
+            self.unread_replies = max(0, self.unread_replies - 1)
+            return response
+
+    def drain_replies(self):
+        """
+        Consume the replies still owed for frames sent with `send_frame`.
+
+        Replies arrive in request order, so they have to be consumed before the reply to
+        a new request can be matched. Error replies are discarded.
+        """
+        while self.unread_replies > 0:
+            self.read_response()
+
+    def send_json(self, msg):
+        frame = self.encode_message(msg)
+        self.drain_replies()
+        self.send_frame(frame)
+        response = self.read_response()
+        try:
+            self._check_response(response)
+        except Exception as e:
+            raise Exception(f"Error reading message: {e}")
+
+        return response
+
+    def send_json_batch(self, messages: List[dict], raise_on_error: bool=True) -> List[dict]:
+        """
+        Send several requests back to back and collect all of their replies afterwards.
+
+        Wayfire answers requests in the order in which they were received, so the whole batch
+        costs a single round trip instead of one round trip per request.
+
+        Args:
+            messages (List[dict]): The requests to send.
+            raise_on_error (bool): Whether to raise the first error reply once all replies have
+                been received. If False, error replies are returned like any other reply.
+
+        Returns:
+            List[dict]: The replies, in the same order as `messages`.
+        """
+        frames = [self.encode_message(msg) for msg in messages]
+        self.drain_replies()
+        for frame in frames:
+            self.send_frame(frame)
+
+        responses = [self.read_response() for _ in frames]
+        if raise_on_error:
+            for response in responses:
                 try:
-                    response = self.read_message()
+                    self._check_response(response)
                 except Exception as e:
                     raise Exception(f"Error reading message: {e}")
 
-                if 'event' in response:
-                    self.pending_events.append(response)
-                    continue
-
-                return response
-            else:
-                raise Exception("Response timeout")
+        return responses
 
     def read_exact(self, n: int):
         response = bytearray()
@@ -154,6 +267,9 @@ class WayfireSocket:
         return bytes(response)
 
     def read_next_event(self):
+        if not self.pending_events and self.unread_replies > 0:
+            # Replies to pipelined requests must not be mistaken for events
+            self.drain_replies()
         if self.pending_events:
             return self.pending_events.pop(0)
         return self.read_message()
@@ -396,6 +512,23 @@ class WayfireSocket:
         response = self.send_json(query)
         return response["methods"]
 
+    def has_method(self, method: str) -> bool:
+        """
+        Checks whether the compositor provides a given IPC method.
+
+        The list of methods is fetched once per socket and cached afterwards, since the set of
+        loaded plugins only changes when Wayfire is restarted (which also closes the socket).
+
+        Args:
+            method (str): The method name, e.g. "stipc/layout_views".
+
+        Returns:
+            bool: True if the method is available.
+        """
+        if self._methods is None:
+            self._methods = set(self.list_methods())
+        return method in self._methods
+
     @staticmethod
     def _wayfire_plugin_from_method(method: str) -> str:
         if method.startswith("wf/alpha"):
@@ -654,6 +787,25 @@ class WayfireSocket:
             message["data"]["output_id"] = output_id
         return self.send_json(message)
 
+    def layout_transaction(self) -> LayoutTransaction:
+        """
+        Starts a transaction which changes the layout of many views at once.
+
+        Changes are collected locally and only sent when `commit()` is called on the returned
+        transaction, as a single pipelined burst. See `LayoutTransaction` for details.
+
+        Returns:
+            LayoutTransaction: An empty transaction bound to this socket.
+
+        Example:
+            >>> tx = socket.layout_transaction()
+            >>> tx.configure(view_a, 0, 0, 960, 1080)
+            >>> tx.configure(view_b, 960, 0, 960, 1080)
+            >>> tx.set_sticky(view_b, True)
+            >>> result = tx.commit()
+        """
+        return LayoutTransaction(self)
+
     def assign_slot(self, view_id: int, slot: str):
         """
         Assigns a view to a specified grid slot.